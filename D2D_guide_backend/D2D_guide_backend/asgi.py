@@ -2,6 +2,7 @@
 ASGI config for D2D_guide_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Websocket connections to /events receive change events, see task.events.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -13,4 +14,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'D2D_guide_backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Models can be imported once apps are loaded.
+from task.events import websocket_events  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] != 'websocket':
+        return await django_application(scope, receive, send)
+    if scope['path'] == '/events':
+        return await websocket_events(scope, receive, send)
+    await receive()
+    await send({'type': 'websocket.close'})
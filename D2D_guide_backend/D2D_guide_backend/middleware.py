@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+
+from D2D_guide_backend.routers import read_from_replicas
+
+# Response header of writes, giving the time until which reads of the client stay on the
+# primary. Clients send it back as is, it is a header rather than a cookie so that it also
+# works cross-origin (see CORS_ALLOW_HEADERS and CORS_EXPOSE_HEADERS).
+PIN_HEADER = 'X-Primary-Pin'
+SAFE_METHODS = ['GET', 'HEAD', 'OPTIONS']
+
+
+def pinned(request):
+    """
+    Return True if the pin sent by the client has not expired.
+    """
+    try:
+        return float(request.headers.get(PIN_HEADER, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class PrimaryPinningMiddleware:
+    """
+    Let safe requests read from replicas, except for clients that wrote less than
+    REPLICA_PIN_SECONDS ago: a write returns a pin for that window, during which reads of
+    the client sending it stick to the primary so that it reads its own writes.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in SAFE_METHODS
+        with read_from_replicas(safe and not pinned(request)):
+            response = self.get_response(request)
+        if not safe and settings.REPLICA_DATABASES:
+            response[PIN_HEADER] = str(int(time.time()) + settings.REPLICA_PIN_SECONDS)
+        return response
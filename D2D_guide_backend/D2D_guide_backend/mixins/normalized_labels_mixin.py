@@ -0,0 +1,65 @@
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+from task.models import Label
+
+
+def normalized_labels(request):
+    """
+    Return True if a read request asks for normalized labels, with ?normalize=true.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return False
+    return request.query_params.get('normalize', '').lower() in ['true', '1']
+
+
+def request_labels(request, label_ids):
+    """
+    Return {id: {name, id}} of label ids. Labels are read once per request, then cached on it.
+    """
+    cache = getattr(request, 'label_cache', None)
+    if cache is None:
+        cache = request.label_cache = {}
+    missing = set(label_ids) - cache.keys()
+    if missing:
+        for label in Label.objects.filter(id__in=missing).values('name', 'id'):
+            cache[label['id']] = label
+    # Keys are strings for json objects.
+    return {
+        str(label_id): cache[label_id] for label_id in sorted(label_ids) if label_id in cache}
+
+
+class NormalizedLabelsSerializerMixin:
+    """
+    Serialize labels as a list of ids, read from label_ids without querying labels, when
+    normalized labels are requested for a list, whose response holds the labels dictionary
+    (see NormalizedLabelsMixin). Other responses keep label objects.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        view = self.context.get('view')
+        if ('label' in self.fields and getattr(view, 'action', None) == 'list'
+                and normalized_labels(self.context.get('request'))):
+            self.fields['label'] = serializers.ListField(
+                source='label_ids', child=serializers.IntegerField(), read_only=True)
+
+
+class NormalizedLabelsMixin:
+    """
+    Normalized list responses, with ?normalize=true: rows hold label ids and a single labels
+    dictionary {id: {name, id}} is added to the response, instead of repeating label
+    objects in every row.
+    """
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if not normalized_labels(request):
+            return response
+        paginated = isinstance(response.data, dict)
+        rows = response.data['results'] if paginated else response.data
+        labels = request_labels(
+            request, {label_id for row in rows for label_id in row.get('label', [])})
+        if paginated:
+            response.data['labels'] = labels
+        else:
+            response.data = {'results': rows, 'labels': labels}
+        return response
@@ -0,0 +1,85 @@
+from django.db import transaction
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from task.models import ConcurrentUpdateError
+
+# Attempts of an update without If-Match header, the instance being read again each time.
+UPDATE_ATTEMPTS = 3
+
+
+def etag(instance):
+    return f'"{instance.version}"'
+
+
+def if_match(request):
+    """
+    Return the set of etags of the If-Match header of a write request, None if it is not
+    given or is *.
+    """
+    if request.method in SAFE_METHODS:
+        return None
+    header = request.headers.get('If-Match')
+    if header is None or header.strip() == '*':
+        return None
+    return {value.strip().removeprefix('W/') for value in header.split(',') if value.strip()}
+
+
+class PreconditionFailed(Exception):
+    """
+    Raised when the If-Match header does not match the current version.
+    """
+
+
+class OptimisticConcurrencyMixin:
+    """
+    Versioned updates of views on a model whose save() raises ConcurrentUpdateError when the
+    instance changed since it was read.
+    Responses of retrieve and update hold the version as ETag. Update and destroy requests
+    with an If-Match header fail with 412 if the version changed, updates without one are
+    applied again on the latest version, and fail with 409 after UPDATE_ATTEMPTS conflicts.
+    """
+    def get_object(self):
+        instance = super().get_object()
+        etags = if_match(self.request)
+        if etags is not None and etag(instance) not in etags:
+            raise PreconditionFailed()
+        self.versioned_instance = instance
+        return instance
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method == 'DELETE':
+            # Destroy has no compare-and-swap, lock the row checked against If-Match.
+            queryset = queryset.select_for_update()
+        return queryset
+
+    def with_etag(self, response):
+        response['ETag'] = etag(self.versioned_instance)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.with_etag(super().retrieve(request, *args, **kwargs))
+
+    def update(self, request, *args, **kwargs):
+        for _ in range(UPDATE_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    response = super().update(request, *args, **kwargs)
+                return self.with_etag(response)
+            except PreconditionFailed:
+                return self.precondition_failed()
+            except ConcurrentUpdateError:
+                if if_match(request) is not None:
+                    return self.precondition_failed()
+        return Response({'detail': 'Too many concurrent updates, try again.'}, status=409)
+
+    def destroy(self, request, *args, **kwargs):
+        try:
+            with transaction.atomic():
+                return super().destroy(request, *args, **kwargs)
+        except PreconditionFailed:
+            return self.precondition_failed()
+
+    def precondition_failed(self):
+        return Response({'detail': 'The resource was modified, read it again.'}, status=412)
@@ -0,0 +1,27 @@
+from rest_framework.permissions import SAFE_METHODS
+
+
+def requested_fields(request):
+    """
+    Return the set of field names of the fields query param (comma separated) of a read
+    request, None if it is not given.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    fields = request.query_params.get('fields')
+    if not fields:
+        return None
+    return {field.strip() for field in fields.split(',') if field.strip()}
+
+
+class SparseFieldsetMixin:
+    """
+    Only serialize fields requested with the fields query param, ex: ?fields=id,name,done.
+    Other fields are removed before serialization, so they are never computed.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields is not None:
+            for field_name in set(self.fields) - fields:
+                self.fields.pop(field_name)
@@ -0,0 +1,25 @@
+"""
+JSON renderer based on orjson, set as default renderer in settings.
+"""
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Types orjson doesn't handle natively (Decimal, lazy translations, querysets...) are
+# converted as DRF JSONRenderer would.
+drf_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        option = orjson.OPT_NON_STR_KEYS
+        # Browsable API asks for an indented rendering.
+        if (renderer_context or {}).get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=drf_encoder.default, option=option)
@@ -0,0 +1,54 @@
+"""
+Routing of reads to replica databases, listed by alias in the REPLICA_DATABASES setting.
+Reads go to a replica only where read_from_replicas allows it, which
+PrimaryPinningMiddleware does for safe requests of clients that didn't write recently.
+A single replica is picked for the whole block, so that reads of a request see the same
+state.
+Reads inside a transaction of the primary and every write go to the primary, so do
+commands and the shell.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Alias of the replica picked by read_from_replicas, None to read from the primary.
+replica = ContextVar('replica', default=None)
+
+
+@contextmanager
+def read_from_replicas(enabled=True):
+    token = replica.set(
+        random.choice(settings.REPLICA_DATABASES)
+        if enabled and settings.REPLICA_DATABASES else None)
+    try:
+        yield
+    finally:
+        replica.reset(token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        alias = replica.get()
+        if (alias not in settings.REPLICA_DATABASES
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema of the primary through replication.
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
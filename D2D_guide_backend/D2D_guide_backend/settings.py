@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -37,6 +40,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Third party apps
     'rest_framework',
@@ -49,6 +53,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'D2D_guide_backend.middleware.PrimaryPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.common.CommonMiddleware',
@@ -92,6 +97,40 @@ DATABASES = {
     }
 }
 
+# D2D_DATABASE=sqlite runs on SQLite, in memory for tests (ex: make test_sqlite).
+# PostgreSQL only features are skipped, see task.fields.
+if os.environ.get('D2D_DATABASE') == 'sqlite':
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            # Migrations hold PostgreSQL only operations, tables are created from models.
+            "TEST": {"MIGRATE": False},
+        }
+    }
+
+# Read replicas, as comma separated pg services.
+# Ex: D2D_REPLICA_SERVICES=task_replica_service, see .pg_service.conf.
+# Leave it unset to run tests, they only use the default database.
+REPLICA_DATABASES = []
+for index, service in enumerate(
+        filter(None, os.environ.get('D2D_REPLICA_SERVICES', '').split(',')), start=1):
+    DATABASES[f'replica_{index}'] = {
+        "ENGINE": "django.db.backends.postgresql",
+        "OPTIONS": {
+            "service": service.strip(),
+            "passfile": ".task_pgpass",
+        },
+        "TEST": {"MIRROR": "default"},
+    }
+    REPLICA_DATABASES.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['D2D_guide_backend.routers.ReplicaRouter']
+
+# Seconds during which reads of a client stay on the default database after a write,
+# must be more than the replication lag.
+REPLICA_PIN_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -136,11 +175,24 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 100
+    'PAGE_SIZE': 100,
+    'DEFAULT_RENDERER_CLASSES': [
+        'D2D_guide_backend.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'D2D_guide_backend.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 # Allow request from development front
 # TODO: Set it up properly when configuring for prod
 CORS_ALLOWED_ORIGINS = [
     'http://localhost:3000',
-]
\ No newline at end of file
+]
+# Reads of clients sending back the pin of their last write go to the primary, see
+# D2D_guide_backend.middleware.
+CORS_ALLOW_HEADERS = (*default_headers, 'x-primary-pin')
+CORS_EXPOSE_HEADERS = ['X-Primary-Pin']
\ No newline at end of file
@@ -29,5 +29,12 @@ router.register(r'label', views.LabelViewSet)
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('late_tasks', views.get_late_tasks),
+    path('stats', views.get_task_stats),
+    path('density', views.get_task_density),
+    path('sync', views.sync_changes),
+    path('events', views.event_stream),
+    path('export', views.export_tasks),
+    path('import', views.import_tasks),
+    path('calendar.ics', views.calendar_feed),
     path('', include(router.urls))
 ]
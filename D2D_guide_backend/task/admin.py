@@ -1,3 +1,130 @@
+"""
+Admin of task models, built for large tables: no full COUNT, joined or prefetched
+relations, indexed ordering and date hierarchies, autocomplete instead of select boxes and
+actions written as set-based UPDATE queries.
+"""
+import json
+
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.db.models.functions import Now
+from django.utils.functional import cached_property
+
+from task.events import publish_rows
+from task.ical import invalidate_feed
+from task.models import MultiOccurencesTask, DatedTask, WeekTask, Label
+from task.stats import add_stats, live_counts
+
+# Above this planner estimate, the number of rows of a changelist is not counted.
+EXACT_COUNT_LIMIT = 10_000
+
+
+def estimated_count(queryset):
+    """
+    Return the number of rows of a queryset as estimated by the PostgreSQL planner.
+    """
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator giving the planner estimate rather than the exact count of big querysets.
+    """
+
+    @cached_property
+    def count(self):
+        if connection.vendor == 'postgresql':
+            estimate = estimated_count(self.object_list)
+            if estimate > EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
+
+
+def set_done(model, tasks, done):
+    """
+    Set done on tasks with a single UPDATE, updating stats, events and calendar feed as
+    model signals would. Return the number of changed tasks.
+    """
+    tasks = tasks.filter(done=not done)
+    with transaction.atomic():
+        counts = live_counts(model, tasks)
+        add_stats({
+            key: (0, total if done else -total) for key, (total, _) in counts.items()})
+        publish_rows(model, tasks, 'update')
+        changed = tasks.update(done=done, updated_at=Now())
+    invalidate_feed()
+    return changed
+
+
+class TaskAdmin(admin.ModelAdmin):
+    """
+    Common admin of dated and week tasks.
+    """
+    list_display_links = ['name']
+    list_select_related = ['related_mot']
+    list_filter = ['done']
+    search_fields = ['name']
+    autocomplete_fields = ['label', 'related_mot']
+    readonly_fields = ['label_ids', 'occurrence', 'updated_at']
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    actions = ['mark_done', 'mark_not_done']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('label')
+
+    @admin.display(description='labels')
+    def labels(self, task):
+        return ', '.join(label.name for label in task.label.all())
+
+    @admin.action(description='Mark selected tasks as done')
+    def mark_done(self, request, queryset):
+        changed = set_done(self.model, queryset, True)
+        self.message_user(request, f'{changed} tasks marked as done.')
+
+    @admin.action(description='Mark selected tasks as not done')
+    def mark_not_done(self, request, queryset):
+        changed = set_done(self.model, queryset, False)
+        self.message_user(request, f'{changed} tasks marked as not done.')
+
+
+@admin.register(DatedTask)
+class DatedTaskAdmin(TaskAdmin):
+    list_display = ['id', 'name', 'date', 'done', 'related_mot', 'labels']
+    date_hierarchy = 'date'
+    ordering = ['-date']
+
+
+@admin.register(WeekTask)
+class WeekTaskAdmin(TaskAdmin):
+    list_display = ['id', 'name', 'year', 'week_number', 'done', 'related_mot', 'labels']
+    date_hierarchy = 'updated_at'
+    ordering = ['-id']
+
+
+@admin.register(MultiOccurencesTask)
+class MultiOccurencesTaskAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'task_name', 'start_date', 'end_date', 'labels']
+    search_fields = ['name', 'task_name']
+    autocomplete_fields = ['label']
+    readonly_fields = ['label_ids', 'version', 'updated_at']
+    date_hierarchy = 'updated_at'
+    ordering = ['-id']
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('label')
+
+    @admin.display(description='labels')
+    def labels(self, mot):
+        return ', '.join(label.name for label in mot.label.all())
+
 
-# Register your models here.
+@admin.register(Label)
+class LabelAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'updated_at']
+    search_fields = ['name']
+    ordering = ['name']
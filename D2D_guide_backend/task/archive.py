@@ -0,0 +1,163 @@
+"""
+Archival of old done tasks.
+Done tasks older than ARCHIVE_AFTER_MONTHS are moved in batches to the archive tables,
+archived tasks are counted in ArchiveRollup so that mot counters and stats stay correct
+once archives are purged. Their occurrences are retired, so that they are not generated
+again (see task.occurrences).
+"""
+from collections import Counter
+from datetime import date
+
+from django.db import connection, transaction
+from django.db.models import F, Q, Value
+
+from task.deletion import delete_tasks
+from task.events import publish, week_events
+from task.ical import invalidate_feed
+from task.occurrences import retire_occurrences
+from task.models import (
+    DatedTask, WeekTask, Label, ArchivedDatedTask, ArchivedWeekTask, ArchiveRollup)
+from task.sync import add_tombstones
+from task.utils import month_range
+
+ARCHIVE_AFTER_MONTHS = 12
+ARCHIVE_BATCH_SIZE = 1000
+
+ROLLUP_SQL = """
+    INSERT INTO {table} ({mot}, {label}, {year}, {week_number}, {count})
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT ({mot}, {label}, {year}, {week_number})
+    DO UPDATE SET {count} = {table}.{count} + EXCLUDED.{count}
+"""
+
+
+def months_before(day, months):
+    month_index = day.year * 12 + day.month - 1 - months
+    year, month = divmod(month_index, 12)
+    return date(year, month + 1, min(day.day, month_range(year, month + 1)))
+
+
+def dated_before(cutoff):
+    return Q(date__lt=cutoff)
+
+
+def week_before(cutoff):
+    week_number = cutoff.isocalendar().week
+    return Q(year__lt=cutoff.year) | Q(year=cutoff.year, week_number__lt=week_number)
+
+
+# task model: (archive model, copied fields, filter of tasks before a date, (year, week))
+ARCHIVES = {
+    DatedTask: (
+        ArchivedDatedTask, ['name', 'date', 'related_mot'], dated_before,
+        lambda task: tuple(task['date'].isocalendar())[:2]),
+    WeekTask: (
+        ArchivedWeekTask, ['name', 'year', 'week_number', 'related_mot'], week_before,
+        lambda task: (task['year'], task['week_number'])),
+}
+
+
+def add_rollups(counts):
+    """
+    Add {(mot id, label id, year, week_number): count} to archive rollups.
+    """
+    quote = connection.ops.quote_name
+    names = {
+        'table': quote(ArchiveRollup._meta.db_table),
+        **{name: quote(ArchiveRollup._meta.get_field(field).column) for name, field in [
+            ('mot', 'mot_id'), ('label', 'label_id'), ('year', 'year'),
+            ('week_number', 'week_number'), ('count', 'task_count')]},
+    }
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            ROLLUP_SQL.format(**names), [(*key, count) for key, count in counts.items()])
+
+
+def archive_batch(model, cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Archive at most batch_size done tasks of a model before cutoff, return their number.
+    """
+    archive_model, fields, before, week = ARCHIVES[model]
+    with transaction.atomic():
+        tasks = list(model.objects.filter(before(cutoff), done=True).order_by('id').values(
+            'id', 'label_ids', 'occurrence',
+            *[model._meta.get_field(field).attname for field in fields]
+        )[:batch_size])
+        if not tasks:
+            return 0
+        counts = Counter()
+        for task in tasks:
+            mot_id = task['related_mot_id'] or 0
+            for label_id in [0, *task['label_ids']]:
+                counts[(mot_id, label_id, *week(task))] += 1
+        retire_occurrences(model, tasks)
+        archive_model.objects.bulk_create([
+            archive_model(**{
+                field: value for field, value in task.items() if field != 'occurrence'})
+            for task in tasks])
+        add_rollups(counts)
+        delete_tasks(model, [task['id'] for task in tasks])
+        # Archived tasks are not listed anymore.
+        add_tombstones(model, [task['id'] for task in tasks])
+        publish(week_events(model, [week(task) for task in tasks], 'delete'))
+    return len(tasks)
+
+
+def archive_tasks(cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    Archive every done task before cutoff, return the number of archived tasks per model.
+    """
+    archived = {}
+    for model in ARCHIVES:
+        archived[model._meta.model_name] = 0
+        while count := archive_batch(model, cutoff, batch_size):
+            archived[model._meta.model_name] += count
+    # Raw deletes don't send model signals.
+    invalidate_feed()
+    return archived
+
+
+def purge_archives(cutoff):
+    """
+    Delete archived tasks before cutoff, rollups keep counting them.
+    """
+    return {
+        archive_model._meta.model_name: archive_model.objects.filter(before(cutoff)).delete()[0]
+        for archive_model, _, before, _ in ARCHIVES.values()}
+
+
+def include_archived(request):
+    return request.query_params.get('include_archived', '').lower() in ['true', '1']
+
+
+def with_archived(queryset, archived_queryset, fields):
+    """
+    Return values of live and archived tasks in a single queryset, with label_ids, archived
+    and task_done columns. Annotations are selected after model fields, so done is an
+    annotation on both sides for columns to match.
+    """
+    live = queryset.annotate(task_done=F('done'), archived=Value(False)).values(
+        'id', *fields, 'label_ids', 'task_done', 'archived')
+    archived = archived_queryset.annotate(task_done=Value(True), archived=Value(True)).values(
+        'id', *fields, 'label_ids', 'task_done', 'archived')
+    return live.union(archived, all=True)
+
+
+def archived_rows(rows, label_objects=True):
+    """
+    Serialize rows of with_archived like task serializers do, with an archived field.
+    Labels are given as ids if not label_objects, see NormalizedLabelsMixin.
+    """
+    rows = list(rows)
+    if not label_objects:
+        for row in rows:
+            row['done'] = row.pop('task_done')
+            row['label'] = row.pop('label_ids')
+        return rows
+    labels = Label.objects.in_bulk({label_id for row in rows for label_id in row['label_ids']})
+    for row in rows:
+        row['done'] = row.pop('task_done')
+        row['label'] = [
+            {'name': labels[label_id].name, 'id': label_id}
+            for label_id in row.pop('label_ids') if label_id in labels]
+    return rows
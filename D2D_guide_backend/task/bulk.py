@@ -0,0 +1,75 @@
+"""
+Bulk write helpers that bypass the model save() path.
+They rely on psycopg3 COPY support and are meant for high volume writes only, other
+databases (SQLite for tests) get plain INSERT queries.
+"""
+import json
+
+from django.db import connection
+
+
+def reserve_ids(model, count):
+    """
+    Reserve count primary keys from the model sequence, return them as a list.
+    Sequence values are drawn one by one, ids of concurrent reservations may interleave.
+    """
+    table = model._meta.db_table
+    pk_column = model._meta.pk.column
+    if connection.vendor == 'sqlite':
+        first_id = sqlite_reserve_ids(table, count)
+        return list(range(first_id, first_id + count))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+            [table, pk_column, count])
+        return [task_id for task_id, in cursor.fetchall()]
+
+
+def sqlite_reserve_ids(table, count):
+    """
+    Reserve ids from the AUTOINCREMENT counter of a table, the UPDATE locks the database
+    until the end of the transaction.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO sqlite_sequence (name, seq) SELECT %s, 0 '
+            'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)', [table, table])
+        cursor.execute(
+            'UPDATE sqlite_sequence SET seq = seq + %s WHERE name = %s RETURNING seq',
+            [count, table])
+        return cursor.fetchone()[0] - count + 1
+
+
+def insert_rows(table, columns, rows):
+    """
+    Write rows with INSERT queries, lists being written as JSON arrays (see task.fields).
+    """
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(table), ', '.join(quote(column) for column in columns),
+        ', '.join(['%s'] * len(columns)))
+    rows = [
+        [json.dumps(value) if isinstance(value, list) else value for value in row]
+        for row in rows]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+    return len(rows)
+
+
+def copy_rows(table, columns, rows):
+    """
+    Write rows (iterable of tuples ordered as columns) into table using COPY.
+    Return the number of written rows.
+    """
+    if connection.vendor != 'postgresql':
+        return insert_rows(table, columns, rows)
+    quote = connection.ops.quote_name
+    sql = 'COPY {} ({}) FROM STDIN'.format(
+        quote(table), ', '.join(quote(column) for column in columns))
+    written = 0
+    with connection.cursor() as cursor:
+        with cursor.copy(sql) as copy:
+            for row in rows:
+                copy.write_row(row)
+                written += 1
+    return written
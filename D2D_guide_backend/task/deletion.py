@@ -0,0 +1,83 @@
+"""
+Deletion of tasks with raw set-based DELETE queries, instead of Django's deletion collector
+that loads every row and sends signals for each one.
+Rows are deleted in batches of DELETE_BATCH_SIZE ids, a transaction each unless called
+within one. Each batch does what model signals would: stats, events and tombstones.
+Tasks of a mot are deleted by delete_mot_tasks before the mot itself, outside of any
+transaction so that locks are only held for a batch. Tasks left are deleted in the
+transaction of the mot deletion (see task.signals), the foreign keys of tasks being also
+declared ON DELETE CASCADE in PostgreSQL for rows deleted outside of Django.
+"""
+from django.db import connection, transaction
+
+from task.events import publish_rows
+from task.ical import invalidate_feed
+from task.models import DatedTask, WeekTask
+from task.stats import add_stats, live_counts
+from task.sync import add_tombstones
+
+DELETE_BATCH_SIZE = 5000
+
+
+def id_condition(ids):
+    """
+    Return the SQL condition and params of a column being one of ids.
+    """
+    if connection.vendor == 'postgresql':
+        return '= ANY(%s)', [list(ids)]
+    return 'IN ({})'.format(', '.join(['%s'] * len(ids))), list(ids)
+
+
+def delete_tasks(model, ids):
+    """
+    Delete tasks and their labels without loading them.
+    """
+    quote = connection.ops.quote_name
+    through = model.label.through
+    condition, params = id_condition(ids)
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {} WHERE {} {}'.format(
+            quote(through._meta.db_table),
+            quote(through._meta.get_field(model._meta.model_name).column), condition), params)
+        cursor.execute('DELETE FROM {} WHERE {} {}'.format(
+            quote(model._meta.db_table), quote(model._meta.pk.column), condition), params)
+
+
+def delete_task_batch(model, tasks, batch_size=DELETE_BATCH_SIZE):
+    """
+    Delete at most batch_size tasks of a queryset, return their number.
+    """
+    with transaction.atomic():
+        ids = list(tasks.order_by().values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0
+        batch = model.objects.filter(id__in=ids)
+        add_stats({
+            key: (-total, -done) for key, (total, done) in live_counts(model, batch).items()})
+        publish_rows(model, batch, 'delete')
+        delete_tasks(model, ids)
+        add_tombstones(model, ids)
+    return len(ids)
+
+
+def delete_task_batches(model, tasks, batch_size=DELETE_BATCH_SIZE):
+    """
+    Delete every task of a queryset by batches, return their number.
+    """
+    deleted = 0
+    while count := delete_task_batch(model, tasks, batch_size):
+        deleted += count
+    if deleted:
+        # Tasks left by a mot deletion are deleted within its transaction.
+        transaction.on_commit(invalidate_feed)
+    return deleted
+
+
+def delete_mot_tasks(mot, batch_size=DELETE_BATCH_SIZE):
+    """
+    Delete the tasks of a mot by batches, before deleting it. Each batch is committed on its
+    own when called outside of a transaction.
+    """
+    return (
+        delete_task_batches(DatedTask, DatedTask.objects.filter(related_mot=mot), batch_size)
+        + delete_task_batches(WeekTask, WeekTask.objects.filter(related_mot=mot), batch_size))
@@ -0,0 +1,72 @@
+"""
+Number of tasks and done tasks per day or per week, for the month and year calendar views.
+Counts are computed by GROUP BY queries on the indexed date of dated tasks and
+(year, week_number) of week tasks, instead of reading tasks.
+As for week tasks, the year of a week is the calendar year of its days (see
+task.occurrences.week_occurrences).
+"""
+from django.db.models import Count, Q
+from django.db.models.functions import ExtractWeek, ExtractYear
+
+from task.models import DatedTask, WeekTask, ArchivedDatedTask, ArchivedWeekTask
+from task.occurrences import week_occurrences
+
+GROUP_BY = ['day', 'week']
+
+
+def grouped_counts(querysets, counts, *fields, **expressions):
+    """
+    Add {group: (total, done)} of (queryset, done count) pairs grouped by fields and
+    expressions to counts.
+    """
+    keys = [*fields, *expressions]
+    for queryset, done in querysets:
+        rows = queryset.order_by().values(*fields, **expressions).annotate(
+            total=Count('id'), done_count=done)
+        for row in rows:
+            key = tuple(row[key] for key in keys)
+            total, done_count = counts.get(key, (0, 0))
+            counts[key] = (total + row['total'], done_count + row['done_count'])
+    return counts
+
+
+def get_density(
+        start_date, end_date, group_by='day', label=None, mot=None, include_archived=False):
+    """
+    Return the counts of tasks between two dates, optionally of a label and a mot:
+    {'days': [{date, total, done}], 'weeks': [{year, week_number, total, done}]}.
+    Grouped by day, days count dated tasks and weeks count week tasks. Grouped by week,
+    weeks count both and days is empty. Archived tasks are done tasks.
+    """
+    task_filter = Q()
+    if label is not None:
+        task_filter &= Q(label_ids__contains=[label])
+    if mot is not None:
+        task_filter &= Q(related_mot=mot)
+
+    def querysets(model, archived_model, window):
+        querysets = [(model.objects.filter(window, task_filter), Count('id', filter=Q(done=True)))]
+        if include_archived:
+            querysets.append((archived_model.objects.filter(window, task_filter), Count('id')))
+        return querysets
+
+    dated = querysets(DatedTask, ArchivedDatedTask, Q(date__range=(start_date, end_date)))
+    week = querysets(
+        WeekTask, ArchivedWeekTask, Q(year__range=(start_date.year, end_date.year)))
+    week_counts = grouped_counts(week, {}, 'year', 'week_number')
+    day_counts = {}
+    if group_by == 'week':
+        grouped_counts(
+            dated, week_counts, year=ExtractYear('date'), week_number=ExtractWeek('date'))
+    else:
+        grouped_counts(dated, day_counts, 'date')
+    weeks = set(week_occurrences(start_date, end_date))
+    return {
+        'days': [
+            {'date': day, 'total': total, 'done': done}
+            for (day,), (total, done) in sorted(day_counts.items())],
+        'weeks': [
+            {'year': year, 'week_number': week_number, 'total': total, 'done': done}
+            for (year, week_number), (total, done) in sorted(week_counts.items())
+            if (year, week_number) in weeks],
+    }
@@ -0,0 +1,238 @@
+"""
+Change events pushed to clients, so that they don't need to poll list endpoints.
+An event is {"model", "id", "week", "op"}: week is the ISO week bucket ("2025-W02") of a
+task, None for mots and labels. Bulk writes publish one event per week bucket with a None
+id instead of one per task, clients refresh the whole week.
+Events are published with pg_notify: PostgreSQL delivers them on commit only, to every
+process listening on CHANNEL. Each process keeps a single listening connection (EventHub)
+and fans events out to its clients, served as server-sent events or over a websocket.
+A {"op": "resync"} event tells a client that events may have been lost, it should call
+/sync (see task.sync), as it does when it reconnects.
+"""
+import asyncio
+import logging
+from urllib.parse import parse_qs
+
+import orjson
+import psycopg
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import ExtractIsoYear, ExtractWeek
+
+from task.models import DatedTask, WeekTask
+from task.stats import task_week, stat_values
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'task_events'
+# Events per notification, payloads must stay under 8000 bytes.
+NOTIFY_BATCH_SIZE = 50
+# Events kept for a slow client before it is asked to resync.
+QUEUE_SIZE = 1000
+KEEPALIVE_SECONDS = 15
+RECONNECT_SECONDS = 5
+RESYNC_EVENT = {'model': None, 'id': None, 'week': None, 'op': 'resync'}
+
+NOTIFY_SQL = 'SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload'
+
+
+def events_enabled():
+    return connection.vendor == 'postgresql'
+
+
+def week_bucket(iso_year, iso_week):
+    return f'{iso_year}-W{iso_week:02d}'
+
+
+def instance_event(instance, operation):
+    model = type(instance)
+    week = None
+    if model in [DatedTask, WeekTask]:
+        week = week_bucket(*task_week(model, stat_values(instance)))
+    return {'model': model._meta.model_name, 'id': instance.pk, 'week': week, 'op': operation}
+
+
+def week_events(model, weeks, operation):
+    """
+    Return one event per (iso_year, iso_week) of weeks.
+    """
+    return [
+        {'model': model._meta.model_name, 'id': None, 'week': week_bucket(*week),
+         'op': operation}
+        for week in sorted(set(weeks))]
+
+
+def task_weeks(model, tasks):
+    """
+    Return the distinct (iso_year, iso_week) of a task queryset.
+    """
+    if model is DatedTask:
+        tasks = tasks.annotate(iso_year=ExtractIsoYear('date'), iso_week=ExtractWeek('date'))
+    else:
+        tasks = tasks.annotate(iso_year=F('year'), iso_week=F('week_number'))
+    return tasks.order_by().values_list('iso_year', 'iso_week').distinct()
+
+
+def publish(events):
+    """
+    Notify listeners of events once the current transaction commits.
+    """
+    if not events or not events_enabled():
+        return
+    payloads = [
+        orjson.dumps(events[start:start + NOTIFY_BATCH_SIZE]).decode()
+        for start in range(0, len(events), NOTIFY_BATCH_SIZE)]
+    with connection.cursor() as cursor:
+        cursor.execute(NOTIFY_SQL, [CHANNEL, payloads])
+
+
+def publish_rows(model, rows, operation):
+    """
+    Publish a queryset written in bulk, per week bucket for tasks and per row otherwise.
+    """
+    if not events_enabled():
+        return
+    if model in [DatedTask, WeekTask]:
+        publish(week_events(model, task_weeks(model, rows), operation))
+    else:
+        publish([
+            {'model': model._meta.model_name, 'id': pk, 'week': None, 'op': operation}
+            for pk in rows.order_by('pk').values_list('pk', flat=True)])
+
+
+def listen_params():
+    """
+    Return psycopg connection parameters of the default database, without the ones
+    Django sets for its own synchronous cursors.
+    """
+    params = connection.get_connection_params()
+    return {
+        key: value for key, value in params.items()
+        if key not in ['cursor_factory', 'context']}
+
+
+class EventHub:
+    """
+    Fan out events of CHANNEL to the subscribers of this process.
+    A single connection listens while there are subscribers.
+    """
+
+    def __init__(self):
+        self.queues = set()
+        self.listener = None
+        self.listening = asyncio.Event()
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.queues.add(queue)
+        if self.listener is None or self.listener.done():
+            self.listener = asyncio.ensure_future(self.listen())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.queues.discard(queue)
+        if not self.queues and self.listener is not None:
+            self.listener.cancel()
+            self.listener = None
+            self.listening.clear()
+
+    def dispatch(self, events):
+        for queue in list(self.queues):
+            try:
+                queue.put_nowait(events)
+            except asyncio.QueueFull:
+                # Lost events are replaced by a resync.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait([RESYNC_EVENT])
+
+    async def listen(self):
+        connected = False
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                        **listen_params(), autocommit=True) as listen_connection:
+                    await listen_connection.execute(f'LISTEN {CHANNEL}')
+                    self.listening.set()
+                    if connected:
+                        # Events sent while reconnecting are lost.
+                        self.dispatch([RESYNC_EVENT])
+                    connected = True
+                    async for notify in listen_connection.notifies():
+                        self.dispatch(orjson.loads(notify.payload))
+            except psycopg.OperationalError:
+                self.listening.clear()
+                logger.exception('Listening to %s failed, retrying', CHANNEL)
+                await asyncio.sleep(RECONNECT_SECONDS)
+
+
+hub = EventHub()
+
+
+def event_filters(query_params):
+    """
+    Return (models, weeks) from model and week query params, comma separated, given as
+    lists of values by name.
+    """
+    return tuple(
+        {value for values in query_params.get(name, []) for value in values.split(',') if value}
+        for name in ['model', 'week'])
+
+
+def matching(events, models, weeks):
+    """
+    Return events of models and weeks, every model or week if empty.
+    Events without week (mots, labels) and resync events always match weeks.
+    """
+    return [
+        event for event in events
+        if event['op'] == 'resync' or (
+            (not models or event['model'] in models)
+            and (not weeks or event['week'] is None or event['week'] in weeks))]
+
+
+async def server_sent_events(models, weeks):
+    """
+    Yield server-sent events messages of events, with a comment line as keepalive.
+    """
+    queue = hub.subscribe()
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                events = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if events := matching(events, models, weeks):
+                yield f'event: change\ndata: {orjson.dumps(events).decode()}\n\n'
+    finally:
+        hub.unsubscribe(queue)
+
+
+async def websocket_events(scope, receive, send):
+    """
+    ASGI application sending events as JSON text messages, messages of the client are
+    ignored. Events are filtered with model and week query params, like server-sent events.
+    """
+    if (await receive())['type'] != 'websocket.connect':
+        return
+    models, weeks = event_filters(parse_qs(scope.get('query_string', b'').decode()))
+    await send({'type': 'websocket.accept'})
+    queue = hub.subscribe()
+    received = asyncio.ensure_future(receive())
+    try:
+        while True:
+            got = asyncio.ensure_future(queue.get())
+            await asyncio.wait([received, got], return_when=asyncio.FIRST_COMPLETED)
+            if not got.done():
+                got.cancel()
+            elif events := matching(got.result(), models, weeks):
+                await send({'type': 'websocket.send', 'text': orjson.dumps(events).decode()})
+            if received.done():
+                if received.result()['type'] == 'websocket.disconnect':
+                    return
+                received = asyncio.ensure_future(receive())
+    finally:
+        received.cancel()
+        hub.unsubscribe(queue)
@@ -0,0 +1,264 @@
+"""
+Batch expansion of the occurrences of every mot over a window, for maintenance jobs
+(see the generate_occurrences command).
+Calendar attributes of the window days are computed once and indexed by value (weekday,
+day of month, month end, month and day, week), the occurrences of a mot are then read
+from these indexes between its bounds instead of looping over its days.
+Occurrences are returned as columns, ready to be inserted with a single INSERT per batch
+of mots, skipping the existing and retired ones (see task.occurrences).
+"""
+import heapq
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+
+from django.db import connection, transaction
+
+from task.events import publish, week_events
+from task.models import MultiOccurencesTask, DatedTask, WeekTask
+from task.occurrences import bulk_create_with_labels, mot_table_names, table_names
+from task.stats import refresh_mot_stats
+
+# Mots expanded and inserted together.
+EXPANSION_BATCH_SIZE = 500
+
+MOT_FIELDS = MultiOccurencesTask.recurrence_fields + [
+    'start_date', 'end_date', 'task_name', 'label_ids']
+
+
+class Calendar:
+    """
+    Days of a window, indexed by calendar attributes.
+    """
+
+    def __init__(self, start_date, end_date):
+        self.start_date = start_date
+        self.days = [
+            start_date + timedelta(days=offset)
+            for offset in range((end_date - start_date).days + 1)]
+        self.by_weekday = {}
+        self.by_day = {}
+        self.by_month_day = {}
+        self.month_ends = []
+        # Index of the first day of each week, with its (year, week_number) as for week
+        # tasks (see task.occurrences.week_occurrences): a week spanning a new year is
+        # split, its key being the same at both ends of a year.
+        self.week_starts = []
+        self.weeks = []
+        for index, day in enumerate(self.days):
+            self.by_weekday.setdefault(day.isoweekday(), []).append(index)
+            self.by_day.setdefault(day.day, []).append(index)
+            self.by_month_day.setdefault((day.month, day.day), []).append(index)
+            if (day + timedelta(days=1)).day == 1:
+                self.month_ends.append(index)
+            week = (day.year, day.isocalendar().week)
+            if not self.weeks or self.weeks[-1] != week:
+                self.week_starts.append(index)
+                self.weeks.append(week)
+
+    def bounds(self, mot):
+        """
+        Return the slice of window days within the dates of a mot.
+        """
+        return (
+            max((mot.start_date - self.start_date).days, 0),
+            min((mot.end_date - self.start_date).days + 1, len(self.days)))
+
+    def dated_indexes(self, mot):
+        """
+        Return the sorted day indexes of the dated tasks of a mot, repeated per occurrence.
+        """
+        low, high = self.bounds(mot)
+        if low >= high:
+            return []
+        index_lists = []
+        index_lists += [self.by_weekday.get(value, []) for value in set(mot.every_week or [])]
+        index_lists += [self.by_day.get(value, []) for value in set(mot.every_month or [])]
+        if mot.every_last_day_of_month:
+            index_lists.append(self.month_ends)
+        index_lists += [
+            self.by_month_day.get(value, [])
+            for value in {(date_dict['month'], date_dict['day']) for date_dict in mot.every_year}]
+        index_lists = [
+            indexes[bisect_left(indexes, low):bisect_left(indexes, high)]
+            for indexes in index_lists]
+        index_lists += [range(low, high)] * (mot.number_a_day or 0)
+        return list(heapq.merge(*index_lists))
+
+    def week_range(self, mot):
+        """
+        Return the slice of weeks having days within the dates of a mot.
+        """
+        low, high = self.bounds(mot)
+        if low >= high:
+            return 0, 0
+        return bisect_right(self.week_starts, low) - 1, bisect_left(self.week_starts, high)
+
+
+def expand_mots(mots, calendar):
+    """
+    Return (dated, week) occurrences of mots over the days of calendar, as columns:
+    dated is {'related_mot', 'date', 'occurrence'}, week is
+    {'related_mot', 'year', 'week_number', 'occurrence'}.
+    """
+    dated = {'related_mot': [], 'date': [], 'occurrence': []}
+    week = {'related_mot': [], 'year': [], 'week_number': [], 'occurrence': []}
+    for mot in mots:
+        previous_index, occurrence = None, 0
+        for index in calendar.dated_indexes(mot):
+            occurrence = occurrence + 1 if index == previous_index else 1
+            previous_index = index
+            dated['related_mot'].append(mot.id)
+            dated['date'].append(calendar.days[index])
+            dated['occurrence'].append(occurrence)
+        if mot.number_a_week:
+            # A (year, week_number) starts and ends a year, see Calendar.
+            weeks = dict.fromkeys(calendar.weeks[slice(*calendar.week_range(mot))])
+            for year, week_number in weeks:
+                for occurrence in range(1, mot.number_a_week + 1):
+                    week['related_mot'].append(mot.id)
+                    week['year'].append(year)
+                    week['week_number'].append(week_number)
+                    week['occurrence'].append(occurrence)
+    return dated, week
+
+
+def window_mots(start_date, end_date):
+    """
+    Return mots having dates within the window, with the fields needed to expand them.
+    """
+    return MultiOccurencesTask.objects.filter(
+        start_date__lte=end_date, end_date__gte=start_date, deleting=False
+    ).only(*MOT_FIELDS).order_by('id')
+
+
+def expand_all(start_date, end_date, batch_size=EXPANSION_BATCH_SIZE):
+    """
+    Yield (mots, dated, week) per batch of mots, occurrences being columns of expand_mots.
+    Mots are read with a single query.
+    """
+    calendar = Calendar(start_date, end_date)
+    batch = []
+    for mot in window_mots(start_date, end_date).iterator(chunk_size=batch_size):
+        batch.append(mot)
+        if len(batch) == batch_size:
+            yield batch, *expand_mots(batch, calendar)
+            batch = []
+    if batch:
+        yield batch, *expand_mots(batch, calendar)
+
+
+INSERT_BATCH_SQL = """
+    WITH inserted AS (
+        INSERT INTO {table} ({name}, {done}, {related_mot}, {occurrence}, {label_ids}, {keys})
+        SELECT mot.{mot_name}, false, batch.mot, batch.occurrence, mot.{mot_label_ids}, {values}
+        FROM unnest(%(mots)s::bigint[], %(occurrences)s::integer[], {arrays})
+            AS batch (mot, occurrence, {aliases})
+        JOIN {mot_table} AS mot ON mot.{mot_pk} = batch.mot
+        WHERE NOT EXISTS (
+            SELECT 1 FROM {retired} AS retired
+            WHERE retired.{related_mot} = batch.mot AND retired.{occurrence} = batch.occurrence
+            AND {retired_keys}
+        )
+        ON CONFLICT DO NOTHING
+        RETURNING {pk}, {related_mot}, {key_columns}
+    ), labels AS (
+        INSERT INTO {through} ({through_task}, {through_label})
+        SELECT inserted.{pk}, mot_label.{mot_through_label}
+        FROM inserted
+        JOIN {mot_through} AS mot_label ON mot_label.{mot_through_mot} = inserted.{related_mot}
+    )
+    SELECT {related_mot}, {key_columns} FROM inserted
+"""
+
+
+def postgresql_insert(model, columns, key_types):
+    """
+    Insert occurrence columns of a task model, key_types being the
+    (field, PostgreSQL array type) of the date or week of tasks.
+    Return the (mot id, date or year and week_number) of inserted tasks.
+    """
+    quote = connection.ops.quote_name
+    mot_meta = MultiOccurencesTask._meta
+    keys = [field for field, _ in key_types]
+    key_columns = ', '.join(quote(model._meta.get_field(field).column) for field in keys)
+    names = {
+        **table_names(model), **mot_table_names(MultiOccurencesTask),
+        'mot_table': quote(mot_meta.db_table),
+        'mot_pk': quote(mot_meta.pk.column),
+        'mot_name': quote(mot_meta.get_field('task_name').column),
+        'mot_label_ids': quote(mot_meta.get_field('label_ids').column),
+        'keys': key_columns,
+        'key_columns': key_columns,
+        'values': ', '.join(f'batch.{field}' for field in keys),
+        'arrays': ', '.join(f'%({field})s::{array_type}' for field, array_type in key_types),
+        'aliases': ', '.join(keys),
+        # Retired occurrences have the columns of tasks.
+        'retired_keys': ' AND '.join(
+            f'retired.{quote(model._meta.get_field(field).column)} = batch.{field}'
+            for field in keys),
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(INSERT_BATCH_SQL.format(**names), {
+            'mots': columns['related_mot'], 'occurrences': columns['occurrence'],
+            **{field: columns[field] for field in keys}})
+        return cursor.fetchall()
+
+
+def python_insert(model, columns, mots):
+    """
+    Portable insert of occurrence columns, one bulk insert per mot.
+    Return the (mot id, date or year and week_number) of inserted tasks.
+    """
+    rows = {}
+    fields = list(columns)
+    keys = [field for field in fields if field not in ['related_mot', 'occurrence']]
+    for values in zip(*columns.values()):
+        row = dict(zip(fields, values))
+        rows.setdefault(row.pop('related_mot'), []).append(row)
+    inserted = []
+    for mot in mots:
+        inserted += [
+            (mot.id, *(getattr(task, field) for field in keys))
+            for task in bulk_create_with_labels(model, [
+                model(name=mot.task_name, related_mot=mot, label_ids=mot.label_ids, **row)
+                for row in rows.get(mot.id, [])], mot)]
+    return inserted
+
+
+def insert_occurrences(mots, dated, week):
+    """
+    Insert missing occurrences of a batch of mots, return
+    {task model: [(mot id, date or year and week_number)]} of inserted tasks.
+    """
+    if connection.vendor == 'postgresql':
+        return {
+            DatedTask: postgresql_insert(DatedTask, dated, [('date', 'date[]')]),
+            WeekTask: postgresql_insert(
+                WeekTask, week, [('year', 'integer[]'), ('week_number', 'integer[]')]),
+        }
+    return {
+        DatedTask: python_insert(DatedTask, dated, mots),
+        WeekTask: python_insert(WeekTask, week, mots),
+    }
+
+
+def generate_occurrences(start_date, end_date, batch_size=EXPANSION_BATCH_SIZE):
+    """
+    Create the missing tasks of every mot between start and end dates, one transaction per
+    batch of mots. Return (number of mots, number of created tasks).
+    """
+    mot_count, created = 0, 0
+    for mots, dated, week in expand_all(start_date, end_date, batch_size):
+        with transaction.atomic():
+            inserted = insert_occurrences(mots, dated, week)
+            # Bulk writes don't send model signals.
+            mot_ids = {row[0] for rows in inserted.values() for row in rows}
+            for mot in mots:
+                if mot.id in mot_ids:
+                    refresh_mot_stats(mot)
+            publish(week_events(DatedTask, [
+                tuple(day.isocalendar())[:2] for _, day in inserted[DatedTask]], 'create'))
+            publish(week_events(WeekTask, [tuple(row[1:]) for row in inserted[WeekTask]], 'create'))
+        mot_count += len(mots)
+        created += sum(len(rows) for rows in inserted.values())
+    return mot_count, created
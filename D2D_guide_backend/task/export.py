@@ -0,0 +1,83 @@
+"""
+Streaming export of tasks.
+Rows are read through server side cursors and labels are resolved once per chunk,
+so that memory doesn't depend on the number of exported rows.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from task.models import DatedTask, WeekTask, MultiOccurencesTask
+
+# Number of rows fetched from the server side cursor at once.
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORTS = {
+    'dated_task': (DatedTask, ['id', 'name', 'date', 'done', 'related_mot']),
+    'week_task': (WeekTask, ['id', 'name', 'year', 'week_number', 'done', 'related_mot']),
+    'multi_occurences_task': (MultiOccurencesTask, [
+        'id', 'name', 'task_name', 'done', 'start_date', 'end_date', 'every_week', 'every_month',
+        'every_last_day_of_month', 'every_year', 'number_a_day', 'number_a_week']),
+}
+
+
+class Echo:
+    """
+    File-like object that returns what is written, used to stream csv.
+    https://docs.djangoproject.com/en/5.1/howto/outputting-csv/#streaming-large-csv-files
+    """
+    def write(self, value):
+        return value
+
+
+def labels_by_task(model, task_ids):
+    """
+    Return a dict {task id: [label names]} for the given tasks, in a single query.
+    """
+    through = model.label.through
+    task_field = model._meta.model_name
+    labels = {}
+    for task_id, label_name in through.objects.filter(
+            **{f'{task_field}__in': task_ids}).order_by('label__name').values_list(
+            task_field, 'label__name'):
+        labels.setdefault(task_id, []).append(label_name)
+    return labels
+
+
+def export_rows(model, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield dicts of exported fields, with label names, ordered by id.
+    """
+    queryset = model.objects.order_by('id').values(*fields)
+    chunk = []
+    for row in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield from with_labels(model, chunk)
+            chunk = []
+    yield from with_labels(model, chunk)
+
+
+def with_labels(model, chunk):
+    if not chunk:
+        return
+    labels = labels_by_task(model, [row['id'] for row in chunk])
+    for row in chunk:
+        row['label'] = labels.get(row['id'], [])
+        yield row
+
+
+def stream_csv(model, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields + ['label'])
+    for row in export_rows(model, fields):
+        row['label'] = '|'.join(row['label'])
+        # Recurrence fields are lists, write them as json rather than python repr.
+        yield writer.writerow([
+            json.dumps(value) if isinstance(value, list) else value for value in row.values()])
+
+
+def stream_ndjson(model, fields):
+    for row in export_rows(model, fields):
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
@@ -0,0 +1,132 @@
+"""
+Portable fields and indexes: PostgreSQL types and indexes on PostgreSQL, equivalents on
+other databases (SQLite for tests), so that the same models run on both.
+Arrays are stored as JSON text outside PostgreSQL, their lookups use json_each.
+"""
+import json
+
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.fields.array import (
+    ArrayContainedBy, ArrayContains, ArrayExact, ArrayLenTransform, ArrayOverlap)
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db.models import Index
+
+
+def is_postgresql(connection):
+    return connection.vendor == 'postgresql'
+
+
+class PortableArrayField(ArrayField):
+    """
+    ArrayField on PostgreSQL, JSON array stored as text elsewhere.
+    """
+
+    def db_type(self, connection):
+        if is_postgresql(connection):
+            return super().db_type(connection)
+        return 'text'
+
+    def cast_db_type(self, connection):
+        if is_postgresql(connection):
+            return super().cast_db_type(connection)
+        return 'text'
+
+    def get_placeholder(self, value, compiler, connection):
+        if is_postgresql(connection):
+            return super().get_placeholder(value, compiler, connection)
+        return '%s'
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if value is None or is_postgresql(connection):
+            return value
+        return json.dumps(value)
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+
+
+class JSONArrayLookupMixin:
+    """
+    Compile an array lookup with sqlite_template outside PostgreSQL, lhs and rhs being JSON
+    arrays.
+    """
+    sqlite_template = None
+
+    def __init__(self, lhs, rhs):
+        # Array lookups wrap list values in an ARRAY[] expression, keep the list.
+        self.json_rhs = list(rhs) if isinstance(rhs, (list, tuple)) else None
+        super().__init__(lhs, rhs)
+
+    def as_sqlite(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        if self.json_rhs is not None:
+            base_field = self.lhs.output_field.base_field
+            rhs, rhs_params = '%s', [
+                json.dumps([base_field.get_prep_value(value) for value in self.json_rhs])]
+        else:
+            rhs, rhs_params = compiler.compile(self.rhs)
+        return self.sqlite_template % {'lhs': lhs, 'rhs': rhs}, (*lhs_params, *rhs_params)
+
+
+@PortableArrayField.register_lookup
+class PortableArrayContains(JSONArrayLookupMixin, ArrayContains):
+    sqlite_template = (
+        'NOT EXISTS (SELECT 1 FROM json_each(%(rhs)s) AS r '
+        'WHERE r.value NOT IN (SELECT value FROM json_each(%(lhs)s)))')
+
+
+@PortableArrayField.register_lookup
+class PortableArrayContainedBy(JSONArrayLookupMixin, ArrayContainedBy):
+    sqlite_template = (
+        'NOT EXISTS (SELECT 1 FROM json_each(%(lhs)s) AS l '
+        'WHERE l.value NOT IN (SELECT value FROM json_each(%(rhs)s)))')
+
+
+@PortableArrayField.register_lookup
+class PortableArrayOverlap(JSONArrayLookupMixin, ArrayOverlap):
+    sqlite_template = (
+        'EXISTS (SELECT 1 FROM json_each(%(lhs)s) AS l, json_each(%(rhs)s) AS r '
+        'WHERE l.value = r.value)')
+
+
+@PortableArrayField.register_lookup
+class PortableArrayExact(JSONArrayLookupMixin, ArrayExact):
+    sqlite_template = 'json(%(lhs)s) = json(%(rhs)s)'
+
+
+@PortableArrayField.register_lookup
+class PortableArrayLenTransform(ArrayLenTransform):
+
+    def as_sqlite(self, compiler, connection):
+        lhs, params = compiler.compile(self.lhs)
+        return f'json_array_length({lhs})', params
+
+
+class PortableGinIndex(GinIndex):
+    """
+    GinIndex on PostgreSQL, B-tree index of the same fields or expressions elsewhere,
+    operator classes being dropped.
+    """
+
+    def btree_index(self):
+        expressions = [
+            expression.get_source_expressions()[0] if isinstance(expression, OpClass)
+            else expression for expression in self.expressions]
+        return Index(*expressions, fields=self.fields, name=self.name)
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if is_postgresql(schema_editor.connection):
+            return super().create_sql(model, schema_editor, using, **kwargs)
+        return self.btree_index().create_sql(model, schema_editor, **kwargs)
+
+    def remove_sql(self, model, schema_editor, **kwargs):
+        if is_postgresql(schema_editor.connection):
+            return super().remove_sql(model, schema_editor, **kwargs)
+        return self.btree_index().remove_sql(model, schema_editor, **kwargs)
+
+    def check_supported(self, schema_editor):
+        if is_postgresql(schema_editor.connection):
+            super().check_supported(schema_editor)
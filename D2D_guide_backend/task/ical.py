@@ -0,0 +1,228 @@
+"""
+iCalendar (RFC 5545) feed of tasks.
+Each multi occurences task is written once with a RRULE instead of one component per
+occurrence, done occurrences are written as overrides (RECURRENCE-ID) of the rule.
+"""
+import hashlib
+from datetime import date, datetime, timedelta, timezone
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from task.models import DatedTask, WeekTask, MultiOccurencesTask
+from task.utils import month_range
+
+FEED_CACHE_KEY = 'task_calendar_feed'
+# Cached feed is invalidated by model signals. Timeout bounds staleness when the cache
+# backend is not shared between processes (default local memory cache).
+FEED_CACHE_TIMEOUT = 300
+WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+
+def escape_text(value):
+    return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\n', '\\n'))
+
+
+def fold(line):
+    """
+    Fold content lines longer than 75 octets.
+    """
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while encoded:
+        # Do not cut in the middle of a multi bytes character.
+        size = 75 if not parts else 74
+        while size < len(encoded) and (encoded[size] & 0xC0) == 0x80:
+            size -= 1
+        parts.append(encoded[:size].decode())
+        encoded = encoded[size:]
+    return '\r\n '.join(parts)
+
+
+def ical_date(value):
+    return value.strftime('%Y%m%d')
+
+
+def recurrence_rules(mot):
+    """
+    Return a list of (uid suffix, rrule without UNTIL, does date match rule) for a mot.
+    Every year dates cannot be expressed with a single rule, they get one rule each.
+    """
+    if mot.every_week:
+        days = ','.join(WEEKDAYS[day - 1] for day in sorted(mot.every_week))
+        return [('', f'FREQ=WEEKLY;BYDAY={days}',
+                 lambda day: day.isoweekday() in mot.every_week)]
+    if mot.every_month:
+        days = ','.join(str(day) for day in sorted(mot.every_month))
+        return [('', f'FREQ=MONTHLY;BYMONTHDAY={days}', lambda day: day.day in mot.every_month)]
+    if mot.every_last_day_of_month:
+        return [('', 'FREQ=MONTHLY;BYMONTHDAY=-1',
+                 lambda day: day.day == month_range(day.year, day.month))]
+    if mot.every_year:
+        return [
+            (f'-{date_dict["month"]}-{date_dict["day"]}',
+             f'FREQ=YEARLY;BYMONTH={date_dict["month"]};BYMONTHDAY={date_dict["day"]}',
+             lambda day, date_dict=date_dict: (day.month, day.day) == (
+                 date_dict['month'], date_dict['day']))
+            for date_dict in sorted(mot.every_year, key=lambda d: (d['month'], d['day']))]
+    if mot.number_a_day:
+        return [('', 'FREQ=DAILY', lambda day: True)]
+    return [('', 'FREQ=WEEKLY', lambda day: day.weekday() == mot.start_date.weekday())]
+
+
+def first_occurrence(mot, matches):
+    """
+    DTSTART must be the first instance of the rule.
+    """
+    running_date = mot.start_date
+    while running_date <= mot.end_date:
+        if matches(running_date):
+            return running_date
+        running_date = running_date + timedelta(days=1)
+    return None
+
+
+def week_occurrence(mot, year, week_number):
+    """
+    Return the rule instance (same weekday as start_date) of a mot week task.
+    Week tasks year is the calendar year of a day of the week, not always its iso year.
+    """
+    for iso_year in (year, year + 1, year - 1):
+        try:
+            monday = date.fromisocalendar(iso_year, week_number, 1)
+        except ValueError:
+            continue
+        days = [monday + timedelta(days=i) for i in range(7)]
+        occurrence = days[mot.start_date.weekday()]
+        if (any(day.year == year for day in days) and
+                mot.start_date <= occurrence <= mot.end_date):
+            return occurrence
+    return None
+
+
+def summary(mot):
+    if mot.number_a_day:
+        return f'{mot.task_name} (x{mot.number_a_day} a day)'
+    if mot.number_a_week:
+        return f'{mot.task_name} (x{mot.number_a_week} a week)'
+    return mot.task_name
+
+
+def status_lines(done, total):
+    if done >= total:
+        return ['STATUS:COMPLETED', 'PERCENT-COMPLETE:100']
+    if done:
+        return ['STATUS:IN-PROCESS', f'PERCENT-COMPLETE:{done * 100 // total}']
+    return ['STATUS:NEEDS-ACTION']
+
+
+def categories(labels):
+    names = ','.join(escape_text(label.name) for label in labels)
+    return [f'CATEGORIES:{names}'] if names else []
+
+
+def todo(uid, start, summary_text, labels, extra):
+    return [
+        'BEGIN:VTODO',
+        f'UID:{uid}',
+        f'DTSTART;VALUE=DATE:{ical_date(start)}',
+        f'SUMMARY:{escape_text(summary_text)}',
+        *categories(labels),
+        *extra,
+        'END:VTODO',
+    ]
+
+
+def done_occurrences():
+    """
+    Return {mot id: {date: (done count, total count)}} of mot occurrences having done tasks.
+    """
+    overrides = {}
+    days = DatedTask.objects.filter(related_mot__isnull=False).values(
+        'related_mot', 'date').annotate(
+        total=Count('id'), done=Count('id', filter=Q(done=True))).filter(done__gt=0)
+    for day in days:
+        overrides.setdefault(day['related_mot'], {})[day['date']] = (day['done'], day['total'])
+    weeks = WeekTask.objects.filter(related_mot__isnull=False).values(
+        'related_mot', 'year', 'week_number').annotate(
+        total=Count('id'), done=Count('id', filter=Q(done=True))).filter(done__gt=0)
+    for week in weeks:
+        overrides.setdefault(week['related_mot'], {})[
+            (week['year'], week['week_number'])] = (week['done'], week['total'])
+    return overrides
+
+
+def mot_components(mot, overrides):
+    labels = list(mot.label.all())
+    if mot.number_a_week:
+        # Week tasks are keyed by (year, week_number), convert them to rule instances.
+        overrides = {
+            week_occurrence(mot, *week): counts for week, counts in overrides.items()}
+        overrides.pop(None, None)
+    lines = []
+    for uid_suffix, rule, matches in recurrence_rules(mot):
+        start = first_occurrence(mot, matches)
+        if start is None:
+            continue
+        uid = f'mot-{mot.id}{uid_suffix}@d2dguide'
+        lines += todo(uid, start, summary(mot), labels, [
+            f'RRULE:{rule};UNTIL={ical_date(mot.end_date)}', 'STATUS:NEEDS-ACTION'])
+        for occurrence, (done, total) in sorted(overrides.items()):
+            if not matches(occurrence):
+                continue
+            lines += todo(uid, occurrence, summary(mot), labels, [
+                f'RECURRENCE-ID;VALUE=DATE:{ical_date(occurrence)}',
+                *status_lines(done, total)])
+    return lines
+
+
+def build_feed():
+    """
+    Return (etag, body) of the whole calendar.
+    """
+    lines = []
+    overrides = done_occurrences()
+    for mot in MultiOccurencesTask.objects.prefetch_related('label').order_by('id'):
+        lines += mot_components(mot, overrides.get(mot.id, {}))
+    for task in DatedTask.objects.filter(related_mot__isnull=True).prefetch_related(
+            'label').order_by('id'):
+        lines += todo(
+            f'dated-task-{task.id}@d2dguide', task.date, task.name, task.label.all(),
+            status_lines(int(task.done), 1))
+    for task in WeekTask.objects.filter(related_mot__isnull=True).prefetch_related(
+            'label').order_by('id'):
+        monday = date.fromisocalendar(task.year, task.week_number, 1)
+        lines += todo(
+            f'week-task-{task.id}@d2dguide', monday, task.name, task.label.all(),
+            [f'DUE;VALUE=DATE:{ical_date(monday + timedelta(weeks=1))}',
+             *status_lines(int(task.done), 1)])
+    # Etag only depends on data, not on the time the feed was built.
+    etag = hashlib.md5('\n'.join(lines).encode()).hexdigest()
+    stamp = f'DTSTAMP:{datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")}'
+    body = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//D2Dguide//tasks//EN',
+        'CALSCALE:GREGORIAN',
+    ]
+    for line in lines:
+        body.append(fold(line))
+        if line.startswith('UID:'):
+            body.append(stamp)
+    body.append('END:VCALENDAR')
+    return f'"{etag}"', '\r\n'.join(body) + '\r\n'
+
+
+def get_feed():
+    feed = cache.get(FEED_CACHE_KEY)
+    if feed is None:
+        feed = build_feed()
+        cache.set(FEED_CACHE_KEY, feed, FEED_CACHE_TIMEOUT)
+    return feed
+
+
+def invalidate_feed():
+    cache.delete(FEED_CACHE_KEY)
@@ -0,0 +1,228 @@
+"""
+Bulk import of tasks and labels from csv or ndjson files.
+Rows are validated in a single streaming pass, label names are resolved in bulk, then
+everything is written with COPY in one transaction. Nothing is written if a row is invalid.
+"""
+import csv
+import json
+from datetime import date
+
+from django.db import transaction
+
+from task.bulk import reserve_ids, copy_rows
+from task.events import publish, week_events
+from task.ical import invalidate_feed
+from task.models import DatedTask, WeekTask, Label
+from task.stats import task_counts, add_stats, merge
+from task.utils import number_of_weeks
+
+IMPORT_FORMATS = ['csv', 'ndjson']
+IMPORT_MODELS = ['task', 'label']
+# Separator of label names in csv files, same as export.
+CSV_LABEL_SEPARATOR = '|'
+# Maximum number of invalid rows detailed in the error report.
+MAX_REPORTED_ERRORS = 1000
+NAME_MAX_LENGTH = Label._meta.get_field('name').max_length
+TRUE_VALUES = ['true', '1', 'yes']
+FALSE_VALUES = ['false', '0', 'no', '']
+
+
+class InvalidImportError(Exception):
+    """
+    Raised when a file cannot be imported, holds the report of every invalid row.
+    """
+    def __init__(self, errors, error_count):
+        super().__init__(f'{error_count} invalid rows')
+        self.errors = errors
+        self.error_count = error_count
+
+
+def read_rows(stream, file_format):
+    """
+    Yield (line number, row dict) from a text stream, row is None if it cannot be parsed.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else None
+
+
+def parse_name(row, errors):
+    name = row.get('name')
+    if not isinstance(name, str) or not name.strip():
+        errors.append('name is required')
+    elif len(name) > NAME_MAX_LENGTH:
+        errors.append(f'name must have at most {NAME_MAX_LENGTH} characters')
+    return name
+
+
+def parse_done(row, errors):
+    done = row.get('done', False)
+    if isinstance(done, bool):
+        return done
+    if isinstance(done, str) and done.lower() in TRUE_VALUES + FALSE_VALUES:
+        return done.lower() in TRUE_VALUES
+    errors.append('done must be a boolean')
+    return False
+
+
+def parse_int(row, field, errors):
+    try:
+        return int(row.get(field))
+    except (TypeError, ValueError):
+        errors.append(f'{field} must be an integer')
+        return None
+
+
+def parse_labels(row, errors):
+    labels = row.get('label') or []
+    if isinstance(labels, str):
+        labels = labels.split(CSV_LABEL_SEPARATOR)
+    if not isinstance(labels, list) or not all(isinstance(label, str) for label in labels):
+        errors.append('label must be a list of label names')
+        return []
+    labels = [label.strip() for label in labels if label.strip()]
+    if any(len(label) > NAME_MAX_LENGTH for label in labels):
+        errors.append(f'label names must have at most {NAME_MAX_LENGTH} characters')
+    return list(dict.fromkeys(labels))
+
+
+class TaskImporter:
+    """
+    Validate then load a file of tasks (model='task') or labels (model='label').
+    Task rows have a name, an optional done and label, and either a date (dated task)
+    or a year and a week_number (week task).
+    """
+
+    def __init__(self, model='task'):
+        self.model = model
+        self.dated_rows = []
+        self.week_rows = []
+        self.label_names = []
+        self.errors = []
+        self.error_count = 0
+
+    def add_error(self, line_number, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line_number, 'errors': errors})
+
+    def validate(self, stream, file_format):
+        """
+        Validate every row, keeping only the values needed to write them.
+        """
+        for line_number, row in read_rows(stream, file_format):
+            if row is None:
+                self.add_error(line_number, ['row must be a json object'])
+                continue
+            errors = []
+            if self.model == 'label':
+                name = parse_name(row, errors)
+                if not errors:
+                    self.label_names.append(name)
+            else:
+                self.validate_task(row, errors)
+            if errors:
+                self.add_error(line_number, errors)
+
+    def validate_task(self, row, errors):
+        name = parse_name(row, errors)
+        done = parse_done(row, errors)
+        labels = parse_labels(row, errors)
+        if row.get('date'):
+            try:
+                task_date = date.fromisoformat(str(row['date']))
+            except ValueError:
+                errors.append('date must have the format YYYY-MM-DD')
+            if not errors:
+                self.dated_rows.append((name, done, task_date, labels))
+            return
+        year = parse_int(row, 'year', errors)
+        week_number = parse_int(row, 'week_number', errors)
+        if year is not None and year < 2024:
+            errors.append('year must be greater than or equal to 2024')
+        elif year is not None and week_number is not None and not (
+                1 <= week_number <= number_of_weeks(year)):
+            errors.append(f'week_number must be within range [1,{number_of_weeks(year)}]')
+        if not errors:
+            self.week_rows.append((name, done, year, week_number, labels))
+
+    def resolve_labels(self):
+        """
+        Return {label name: label id} for every label of the file, creating missing ones.
+        """
+        names = set(self.label_names)
+        for row in self.dated_rows + self.week_rows:
+            names.update(row[-1])
+        label_ids = {}
+        for label_id, name in Label.objects.filter(name__in=names).order_by(
+                '-id').values_list('id', 'name'):
+            label_ids[name] = label_id
+        missing = [Label(name=name) for name in sorted(names - set(label_ids))]
+        for label in Label.objects.bulk_create(missing):
+            label_ids[label.name] = label.id
+        self.created_labels = len(missing)
+        return label_ids
+
+    def write_tasks(self, model, fields, rows, label_ids):
+        if not rows:
+            return 0
+        columns = ['id', 'label_ids'] + [model._meta.get_field(field).column for field in fields]
+        through = model.label.through
+        task_column = through._meta.get_field(model._meta.model_name).column
+        ids = reserve_ids(model, len(rows))
+        copy_rows(model._meta.db_table, columns, (
+            (task_id, sorted(label_ids[name] for name in row[-1]), *row[:-1])
+            for task_id, row in zip(ids, rows)))
+        copy_rows(through._meta.db_table, [task_column, 'label_id'], (
+            (task_id, label_ids[name]) for task_id, row in zip(ids, rows) for name in row[-1]))
+        return len(rows)
+
+    def stat_counts(self, label_ids):
+        counts = {}
+        for name, done, task_date, labels in self.dated_rows:
+            merge(counts, task_counts(
+                DatedTask, {'date': task_date, 'done': done, 'related_mot_id': None},
+                [label_ids[label] for label in labels]))
+        for name, done, year, week_number, labels in self.week_rows:
+            merge(counts, task_counts(
+                WeekTask,
+                {'year': year, 'week_number': week_number, 'done': done, 'related_mot_id': None},
+                [label_ids[label] for label in labels]))
+        return counts
+
+    def events(self):
+        return week_events(DatedTask, [
+            tuple(task_date.isocalendar())[:2] for _, _, task_date, _ in self.dated_rows
+        ], 'create') + week_events(WeekTask, [
+            (year, week_number) for _, _, year, week_number, _ in self.week_rows
+        ], 'create')
+
+    def load(self, stream, file_format):
+        """
+        Import the file and return the number of created objects per model.
+        Raise InvalidImportError without writing anything if a row is invalid.
+        """
+        self.validate(stream, file_format)
+        if self.error_count:
+            raise InvalidImportError(self.errors, self.error_count)
+        with transaction.atomic():
+            label_ids = self.resolve_labels()
+            dated_count = self.write_tasks(
+                DatedTask, ['name', 'done', 'date'], self.dated_rows, label_ids)
+            week_count = self.write_tasks(
+                WeekTask, ['name', 'done', 'year', 'week_number'], self.week_rows, label_ids)
+            add_stats(self.stat_counts(label_ids))
+            publish(self.events())
+        # COPY doesn't send model signals.
+        invalidate_feed()
+        return {'label': self.created_labels, 'dated_task': dated_count, 'week_task': week_count}
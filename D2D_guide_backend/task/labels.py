@@ -0,0 +1,112 @@
+"""
+Denormalized label ids of tasks.
+label_ids of a task holds the sorted ids of its labels, so that label filters use the
+GIN index of the array instead of joining the through table. It is kept in sync by
+m2m_changed signals and written directly by bulk writes.
+Array expressions are PostgreSQL only, other databases update tasks one by one.
+"""
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db import connection
+from django.db.models import F, Func, OuterRef, Value
+from django.db.models.functions import Now
+
+from task.events import instance_event, publish, publish_rows
+from task.models import DatedTask, WeekTask, MultiOccurencesTask
+from task.occurrences import mot_table_names, table_names
+from task.stats import refresh_mot_stats
+
+LABELLED_MODELS = [DatedTask, WeekTask, MultiOccurencesTask]
+# Tasks updated by a query when a label is deleted.
+UPDATE_BATCH_SIZE = 5000
+
+# Labels of a mot missing on its tasks, inserted in a single statement.
+ADD_MOT_LABELS_SQL = """
+    INSERT INTO {through} ({through_task}, {through_label})
+    SELECT task.{pk}, mot_label.{mot_through_label}
+    FROM {table} AS task
+    JOIN {mot_through} AS mot_label ON mot_label.{mot_through_mot} = task.{related_mot}
+    WHERE task.{related_mot} = %s AND NOT EXISTS (
+        SELECT 1 FROM {through} AS link
+        WHERE link.{through_task} = task.{pk}
+        AND link.{through_label} = mot_label.{mot_through_label})
+"""
+
+
+def sync_label_ids(model, task_ids):
+    """
+    Set label_ids of tasks from their through table rows, in a single UPDATE.
+    """
+    through = model.label.through
+    task_field = model._meta.model_name
+    publish_rows(model, model.objects.filter(pk__in=task_ids), 'update')
+    if connection.vendor != 'postgresql':
+        return set_label_ids(model, model.objects.filter(pk__in=task_ids))
+    return model.objects.filter(pk__in=task_ids).update(
+        updated_at=Now(),
+        label_ids=ArraySubquery(through.objects.filter(
+            **{task_field: OuterRef('pk')}).order_by('label_id').values('label_id')))
+
+
+def set_label_ids(model, tasks):
+    """
+    Set label_ids of tasks from their through table rows, one UPDATE per task.
+    """
+    through = model.label.through
+    task_field = f'{model._meta.model_name}_id'
+    label_ids = {task_id: [] for task_id in tasks.values_list('pk', flat=True)}
+    links = through.objects.filter(**{f'{task_field}__in': list(label_ids)})
+    for task_id, label_id in links.order_by('label_id').values_list(task_field, 'label_id'):
+        label_ids[task_id].append(label_id)
+    for task_id, task_label_ids in label_ids.items():
+        model.objects.filter(pk=task_id).update(label_ids=task_label_ids, updated_at=Now())
+    return len(label_ids)
+
+
+def sync_task_label_ids(task):
+    """
+    Set label_ids of a task, in database and on the instance so that a later save
+    doesn't write back stale ids.
+    """
+    through = type(task).label.through
+    task.label_ids = list(through.objects.filter(
+        **{type(task)._meta.model_name: task.pk}).order_by('label_id').values_list(
+        'label_id', flat=True))
+    type(task).objects.filter(pk=task.pk).update(label_ids=task.label_ids, updated_at=Now())
+    publish([instance_event(task, 'update')])
+
+
+def set_mot_task_labels(mot):
+    """
+    Give the labels of a mot to its tasks, with one delete and one insert of through rows
+    and one UPDATE of label_ids per task model. Stats of the mot are then recomputed.
+    """
+    label_ids = sorted(mot.label.values_list('id', flat=True))
+    for model in [DatedTask, WeekTask]:
+        tasks = model.objects.filter(related_mot=mot)
+        model.label.through.objects.filter(
+            **{f'{model._meta.model_name}__related_mot': mot}).exclude(
+            label_id__in=label_ids).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(ADD_MOT_LABELS_SQL.format(
+                **table_names(model), **mot_table_names(MultiOccurencesTask)), [mot.id])
+        publish_rows(model, tasks, 'update')
+        tasks.update(label_ids=label_ids, updated_at=Now())
+    refresh_mot_stats(mot)
+
+
+def remove_label_id(label_id, batch_size=UPDATE_BATCH_SIZE):
+    """
+    Remove a deleted label from label_ids of every task, by batches.
+    """
+    for model in LABELLED_MODELS:
+        tasks = model.objects.filter(label_ids__contains=[label_id]).order_by()
+        while ids := list(tasks.values_list('pk', flat=True)[:batch_size]):
+            batch = model.objects.filter(pk__in=ids)
+            publish_rows(model, batch, 'update')
+            if connection.vendor != 'postgresql':
+                # Links are deleted already by the deletion collector.
+                set_label_ids(model, batch)
+                continue
+            batch.update(
+                updated_at=Now(),
+                label_ids=Func(F('label_ids'), Value(label_id), function='array_remove'))
@@ -0,0 +1,36 @@
+"""
+Move old done tasks to the archive tables, see task.archive.
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from task.archive import (
+    ARCHIVE_AFTER_MONTHS, ARCHIVE_BATCH_SIZE, months_before, archive_tasks, purge_archives)
+
+
+class Command(BaseCommand):
+    help = 'Archive done tasks older than a number of months, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int, default=ARCHIVE_AFTER_MONTHS,
+            help='Archive done tasks older than this number of months.')
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument(
+            '--purge-months', type=int,
+            help='Also delete archived tasks older than this number of months, '
+                 'they are still counted by rollups.')
+        parser.add_argument(
+            '--today', type=date.fromisoformat, default=date.today(),
+            help='Reference date, YYYY-MM-DD.')
+
+    def handle(self, *args, **options):
+        archived = archive_tasks(
+            months_before(options['today'], options['months']), options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(', '.join(
+            f'{count} {model} archived' for model, count in archived.items())))
+        if options['purge_months'] is not None:
+            purged = purge_archives(months_before(options['today'], options['purge_months']))
+            self.stdout.write(self.style.SUCCESS(', '.join(
+                f'{count} {model} purged' for model, count in purged.items())))
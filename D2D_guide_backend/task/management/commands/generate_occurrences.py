@@ -0,0 +1,32 @@
+"""
+Create the missing tasks of every mot over a window, see task.expansion.
+"""
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+
+from task.expansion import EXPANSION_BATCH_SIZE, generate_occurrences
+
+HORIZON_WEEKS = 52
+
+
+class Command(BaseCommand):
+    help = (
+        'Create missing tasks of every mot between two dates, existing ones are kept. '
+        'Archived tasks are not known, the window should start after the archive cutoff.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start', type=date.fromisoformat, default=date.today(),
+            help='First day of the window, YYYY-MM-DD.')
+        parser.add_argument(
+            '--weeks', type=int, default=HORIZON_WEEKS,
+            help='Number of weeks of the window.')
+        parser.add_argument('--batch-size', type=int, default=EXPANSION_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        end_date = options['start'] + timedelta(weeks=options['weeks']) - timedelta(days=1)
+        mot_count, created = generate_occurrences(
+            options['start'], end_date, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{mot_count} mots expanded, {created} tasks created.'))
@@ -0,0 +1,34 @@
+"""
+Import tasks or labels from a csv or ndjson file, see task.importer.
+"""
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from task.importer import TaskImporter, InvalidImportError, IMPORT_FORMATS, IMPORT_MODELS
+
+
+class Command(BaseCommand):
+    help = 'Import tasks or labels from a csv or ndjson file, in a single transaction.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=Path)
+        parser.add_argument('--model', choices=IMPORT_MODELS, default='task')
+        parser.add_argument(
+            '--format', choices=IMPORT_FORMATS,
+            help='File format, deduced from the file extension by default.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        import_format = options['format'] or path.suffix.lstrip('.').lower()
+        if import_format not in IMPORT_FORMATS:
+            raise CommandError(f'Cannot deduce format of {path}, please use --format.')
+        with path.open(encoding='utf-8-sig', newline='') as stream:
+            try:
+                created = TaskImporter(options['model']).load(stream, import_format)
+            except InvalidImportError as error:
+                for row_error in error.errors:
+                    self.stderr.write(f'line {row_error["line"]}: {", ".join(row_error["errors"])}')
+                raise CommandError(f'{error.error_count} invalid rows, nothing was imported.')
+        self.stdout.write(self.style.SUCCESS(', '.join(
+            f'{count} {model} created' for model, count in created.items())))
@@ -0,0 +1,39 @@
+"""
+Create future yearly partitions of dated tasks and detach old ones, see task.partitions.
+Meant to be run periodically (e.g. daily cron), the default partition keeps inserts working
+if it is late.
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from task.partitions import partition_years, create_partitions, detach_partition
+
+
+class Command(BaseCommand):
+    help = 'Create yearly partitions of dated tasks ahead of time and detach old ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--years-ahead', type=int, default=2,
+            help='Number of partitions to have after the current year.')
+        parser.add_argument(
+            '--detach-before', type=int,
+            help='Detach partitions of years before this one, their tasks are kept in '
+                 'standalone tables that can be dumped or dropped.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Dated tasks are only partitioned on postgresql.')
+        this_year = date.today().year
+        created = create_partitions(this_year, this_year + options['years_ahead'])
+        detached = []
+        if options['detach_before'] is not None:
+            if options['detach_before'] > this_year:
+                raise CommandError('Cannot detach partitions of the current year.')
+            detached = [year for year in partition_years() if year < options['detach_before']]
+            for year in detached:
+                detach_partition(year)
+        self.stdout.write(self.style.SUCCESS(
+            f'Created partitions: {created or "none"}, detached partitions: {detached or "none"}.'))
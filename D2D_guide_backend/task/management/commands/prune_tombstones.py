@@ -0,0 +1,13 @@
+"""
+Delete tombstones older than the sync retention delay, see task.sync.
+"""
+from django.core.management.base import BaseCommand
+
+from task.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Delete old tombstones, clients with older sync tokens get a full sync.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f'{prune_tombstones()} tombstones deleted.'))
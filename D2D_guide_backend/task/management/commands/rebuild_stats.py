@@ -0,0 +1,14 @@
+"""
+Rebuild the task statistics summary table from scratch, see task.stats.
+"""
+from django.core.management.base import BaseCommand
+
+from task.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute task statistics from tasks and archive rollups.'
+
+    def handle(self, *args, **options):
+        count = rebuild_stats()
+        self.stdout.write(self.style.SUCCESS(f'{count} statistics rows written.'))
@@ -0,0 +1,171 @@
+"""
+Replay a realistic traffic mix against a running server and report latencies per endpoint.
+Meant to be run on the same machine as runserver or an ASGI server, on a seeded database
+(see seed_tasks command).
+"""
+import asyncio
+import math
+import random
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+# Relative weight of each action in the replayed traffic.
+TRAFFIC_MIX = {
+    'week_view': 50,
+    'toggle_dated_task': 20,
+    'toggle_week_task': 10,
+    'mot_edit': 5,
+    'late_tasks': 15,
+}
+
+
+def percentile(sorted_values, rank):
+    """
+    Return the nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0
+    index = max(0, math.ceil(rank / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = 'Replay a realistic traffic mix against a running server and report latencies.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://localhost:8000')
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--duration', type=float, default=30, help='Duration in seconds.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--sample-pages', type=int, default=5,
+            help='Number of list pages read to pick the tasks and mots to replay on.')
+        for action, weight in TRAFFIC_MIX.items():
+            parser.add_argument(
+                f'--{action.replace("_", "-")}-weight', type=int, default=weight, dest=action)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.weights = {action: options[action] for action in TRAFFIC_MIX}
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        elapsed = asyncio.run(self.replay(options))
+        self.report(elapsed)
+
+    async def replay(self, options):
+        limits = httpx.Limits(max_connections=options['concurrency'])
+        async with httpx.AsyncClient(
+                base_url=options['base_url'], limits=limits, timeout=30) as client:
+            await self.sample(client, options['sample_pages'])
+            deadline = time.perf_counter() + options['duration']
+            start = time.perf_counter()
+            await asyncio.gather(*[
+                self.worker(client, deadline) for _ in range(options['concurrency'])])
+            return time.perf_counter() - start
+
+    async def fetch_pages(self, client, url, pages):
+        results = []
+        for page in range(1, pages + 1):
+            response = await client.get(url, params={'page': page})
+            if response.status_code != 200:
+                break
+            data = response.json()
+            results.extend(data['results'])
+            if not data['next']:
+                break
+        return results
+
+    async def sample(self, client, pages):
+        """
+        Read a few pages of each list to know which objects can be replayed on.
+        """
+        try:
+            self.dated_tasks = await self.fetch_pages(client, '/dated_task/', pages)
+            self.week_tasks = await self.fetch_pages(client, '/week_task/', pages)
+            self.mots = await self.fetch_pages(client, '/multi_occurences_task/', pages)
+        except httpx.HTTPError as error:
+            raise CommandError(f'Cannot reach server: {error}')
+        weeks = {
+            tuple(date.fromisoformat(task['date']).isocalendar()[:2])
+            for task in self.dated_tasks}
+        weeks |= {(task['year'], task['week_number']) for task in self.week_tasks}
+        today = date.today().isocalendar()
+        self.weeks = sorted(weeks) or [(today.year, today.week)]
+        # Remove actions that have no object to be replayed on.
+        if not self.dated_tasks:
+            self.weights['toggle_dated_task'] = 0
+        if not self.week_tasks:
+            self.weights['toggle_week_task'] = 0
+        if not self.mots:
+            self.weights['mot_edit'] = 0
+
+    async def worker(self, client, deadline):
+        actions = list(self.weights)
+        weights = list(self.weights.values())
+        while time.perf_counter() < deadline:
+            action = self.rng.choices(actions, weights)[0]
+            await getattr(self, action)(client)
+
+    async def timed(self, endpoint, request):
+        start = time.perf_counter()
+        try:
+            response = await request
+            if response.status_code >= 400:
+                self.errors[endpoint] += 1
+        except httpx.HTTPError:
+            self.errors[endpoint] += 1
+        self.latencies[endpoint].append(time.perf_counter() - start)
+
+    async def week_view(self, client):
+        year, week = self.rng.choice(self.weeks)
+        await asyncio.gather(
+            self.timed('GET dated_task (week)', client.get(
+                '/dated_task/', params={'week': week, 'year': year})),
+            self.timed('GET week_task (week)', client.get(
+                '/week_task/', params={'week_number': week, 'year': year})))
+
+    async def toggle(self, client, url, task):
+        task['done'] = not task['done']
+        await self.timed(f'PATCH {url.strip("/")}', client.patch(
+            f'{url}{task["id"]}/', json={'done': task['done'], 'label': task['label']}))
+
+    async def toggle_dated_task(self, client):
+        await self.toggle(client, '/dated_task/', self.rng.choice(self.dated_tasks))
+
+    async def toggle_week_task(self, client):
+        await self.toggle(client, '/week_task/', self.rng.choice(self.week_tasks))
+
+    async def mot_edit(self, client):
+        """
+        Alternatively extend and shrink a mot end date by a week, so that related tasks are
+        created then deleted and data stay stable over runs.
+        """
+        mot = self.rng.choice(self.mots)
+        shift = timedelta(days=-7 if mot.get('extended') else 7)
+        end_date = date.fromisoformat(mot['end_date']) + shift
+        mot['extended'] = not mot.get('extended')
+        mot['end_date'] = end_date.isoformat()
+        await self.timed('PATCH multi_occurences_task', client.patch(
+            f'/multi_occurences_task/{mot["id"]}/',
+            json={'end_date': mot['end_date'], 'label': mot['label']}))
+
+    async def late_tasks(self, client):
+        await self.timed('GET late_tasks', client.get('/late_tasks'))
+
+    def report(self, elapsed):
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        self.stdout.write(
+            f'{total} requests in {elapsed:.1f}s: {total / elapsed:.1f} req/s')
+        self.stdout.write(
+            f'{"endpoint":<30}{"count":>8}{"errors":>8}{"req/s":>9}'
+            f'{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}')
+        for endpoint in sorted(self.latencies):
+            latencies = sorted(self.latencies[endpoint])
+            p50, p95, p99 = (percentile(latencies, rank) * 1000 for rank in (50, 95, 99))
+            self.stdout.write(
+                f'{endpoint:<30}{len(latencies):>8}{self.errors[endpoint]:>8}'
+                f'{len(latencies) / elapsed:>9.1f}{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}')
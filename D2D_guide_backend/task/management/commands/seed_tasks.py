@@ -0,0 +1,231 @@
+"""
+Generate a synthetic dataset for load testing.
+Rows are written with COPY so that millions of tasks can be seeded in minutes.
+Two runs with the same arguments (including --today) produce the same rows.
+"""
+import random
+from datetime import date, timedelta
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from task.bulk import reserve_ids, copy_rows
+from task.models import (
+    DatedTask, WeekTask, MultiOccurencesTask, Label, ArchiveRollup, TaskStat, ArchivedDatedTask,
+    ArchivedWeekTask)
+from task.occurrences import dated_occurrences, week_occurrences
+from task.stats import rebuild_stats
+
+RECURRENCE_KINDS = [
+    'every_week', 'every_month', 'every_last_day_of_month', 'every_year', 'number_a_day',
+    'number_a_week']
+# Share of each recurrence kind among generated mots.
+RECURRENCE_WEIGHTS = [35, 15, 10, 10, 10, 20]
+# Probability for a task to have 0, 1, 2 or 3 labels.
+LABEL_COUNT_WEIGHTS = [40, 40, 15, 5]
+# Probability for a task in the future to already be done.
+FUTURE_DONE_RATIO = 0.02
+
+
+def parse_date(value):
+    return date.fromisoformat(value)
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = 'Seed the database with a large deterministic set of labels, mots and tasks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--labels', type=int, default=20)
+        parser.add_argument('--mots', type=int, default=200)
+        parser.add_argument(
+            '--dated-tasks', type=int, default=1_000_000,
+            help='Number of dated tasks that are not related to a mot.')
+        parser.add_argument(
+            '--week-tasks', type=int, default=100_000,
+            help='Number of week tasks that are not related to a mot.')
+        parser.add_argument('--start', type=parse_date, default=date(2024, 1, 1))
+        parser.add_argument('--weeks', type=int, default=156, help='Length of the seeded period.')
+        parser.add_argument(
+            '--today', type=parse_date, default=date.today(),
+            help='Tasks before this date are mostly done. Set it for reproducible runs.')
+        parser.add_argument('--done-ratio', type=float, default=0.8)
+        parser.add_argument('--batch-size', type=int, default=50_000)
+        parser.add_argument(
+            '--flush', action='store_true',
+            help='Remove existing tasks, mots and labels and reset ids first.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.start_date = options['start']
+        self.end_date = self.start_date + timedelta(weeks=options['weeks']) - timedelta(days=1)
+        with transaction.atomic():
+            if options['flush']:
+                self.flush()
+            self.label_ids = self.create_labels()
+            mots = self.create_mots()
+            dated_count = self.write_tasks(
+                DatedTask, ['name', 'date', 'related_mot', 'occurrence'], self.dated_rows(mots))
+            week_count = self.write_tasks(
+                WeekTask, ['name', 'year', 'week_number', 'related_mot', 'occurrence'],
+                self.week_rows(mots))
+            # COPY doesn't send model signals.
+            rebuild_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(self.label_ids)} labels, {len(mots)} mots, '
+            f'{dated_count} dated tasks and {week_count} week tasks.'))
+
+    def flush(self):
+        models = [DatedTask, WeekTask, MultiOccurencesTask, Label]
+        tables = [model._meta.db_table for model in models]
+        tables += [model.label.through._meta.db_table for model in models if model is not Label]
+        # Archived tasks are truncated with mots.
+        tables += [ArchiveRollup._meta.db_table, TaskStat._meta.db_table]
+        if connection.vendor != 'postgresql':
+            self.delete_tables(tables)
+            return
+        with connection.cursor() as cursor:
+            # TRUNCATE is refused while deferred foreign key checks are pending.
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            cursor.execute('TRUNCATE {} RESTART IDENTITY CASCADE'.format(
+                ', '.join(connection.ops.quote_name(table) for table in tables)))
+
+    def delete_tables(self, tables):
+        """
+        Portable flush, archived tasks being deleted with mots like TRUNCATE CASCADE does.
+        """
+        tables += [model._meta.db_table for model in [ArchivedDatedTask, ArchivedWeekTask]]
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            for table in tables:
+                cursor.execute(f'DELETE FROM {quote(table)}')
+            if connection.vendor == 'sqlite':
+                cursor.execute(
+                    'DELETE FROM sqlite_sequence WHERE name IN ({})'.format(
+                        ', '.join(['%s'] * len(tables))), tables)
+
+    def create_labels(self):
+        labels = Label.objects.bulk_create(
+            [Label(name=f'label_{i}') for i in range(self.options['labels'])])
+        # Some labels are far more used than others.
+        self.label_weights = [1 / (rank + 1) for rank in range(len(labels))]
+        return [label.id for label in labels]
+
+    def pick_labels(self):
+        if not self.label_ids:
+            return []
+        count = self.rng.choices(range(len(LABEL_COUNT_WEIGHTS)), LABEL_COUNT_WEIGHTS)[0]
+        return list(set(self.rng.choices(self.label_ids, self.label_weights, k=count)))
+
+    def random_date(self):
+        return self.start_date + timedelta(
+            days=self.rng.randrange((self.end_date - self.start_date).days + 1))
+
+    def create_mots(self):
+        """
+        Create mots without going through save(), their tasks are written afterwards.
+        """
+        mots = []
+        mots_labels = []
+        for i in range(self.options['mots']):
+            kind = self.rng.choices(RECURRENCE_KINDS, RECURRENCE_WEIGHTS)[0]
+            start_date = self.random_date()
+            end_date = min(start_date + timedelta(days=self.rng.randint(28, 364)), self.end_date)
+            if end_date <= start_date:
+                start_date = end_date - timedelta(days=28)
+            mot = MultiOccurencesTask(
+                name=f'mot_{i}',
+                task_name=f'task_{i}',
+                start_date=start_date,
+                end_date=end_date)
+            if kind == 'every_week':
+                mot.every_week = sorted(self.rng.sample(range(1, 8), self.rng.randint(1, 3)))
+            elif kind == 'every_month':
+                mot.every_month = sorted(self.rng.sample(range(1, 29), self.rng.randint(1, 2)))
+            elif kind == 'every_last_day_of_month':
+                mot.every_last_day_of_month = True
+            elif kind == 'every_year':
+                mot.every_year = [
+                    {'day': self.rng.randint(1, 28), 'month': self.rng.randint(1, 12)}
+                    for _ in range(self.rng.randint(1, 2))]
+            elif kind == 'number_a_day':
+                mot.number_a_day = self.rng.randint(1, 3)
+            else:
+                mot.number_a_week = self.rng.randint(1, 5)
+            mots_labels.append(self.pick_labels())
+            mot.label_ids = sorted(mots_labels[-1])
+            mots.append(mot)
+        mots = MultiOccurencesTask.objects.bulk_create(mots)
+        through = MultiOccurencesTask.label.through
+        through.objects.bulk_create([
+            through(multioccurencestask_id=mot.id, label_id=label_id)
+            for mot, label_ids in zip(mots, mots_labels) for label_id in label_ids])
+        return list(zip(mots, mots_labels))
+
+    def dated_rows(self, mots):
+        """
+        Yield (row, labels, task date) for dated tasks, mot related ones first.
+        """
+        for mot, label_ids in mots:
+            for task_date, occurrence in dated_occurrences(mot, mot.start_date, mot.end_date):
+                yield (mot.task_name, task_date, mot.id, occurrence), label_ids, task_date
+        for i in range(self.options['dated_tasks']):
+            task_date = self.random_date()
+            yield (
+                (f'dated_task_{i % 1000}', task_date, None, None), self.pick_labels(), task_date)
+
+    def week_rows(self, mots):
+        """
+        Yield (row, labels, monday of the week) for week tasks, mot related ones first.
+        """
+        for mot, label_ids in mots:
+            if not mot.number_a_week:
+                continue
+            for year, week_number in week_occurrences(mot.start_date, mot.end_date):
+                monday = date.fromisocalendar(year, week_number, 1)
+                for occurrence in range(1, mot.number_a_week + 1):
+                    yield (
+                        (mot.task_name, year, week_number, mot.id, occurrence), label_ids, monday)
+        for i in range(self.options['week_tasks']):
+            year, week_number, _ = self.random_date().isocalendar()
+            monday = date.fromisocalendar(year, week_number, 1)
+            yield (
+                (f'week_task_{i % 1000}', year, week_number, None, None), self.pick_labels(),
+                monday)
+
+    def is_done(self, task_date):
+        # Always draw so that the sequence of random numbers doesn't depend on --today.
+        draw = self.rng.random()
+        if task_date < self.options['today']:
+            return draw < self.options['done_ratio']
+        return draw < FUTURE_DONE_RATIO
+
+    def write_tasks(self, model, fields, rows):
+        """
+        Write tasks and their labels by batches, ids are reserved beforehand so that
+        label rows can be written with COPY as well.
+        """
+        columns = ['id', 'done', 'label_ids'] + [
+            model._meta.get_field(field).column for field in fields]
+        through = model.label.through
+        task_column = through._meta.get_field(model._meta.model_name).column
+        written = 0
+        for chunk in chunks(rows, self.options['batch_size']):
+            task_rows = []
+            label_rows = []
+            for task_id, (row, label_ids, task_date) in zip(
+                    reserve_ids(model, len(chunk)), chunk):
+                task_rows.append((task_id, self.is_done(task_date), sorted(label_ids), *row))
+                label_rows.extend((task_id, label_id) for label_id in label_ids)
+            written += copy_rows(model._meta.db_table, columns, task_rows)
+            copy_rows(through._meta.db_table, [task_column, 'label_id'], label_rows)
+            self.stdout.write(f'{model.__name__}: {written} rows written')
+        return written
@@ -0,0 +1,149 @@
+from datetime import date
+
+from django.db import migrations, models
+
+COLUMNS = 'id, name, done, date, related_mot_id'
+MOT_FOREIGN_KEY = """
+    ALTER TABLE task_datedtask ADD CONSTRAINT "{foreign_key}"
+    FOREIGN KEY (related_mot_id) REFERENCES task_multioccurencestask (id)
+    DEFERRABLE INITIALLY DEFERRED
+"""
+MOT_INDEX = 'CREATE INDEX "{index}" ON task_datedtask (related_mot_id)'
+
+
+def related_mot_names(cursor):
+    """
+    Return the names of the foreign key and index of task_datedtask.related_mot_id, as named
+    by Django when the column was added.
+    """
+    cursor.execute("""
+        SELECT attnum FROM pg_attribute
+        WHERE attrelid = 'task_datedtask'::regclass AND attname = 'related_mot_id'
+    """)
+    column = cursor.fetchone()[0]
+    cursor.execute("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = 'task_datedtask'::regclass AND contype = 'f' AND conkey = ARRAY[%s]::smallint[]
+    """, [column])
+    foreign_key = cursor.fetchone()[0]
+    cursor.execute("""
+        SELECT indexrelid::regclass::text FROM pg_index
+        WHERE indrelid = 'task_datedtask'::regclass AND indkey::text = %s
+    """, [str(column)])
+    index = cursor.fetchone()[0]
+    return {'foreign_key': foreign_key, 'index': index}
+
+
+def partition_datedtask(apps, schema_editor):
+    """
+    Replace task_datedtask with a table partitioned by yearly date ranges.
+    Primary key of a partitioned table must contain the partition key, so it becomes
+    (id, date) and the foreign key of labels to dated tasks is dropped (see migration 0029).
+    Partitions are created for the years of existing rows, the ones of next years by the
+    manage_partitions command, so that the layout doesn't depend on the migration date.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT conname FROM pg_constraint
+            WHERE conrelid = 'task_datedtask_label'::regclass
+            AND confrelid = 'task_datedtask'::regclass
+        """)
+        for (name,) in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE task_datedtask_label DROP CONSTRAINT "{name}"')
+        names = related_mot_names(cursor)
+        cursor.execute('SELECT min(date), max(date), max(id) FROM task_datedtask')
+        first_date, last_date, max_id = cursor.fetchone()
+        years = range(first_date.year, last_date.year + 1) if first_date else []
+        cursor.execute('ALTER TABLE task_datedtask RENAME TO task_datedtask_old')
+        cursor.execute(
+            'ALTER TABLE task_datedtask_old RENAME CONSTRAINT task_datedtask_pkey '
+            'TO task_datedtask_old_pkey')
+        cursor.execute("""
+            CREATE TABLE task_datedtask (
+                id bigint NOT NULL,
+                name varchar(100) NOT NULL,
+                done boolean NOT NULL,
+                date date NOT NULL,
+                related_mot_id bigint NULL,
+                PRIMARY KEY (id, date)
+            ) PARTITION BY RANGE (date)
+        """)
+        cursor.execute('CREATE TABLE task_datedtask_default PARTITION OF task_datedtask DEFAULT')
+        for year in years:
+            cursor.execute(
+                f'CREATE TABLE task_datedtask_y{year} PARTITION OF task_datedtask '
+                'FOR VALUES FROM (%s) TO (%s)', [date(year, 1, 1), date(year + 1, 1, 1)])
+        cursor.execute(
+            f'INSERT INTO task_datedtask ({COLUMNS}) SELECT {COLUMNS} FROM task_datedtask_old')
+        cursor.execute('DROP TABLE task_datedtask_old')
+        # A sequence owned by the column rather than an identity, so that
+        # pg_get_serial_sequence keeps working (see task.bulk.reserve_ids).
+        cursor.execute('CREATE SEQUENCE task_datedtask_id_seq OWNED BY task_datedtask.id')
+        cursor.execute(
+            "SELECT setval('task_datedtask_id_seq', %s, false)", [(max_id or 0) + 1])
+        cursor.execute(
+            "ALTER TABLE task_datedtask ALTER COLUMN id SET DEFAULT "
+            "nextval('task_datedtask_id_seq')")
+        cursor.execute(MOT_FOREIGN_KEY.format(**names))
+        cursor.execute(MOT_INDEX.format(**names))
+
+
+def unpartition_datedtask(apps, schema_editor):
+    """
+    Put every row back in a regular table, detached partitions are not restored.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        names = related_mot_names(cursor)
+        cursor.execute('ALTER SEQUENCE task_datedtask_id_seq OWNED BY NONE')
+        cursor.execute('ALTER TABLE task_datedtask RENAME TO task_datedtask_partitioned')
+        cursor.execute(
+            'ALTER TABLE task_datedtask_partitioned RENAME CONSTRAINT task_datedtask_pkey '
+            'TO task_datedtask_partitioned_pkey')
+        cursor.execute(
+            'ALTER INDEX "{index}" RENAME TO task_datedtask_partitioned_related_mot_id'.format(
+                **names))
+        cursor.execute("""
+            CREATE TABLE task_datedtask (
+                id bigint NOT NULL DEFAULT nextval('task_datedtask_id_seq') PRIMARY KEY,
+                name varchar(100) NOT NULL,
+                done boolean NOT NULL,
+                date date NOT NULL,
+                related_mot_id bigint NULL
+            )
+        """)
+        cursor.execute(
+            f'INSERT INTO task_datedtask ({COLUMNS}) '
+            f'SELECT {COLUMNS} FROM task_datedtask_partitioned')
+        cursor.execute('DROP TABLE task_datedtask_partitioned')
+        cursor.execute('ALTER SEQUENCE task_datedtask_id_seq OWNED BY task_datedtask.id')
+        cursor.execute(MOT_FOREIGN_KEY.format(**names))
+        cursor.execute(MOT_INDEX.format(**names))
+        cursor.execute(
+            'DELETE FROM task_datedtask_label WHERE datedtask_id NOT IN '
+            '(SELECT id FROM task_datedtask)')
+        cursor.execute("""
+            ALTER TABLE task_datedtask_label
+            ADD CONSTRAINT task_datedtask_label_datedtask_id_ab95e279_fk_task_datedtask_id
+            FOREIGN KEY (datedtask_id) REFERENCES task_datedtask (id)
+            DEFERRABLE INITIALLY DEFERRED
+        """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0014_weektask_related_mot'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_datedtask, unpartition_datedtask),
+        migrations.AlterField(
+            model_name='datedtask',
+            name='date',
+            field=models.DateField(db_index=True),
+        ),
+    ]
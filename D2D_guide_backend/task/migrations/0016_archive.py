@@ -0,0 +1,70 @@
+# Generated by Django 5.1 on 2026-10-19 05:56
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0015_partition_datedtask'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='datedtask',
+            options={'ordering': ['name']},
+        ),
+        migrations.AlterModelOptions(
+            name='multioccurencestask',
+            options={'ordering': ['name']},
+        ),
+        migrations.AlterModelOptions(
+            name='weektask',
+            options={'ordering': ['name']},
+        ),
+        migrations.CreateModel(
+            name='ArchivedDatedTask',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('label_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('date', models.DateField(db_index=True)),
+                ('related_mot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='task.multioccurencestask')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedWeekTask',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('label_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('week_number', models.PositiveSmallIntegerField()),
+                ('related_mot', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='task.multioccurencestask')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchiveRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mot_id', models.BigIntegerField(default=0)),
+                ('label_id', models.BigIntegerField(default=0)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('week_number', models.PositiveSmallIntegerField()),
+                ('task_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('mot_id', 'label_id', 'year', 'week_number'), name='unique_archive_rollup')],
+            },
+        ),
+    ]
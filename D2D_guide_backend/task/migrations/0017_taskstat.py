@@ -0,0 +1,28 @@
+# Generated by Django 5.1 on 2026-10-19 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0016_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('iso_year', models.PositiveSmallIntegerField()),
+                ('iso_week', models.PositiveSmallIntegerField()),
+                ('label_id', models.BigIntegerField(default=0)),
+                ('mot_id', models.BigIntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('done', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('iso_year', 'iso_week', 'label_id', 'mot_id'), name='unique_task_stat')],
+            },
+        ),
+    ]
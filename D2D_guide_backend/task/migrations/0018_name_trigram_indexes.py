@@ -0,0 +1,33 @@
+# Generated by Django 5.1 on 2026-10-19 06:01
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0017_taskstat'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='datedtask',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='datedtask_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='multioccurencestask',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='multioccurencestask_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='multioccurencestask',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('task_name'), name='gin_trgm_ops'), name='mot_task_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='weektask',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='weektask_name_trgm'),
+        ),
+    ]
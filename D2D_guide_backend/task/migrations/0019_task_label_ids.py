@@ -0,0 +1,59 @@
+# Generated by Django 5.1 on 2026-10-19 06:02
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+def fill_label_ids(apps, schema_editor):
+    """
+    Copy labels of existing tasks, before the indexes are created.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for model_name in ['datedtask', 'weektask', 'multioccurencestask']:
+            cursor.execute(f'''
+                UPDATE task_{model_name} SET label_ids = ARRAY(
+                    SELECT label_id FROM task_{model_name}_label
+                    WHERE {model_name}_id = task_{model_name}.id ORDER BY label_id)
+                WHERE id IN (SELECT {model_name}_id FROM task_{model_name}_label)
+            ''')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0018_name_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datedtask',
+            name='label_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='multioccurencestask',
+            name='label_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.AddField(
+            model_name='weektask',
+            name='label_ids',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+        ),
+        migrations.RunPython(fill_label_ids, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='datedtask',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['label_ids'], name='datedtask_label_ids'),
+        ),
+        migrations.AddIndex(
+            model_name='multioccurencestask',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['label_ids'], name='multioccurencestask_label_ids'),
+        ),
+        migrations.AddIndex(
+            model_name='weektask',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['label_ids'], name='weektask_label_ids'),
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.1 on 2026-10-19 06:22
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+import task.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0020_updated_at_tombstone'),
+    ]
+
+    # Same columns and indexes on PostgreSQL, only the field and index classes change.
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.RemoveIndex(
+                model_name='datedtask',
+                name='datedtask_name_trgm',
+            ),
+            migrations.RemoveIndex(
+                model_name='datedtask',
+                name='datedtask_label_ids',
+            ),
+            migrations.RemoveIndex(
+                model_name='multioccurencestask',
+                name='multioccurencestask_name_trgm',
+            ),
+            migrations.RemoveIndex(
+                model_name='multioccurencestask',
+                name='mot_task_name_trgm',
+            ),
+            migrations.RemoveIndex(
+                model_name='multioccurencestask',
+                name='multioccurencestask_label_ids',
+            ),
+            migrations.RemoveIndex(
+                model_name='weektask',
+                name='weektask_name_trgm',
+            ),
+            migrations.RemoveIndex(
+                model_name='weektask',
+                name='weektask_label_ids',
+            ),
+            migrations.AlterField(
+                model_name='archiveddatedtask',
+                name='label_ids',
+                field=task.fields.PortableArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+            ),
+            migrations.AlterField(
+                model_name='archivedweektask',
+                name='label_ids',
+                field=task.fields.PortableArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+            ),
+            migrations.AlterField(
+                model_name='datedtask',
+                name='label_ids',
+                field=task.fields.PortableArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+            ),
+            migrations.AlterField(
+                model_name='multioccurencestask',
+                name='every_month',
+                field=task.fields.PortableArrayField(base_field=models.SmallIntegerField(), blank=True, default=list, size=None),
+            ),
+            migrations.AlterField(
+                model_name='multioccurencestask',
+                name='every_week',
+                field=task.fields.PortableArrayField(base_field=models.SmallIntegerField(), blank=True, default=list, size=None),
+            ),
+            migrations.AlterField(
+                model_name='multioccurencestask',
+                name='label_ids',
+                field=task.fields.PortableArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+            ),
+            migrations.AlterField(
+                model_name='weektask',
+                name='label_ids',
+                field=task.fields.PortableArrayField(base_field=models.BigIntegerField(), blank=True, default=list, size=None),
+            ),
+            migrations.AddIndex(
+                model_name='datedtask',
+                index=task.fields.PortableGinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='datedtask_name_trgm'),
+            ),
+            migrations.AddIndex(
+                model_name='datedtask',
+                index=task.fields.PortableGinIndex(fields=['label_ids'], name='datedtask_label_ids'),
+            ),
+            migrations.AddIndex(
+                model_name='multioccurencestask',
+                index=task.fields.PortableGinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='multioccurencestask_name_trgm'),
+            ),
+            migrations.AddIndex(
+                model_name='multioccurencestask',
+                index=task.fields.PortableGinIndex(fields=['label_ids'], name='multioccurencestask_label_ids'),
+            ),
+            migrations.AddIndex(
+                model_name='multioccurencestask',
+                index=task.fields.PortableGinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('task_name'), name='gin_trgm_ops'), name='mot_task_name_trgm'),
+            ),
+            migrations.AddIndex(
+                model_name='weektask',
+                index=task.fields.PortableGinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='weektask_name_trgm'),
+            ),
+            migrations.AddIndex(
+                model_name='weektask',
+                index=task.fields.PortableGinIndex(fields=['label_ids'], name='weektask_label_ids'),
+            ),
+        ]),
+    ]
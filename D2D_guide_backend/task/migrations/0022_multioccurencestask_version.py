@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-19 06:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0021_portable_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='multioccurencestask',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
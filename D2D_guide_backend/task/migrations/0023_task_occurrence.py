@@ -0,0 +1,51 @@
+# Generated by Django 5.1 on 2026-10-19 06:28
+
+from django.db import migrations, models
+
+
+def fill_occurrences(apps, schema_editor):
+    """
+    Rank existing generated tasks per mot and date or week, before the constraints are
+    created.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for model_name, key in [('datedtask', 'date'), ('weektask', 'year, week_number')]:
+            cursor.execute(f'''
+                UPDATE task_{model_name} AS task SET occurrence = ranked.occurrence
+                FROM (
+                    SELECT id, row_number() OVER (
+                        PARTITION BY related_mot_id, {key} ORDER BY id) AS occurrence
+                    FROM task_{model_name} WHERE related_mot_id IS NOT NULL
+                ) AS ranked
+                WHERE task.id = ranked.id
+            ''')
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0022_multioccurencestask_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datedtask',
+            name='occurrence',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='weektask',
+            name='occurrence',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_occurrences, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='datedtask',
+            constraint=models.UniqueConstraint(fields=('related_mot', 'date', 'occurrence'), name='unique_dated_occurrence'),
+        ),
+        migrations.AddConstraint(
+            model_name='weektask',
+            constraint=models.UniqueConstraint(fields=('related_mot', 'year', 'week_number', 'occurrence'), name='unique_week_occurrence'),
+        ),
+    ]
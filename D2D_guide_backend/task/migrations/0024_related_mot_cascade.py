@@ -0,0 +1,57 @@
+# Generated by Django 5.1 on 2026-10-19 06:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def related_mot_foreign_keys(schema_editor, on_delete):
+    """
+    Recreate the related_mot foreign keys of tasks with the given ON DELETE action, Django
+    not declaring it in the database.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in ['task_datedtask', 'task_weektask']:
+            cursor.execute('''
+                SELECT conname FROM pg_constraint
+                WHERE conrelid = %s::regclass AND contype = 'f' AND conkey = ARRAY[(
+                    SELECT attnum FROM pg_attribute
+                    WHERE attrelid = %s::regclass AND attname = 'related_mot_id')]
+            ''', [table, table])
+            for (name,) in cursor.fetchall():
+                cursor.execute(f'''
+                    ALTER TABLE {table} DROP CONSTRAINT "{name}",
+                    ADD CONSTRAINT "{name}" FOREIGN KEY (related_mot_id)
+                    REFERENCES task_multioccurencestask (id) {on_delete}
+                    DEFERRABLE INITIALLY DEFERRED
+                ''')
+
+
+def cascade(apps, schema_editor):
+    related_mot_foreign_keys(schema_editor, 'ON DELETE CASCADE')
+
+
+def no_cascade(apps, schema_editor):
+    related_mot_foreign_keys(schema_editor, '')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0023_task_occurrence'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='datedtask',
+            name='related_mot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='task.multioccurencestask'),
+        ),
+        migrations.AlterField(
+            model_name='weektask',
+            name='related_mot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='task.multioccurencestask'),
+        ),
+        migrations.RunPython(cascade, no_cascade),
+    ]
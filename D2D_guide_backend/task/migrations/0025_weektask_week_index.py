@@ -0,0 +1,17 @@
+# Generated by Django 5.1 on 2026-10-19 06:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0024_related_mot_cascade'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='weektask',
+            index=models.Index(fields=['year', 'week_number'], name='weektask_week'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1 on 2026-10-19 07:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0025_weektask_week_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='multioccurencestask',
+            name='deleting',
+            field=models.BooleanField(default=False),
+        ),
+    ]
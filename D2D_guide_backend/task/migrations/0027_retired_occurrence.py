@@ -0,0 +1,39 @@
+# Generated by Django 5.1 on 2026-10-19 07:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0026_mot_deleting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetiredDatedOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('occurrence', models.PositiveSmallIntegerField()),
+                ('date', models.DateField()),
+                ('related_mot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='task.multioccurencestask')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('related_mot', 'date', 'occurrence'), name='unique_retired_dated_occurrence')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RetiredWeekOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('occurrence', models.PositiveSmallIntegerField()),
+                ('year', models.PositiveSmallIntegerField()),
+                ('week_number', models.PositiveSmallIntegerField()),
+                ('related_mot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='task.multioccurencestask')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('related_mot', 'year', 'week_number', 'occurrence'), name='unique_retired_week_occurrence')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1 on 2026-10-19 07:48
+
+from django.db import migrations
+
+
+def retire_archived_occurrences(apps, schema_editor):
+    """
+    Retire the occurrences of tasks archived before occurrences were retired. Archived tasks
+    don't keep their occurrence, it is their rank by id among the archived tasks of their mot
+    on their date or week.
+    """
+    for archive_name, retired_name, keys in [
+            ('ArchivedDatedTask', 'RetiredDatedOccurrence', ['date']),
+            ('ArchivedWeekTask', 'RetiredWeekOccurrence', ['year', 'week_number'])]:
+        archive_model = apps.get_model('task', archive_name)
+        retired_model = apps.get_model('task', retired_name)
+        retired, previous_key, occurrence = [], None, 0
+        rows = archive_model.objects.filter(related_mot__isnull=False).order_by(
+            'related_mot', *keys, 'id').values_list('related_mot', *keys)
+        for key in rows.iterator():
+            occurrence = occurrence + 1 if key == previous_key else 1
+            previous_key = key
+            retired.append(retired_model(
+                related_mot_id=key[0], occurrence=occurrence, **dict(zip(keys, key[1:]))))
+        retired_model.objects.bulk_create(retired, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0027_retired_occurrence'),
+    ]
+
+    operations = [
+        migrations.RunPython(retire_archived_occurrences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.1 on 2026-10-19 08:05
+
+from django.db import migrations
+
+# Labels of a dated task reference its primary key (id, date), their date is copied from the
+# task on insert and follows it when the task date changes.
+DATE_FUNCTION = """
+    CREATE FUNCTION task_datedtask_label_date() RETURNS trigger AS $$
+    BEGIN
+        SELECT date INTO NEW.datedtask_date FROM task_datedtask WHERE id = NEW.datedtask_id;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+DATE_TRIGGER = """
+    CREATE TRIGGER task_datedtask_label_date
+    BEFORE INSERT OR UPDATE OF datedtask_id ON task_datedtask_label
+    FOR EACH ROW EXECUTE FUNCTION task_datedtask_label_date()
+"""
+FOREIGN_KEY = """
+    ALTER TABLE task_datedtask_label ADD CONSTRAINT task_datedtask_label_datedtask_fk
+    FOREIGN KEY (datedtask_id, datedtask_date) REFERENCES task_datedtask (id, date)
+    ON UPDATE CASCADE ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED
+"""
+
+
+def add_foreign_key(apps, schema_editor):
+    """
+    Add back the foreign key of labels to dated tasks dropped by partitioning (see migration
+    0015). Cascades move labels along with a task changing partition, which needs
+    PostgreSQL 15 or later.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'DELETE FROM task_datedtask_label WHERE datedtask_id NOT IN '
+            '(SELECT id FROM task_datedtask)')
+        cursor.execute('ALTER TABLE task_datedtask_label ADD COLUMN datedtask_date date')
+        cursor.execute("""
+            UPDATE task_datedtask_label SET datedtask_date = task.date
+            FROM task_datedtask AS task WHERE task.id = task_datedtask_label.datedtask_id
+        """)
+        cursor.execute(
+            'ALTER TABLE task_datedtask_label ALTER COLUMN datedtask_date SET NOT NULL')
+        cursor.execute(DATE_FUNCTION)
+        cursor.execute(DATE_TRIGGER)
+        cursor.execute(FOREIGN_KEY)
+
+
+def remove_foreign_key(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'ALTER TABLE task_datedtask_label DROP CONSTRAINT task_datedtask_label_datedtask_fk')
+        cursor.execute('DROP TRIGGER task_datedtask_label_date ON task_datedtask_label')
+        cursor.execute('DROP FUNCTION task_datedtask_label_date()')
+        cursor.execute('ALTER TABLE task_datedtask_label DROP COLUMN datedtask_date')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('task', '0028_retire_archived_occurrences'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_foreign_key, remove_foreign_key),
+    ]
@@ -1,13 +1,24 @@
-from datetime import timedelta, date
+import hashlib
+import json
+from datetime import timedelta
 
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.core.exceptions import ValidationError, ObjectDoesNotExist
-from django.contrib.postgres.fields import ArrayField, HStoreField
+from django.core.exceptions import ValidationError
+from django.contrib.postgres.indexes import OpClass
+from django.db.models.functions import Now, Upper
 
+from task.fields import PortableArrayField, PortableGinIndex
 from task.utils import (
-    is_included, every_month_clean, remove_duplicate_from_list, check_dict_list_date_format,
-    month_range)
+    is_included, every_month_clean, remove_duplicate_from_list, check_dict_list_date_format)
+from task.occurrences import generate_related_tasks
+
+
+class ConcurrentUpdateError(Exception):
+    """
+    Raised when saving an instance whose version changed since it was read.
+    """
 
 
 class Label(models.Model):
@@ -15,6 +26,8 @@ class Label(models.Model):
     Label that can be used to filter or style display.
     """
     name = models.CharField(max_length=100)
+    # Database default covers rows written with raw SQL, see task.sync.
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now(), db_index=True)
 
     def __str__(self):
         return f"{self.name}"
@@ -27,19 +40,47 @@ class Task(models.Model):
     name = models.CharField(max_length=100)
     done = models.BooleanField(default=False)
     label = models.ManyToManyField(Label)
+    # Sorted ids of label, see task.labels.
+    label_ids = PortableArrayField(models.BigIntegerField(), default=list, blank=True)
+    # Database default covers rows written with raw SQL, see task.sync.
+    updated_at = models.DateTimeField(auto_now=True, db_default=Now(), db_index=True)
 
     class Meta:
         abstract = True
         ordering = ['name']
+        # Serves ?search= (see task.views.search_names), icontains compares UPPER(name).
+        indexes = [
+            PortableGinIndex(
+                OpClass(Upper('name'), name='gin_trgm_ops'), name='%(class)s_name_trgm'),
+            PortableGinIndex(fields=['label_ids'], name='%(class)s_label_ids'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Keep loaded values, used to update statistics on save (see task.stats).
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
 
 class DatedTask(Task):
     """
     Task that must be accomplished on a specific date.
     """
-    date = models.DateField(null=False, blank=False)
+    date = models.DateField(null=False, blank=False, db_index=True)
+    # Tasks of a deleted mot are deleted by batches, see task.deletion.
     related_mot = models.ForeignKey(
-        'task.MultiOccurencesTask', on_delete=models.CASCADE, null=True, blank=True)
+        'task.MultiOccurencesTask', on_delete=models.DO_NOTHING, null=True, blank=True)
+    # Rank of a task generated by related_mot among the ones of its date, see task.occurrences.
+    occurrence = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    class Meta(Task.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=['related_mot', 'date', 'occurrence'], name='unique_dated_occurrence')
+        ]
 
 
 class WeekTask(Task):
@@ -50,8 +91,22 @@ class WeekTask(Task):
         validators=[MinValueValidator(2024)])
     week_number = models.PositiveSmallIntegerField(
         validators=[MaxValueValidator(53), MinValueValidator(1)])
+    # Tasks of a deleted mot are deleted by batches, see task.deletion.
     related_mot = models.ForeignKey(
-        'task.MultiOccurencesTask', on_delete=models.CASCADE, null=True, blank=True)
+        'task.MultiOccurencesTask', on_delete=models.DO_NOTHING, null=True, blank=True)
+    # Rank of a task generated by related_mot among the ones of its week, see task.occurrences.
+    occurrence = models.PositiveSmallIntegerField(null=True, blank=True)
+
+    class Meta(Task.Meta):
+        constraints = [
+            models.UniqueConstraint(
+                fields=['related_mot', 'year', 'week_number', 'occurrence'],
+                name='unique_week_occurrence')
+        ]
+        # Week lookups and counts per week, see task.density.
+        indexes = Task.Meta.indexes + [
+            models.Index(fields=['year', 'week_number'], name='weektask_week'),
+        ]
 
 
 class MultiOccurencesTask(Task):
@@ -64,7 +119,7 @@ class MultiOccurencesTask(Task):
     end_date = models.DateField()
     # 1 is for monday, 7 for sunday.
     # A task to repeat every tuesday and friday would have this field equal to [2, 5]
-    every_week = ArrayField(
+    every_week = PortableArrayField(
         models.SmallIntegerField(),
         default=list,
         blank=True
@@ -72,7 +127,7 @@ class MultiOccurencesTask(Task):
     # A task to repeat on the 1st and 15th of each month would have this field equal to [1, 15]
     # If a task is to be perform on the 31st and a month has only 30 days,
     # it won't be added to this field.
-    every_month = ArrayField(
+    every_month = PortableArrayField(
         models.SmallIntegerField(),
         default=list,
         blank=True
@@ -87,16 +142,54 @@ class MultiOccurencesTask(Task):
     number_a_day = models.SmallIntegerField(blank=True, null=True)
     # Task to repeat a certain number of time during the week no matter when
     number_a_week = models.SmallIntegerField(blank=True, null=True)
+    # Incremented by every save, see save().
+    version = models.PositiveIntegerField(default=1)
+    # Set when the mot is being deleted, its tasks being deleted before it: it is neither
+    # saved nor expanded anymore.
+    deleting = models.BooleanField(default=False)
+
+    recurrence_fields = [
+        'every_week', 'every_month', 'every_last_day_of_month', 'every_year', 'number_a_day',
+        'number_a_week']
+
+    class Meta(Task.Meta):
+        indexes = Task.Meta.indexes + [
+            PortableGinIndex(
+                OpClass(Upper('task_name'), name='gin_trgm_ops'), name='mot_task_name_trgm')
+        ]
+
+    @property
+    def recurrence_signature(self):
+        """
+        Hash of the recurrence fields, start and end dates, equal for mots having the same
+        occurrences. List order doesn't matter.
+        """
+        recurrence = {field: getattr(self, field) for field in self.recurrence_fields}
+        recurrence['every_week'] = sorted(recurrence['every_week'] or [])
+        recurrence['every_month'] = sorted(recurrence['every_month'] or [])
+        recurrence['every_year'] = sorted(
+            (date_dict['month'], date_dict['day']) for date_dict in recurrence['every_year'])
+        recurrence['dates'] = [str(self.start_date), str(self.end_date)]
+        return hashlib.blake2b(
+            json.dumps(recurrence, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+    @property
+    def archived_tasks_count(self):
+        # Archived tasks are done tasks, counted from rollups as archives may be purged.
+        return ArchiveRollup.objects.filter(mot_id=self.id, label_id=0).aggregate(
+            count=models.Sum('task_count'))['count'] or 0
 
     @property
     def done_tasks_count(self):
         return (DatedTask.objects.filter(related_mot=self, done=True).count() +
-            WeekTask.objects.filter(related_mot=self, done=True).count())
+            WeekTask.objects.filter(related_mot=self, done=True).count() +
+            self.archived_tasks_count)
 
     @property
     def related_tasks_count(self):
         return (DatedTask.objects.filter(related_mot=self).count() +
-            WeekTask.objects.filter(related_mot=self).count())
+            WeekTask.objects.filter(related_mot=self).count() +
+            self.archived_tasks_count)
 
     def clean(self):
         """
@@ -144,152 +237,34 @@ class MultiOccurencesTask(Task):
             raise ValidationError('There must be exactly one field defined among every_week, '\
                 'every_month, every_year, every_last_day_of_month, number_a_day, number_a_week')
 
-    def create_every_week_task(self, **kwargs):
-        """
-        Create task associated to this mot for every weeks between start and end dates.
-        """
-        start_date = kwargs.get('start_date', self.start_date)
-        end_date = kwargs.get('end_date', self.end_date)
-        running_date = start_date
-        while running_date <= end_date:
-            if (running_date.weekday() + 1) in self.every_week:
-                DatedTask.objects.create(
-                    name=self.task_name,
-                    date= running_date,
-                    related_mot=self
-                )
-            running_date = running_date + timedelta(days=1)
-
-    def create_every_month_task(self, **kwargs):
-        """
-        Create task associated to this mot for every month between start and end dates.
-        """
-        start_date = kwargs.get('start_date', self.start_date)
-        end_date = kwargs.get('end_date', self.end_date)
-        running_date = start_date
-        while running_date <= end_date:
-            for day in self.every_month:
-                # Since object has been cleaned, date is supposed to exist.
-                task_date = date(
-                    year=running_date.year,
-                    month=running_date.month,
-                    day=day)
-                # Handle case when every_month=[1,15] and end_date is 10th of month:
-                # for this month task for the 1st must be created but not for the 15th
-                if task_date <= end_date and task_date >= start_date:
-                    DatedTask.objects.create(
-                        name=self.task_name,
-                        date=task_date,
-                        related_mot=self
-                    )
-            current_month_range = month_range(running_date.year, running_date.month)
-            running_date = running_date + timedelta(days=current_month_range)
-
-    def create_every_last_day_of_month_task(self, **kwargs):
-        """
-        Create task on the last day of month associated to this mot for every month between start
-        and end dates.
-        """
-        start_date = kwargs.get('start_date', self.start_date)
-        end_date = kwargs.get('end_date', self.end_date)
-        running_date = start_date
-        while running_date <= end_date:
-            task_date = date(
-                year=running_date.year,
-                month=running_date.month,
-                day=month_range(running_date.year, running_date.month))
-            # Handle case when end_date is 10th of month, task should not be created
-            if task_date <= end_date:
-                DatedTask.objects.create(
-                    name=self.task_name,
-                    date=task_date,
-                    related_mot=self
-                )
-            current_month_range = month_range(running_date.year, running_date.month)
-            running_date = running_date + timedelta(days=current_month_range)
-
-    def create_every_year_task(self, **kwargs):
-        """
-        Create task on specific days for every year between start and end dates.
-        """
-        start_date = kwargs.get('start_date', self.start_date)
-        end_date = kwargs.get('end_date', self.end_date)
-        running_year = start_date.year
-        while running_year <= end_date.year:
-            for date_dict in self.every_year:
-                task_date = date(
-                    year=running_year,
-                    month=date_dict['month'],
-                    day=date_dict['day'])
-                if task_date <= end_date and task_date >= start_date:
-                    DatedTask.objects.create(
-                        name=self.task_name,
-                        date=task_date,
-                        related_mot=self
-                    )
-            running_year = running_year + 1
-
-    def create_number_a_day_task(self, **kwargs):
-        """
-        Create task associated to this mot for every weeks between start and end dates.
-        """
-        start_date = kwargs.get('start_date', self.start_date)
-        end_date = kwargs.get('end_date', self.end_date)
-        running_date = start_date
-        while running_date <= end_date:
-            counter = 0
-            while counter < self.number_a_day:
-                DatedTask.objects.create(
-                    name=self.task_name,
-                    date=running_date,
-                    related_mot=self
-                )
-                counter += 1
-            running_date = running_date + timedelta(days=1)
-
-    def create_number_a_week_task(self, **kwargs):
-        """
-        Create task associated to this mot for every weeks between start and end dates.
-        """
-        start_date = kwargs.get('start_date', self.start_date)
-        end_date = kwargs.get('end_date', self.end_date)
-        running_date = start_date
-        while running_date <= end_date:
-            # handle the case when modifying a mot that starts in the middle of the week and
-            # for which we decrease the start date so that week tasks are not created again
-            # for this same week.
-            year = running_date.year
-            week_number = running_date.isocalendar().week
-            counter = WeekTask.objects.filter(
-                related_mot=self,
-                name=self.task_name,
-                week_number=week_number,
-                year=year
-            ).count()
-            while counter < self.number_a_week:
-                WeekTask.objects.create(
-                    name=self.task_name,
-                    year=year,
-                    week_number=week_number,
-                    related_mot=self
-                )
-                counter += 1
-            # increment one day by one day for the case when end_date is a monday and start date
-            # is in the middle of the week
-            running_date = running_date + timedelta(days=1)
-
     def save(self, *args, **kwargs):
         """
         when saving models after an update, we might want to modify associated dated tasks.
+        The version is compared and swapped first, so that related tasks are modified from
+        the state this instance was read from: ConcurrentUpdateError is raised if it was
+        saved meanwhile or is being deleted, and nothing is written. The row stays locked
+        until related tasks are modified.
         """
-        # check is object already exists in db.
+        if self._state.adding:
+            super(MultiOccurencesTask, self).save(*args, **kwargs)
+            return
+        version = self.version
         try:
-            db_self = MultiOccurencesTask.objects.get(id=self.id)
-        except ObjectDoesNotExist:
-            db_self = None
-        super(MultiOccurencesTask, self).save(*args, **kwargs)
-        if db_self:
-            self.modify_related_tasks(db_self)
+            with transaction.atomic():
+                swapped = MultiOccurencesTask.objects.filter(
+                    id=self.id, version=version, deleting=False).update(
+                        version=models.F('version') + 1)
+                if not swapped:
+                    raise ConcurrentUpdateError(
+                        f'Multi occurences task {self.id} was modified since version {version}.')
+                db_self = MultiOccurencesTask.objects.get(id=self.id)
+                self.version = db_self.version
+                super(MultiOccurencesTask, self).save(*args, **kwargs)
+                self.modify_related_tasks(db_self)
+        except Exception:
+            # Rolled back, this instance can be saved again.
+            self.version = version
+            raise
 
     def modify_related_tasks(self, previous_self):
         """
@@ -298,16 +273,17 @@ class MultiOccurencesTask(Task):
         - start_date or end_date: add or delete appropriate dated tasks
         - recurrence: delete and recreate dated tasks
         - name: do nothing
+        Tasks are deleted with set-based queries, see task.deletion.
         """
-        recurrences_fields = [
-            'every_week', 'every_month', 'every_last_day_of_month', 'every_year', 'number_a_day',
-            'number_a_week']
+        from task.deletion import delete_task_batches
+
         recurrences_changed = any(
-            [getattr(self, field) != getattr(previous_self, field) for field in recurrences_fields]
+            [getattr(self, field) != getattr(previous_self, field)
+             for field in self.recurrence_fields]
         )
         if recurrences_changed:
-            DatedTask.objects.filter(related_mot=self).delete()
-            WeekTask.objects.filter(related_mot=self).delete()
+            delete_task_batches(DatedTask, DatedTask.objects.filter(related_mot=self))
+            delete_task_batches(WeekTask, WeekTask.objects.filter(related_mot=self))
             self.create_related_tasks()
         # determine corredponding weeks to handle weektasks
         start_week = self.start_date.isocalendar().week
@@ -316,34 +292,34 @@ class MultiOccurencesTask(Task):
         end_year = self.end_date.year
         # increasing start date should delete appropriate tasks
         if self.start_date > previous_self.start_date:
-            DatedTask.objects.filter(
+            delete_task_batches(DatedTask, DatedTask.objects.filter(
                 related_mot=self,
                 date__lt=self.start_date
-            ).delete()
-            WeekTask.objects.filter(
+            ))
+            delete_task_batches(WeekTask, WeekTask.objects.filter(
                 related_mot=self,
                 week_number__lt=start_week,
                 year=start_year
-            ).delete()
-            WeekTask.objects.filter(
+            ))
+            delete_task_batches(WeekTask, WeekTask.objects.filter(
                 related_mot=self,
                 year__lt=start_year
-            ).delete()
+            ))
         # decreasing end date should delete appropriate tasks
         if self.end_date < previous_self.end_date:
-            DatedTask.objects.filter(
+            delete_task_batches(DatedTask, DatedTask.objects.filter(
                 related_mot=self,
                 date__gt=self.end_date
-            ).delete()
-            WeekTask.objects.filter(
+            ))
+            delete_task_batches(WeekTask, WeekTask.objects.filter(
                 related_mot=self,
                 week_number__gt=end_week,
                 year=end_year
-            ).delete()
-            WeekTask.objects.filter(
+            ))
+            delete_task_batches(WeekTask, WeekTask.objects.filter(
                 related_mot=self,
                 year__gt=end_year
-            ).delete()
+            ))
         # ds: date start, de: date end, 1: previous date, 2: new date
         # case de1 < de2 < ds2 < ds1 is handled above by deleting extra task.
         # handle case when order is de2 < ds2 < de1 < ds1
@@ -379,17 +355,118 @@ class MultiOccurencesTask(Task):
 
     def create_related_tasks(self, **kwargs):
         """
-        create dated task related to this mot.
+        create tasks related to this mot, between start_date and end_date kwargs if given.
         """
-        if self.every_week:
-            self.create_every_week_task(**kwargs)
-        if self.every_month:
-            self.create_every_month_task(**kwargs)
-        if self.every_last_day_of_month:
-            self.create_every_last_day_of_month_task(**kwargs)
-        if self.every_year:
-            self.create_every_year_task(**kwargs)
-        if self.number_a_day:
-            self.create_number_a_day_task(**kwargs)
-        if self.number_a_week:
-            self.create_number_a_week_task(**kwargs)
+        generate_related_tasks(
+            self,
+            kwargs.get('start_date', self.start_date),
+            kwargs.get('end_date', self.end_date),
+            kwargs.get('backend'))
+
+
+class ArchivedTask(models.Model):
+    """
+    Abstract done task moved out of the task tables by the archive_tasks command.
+    Id is the id of the archived task, labels are kept as a list of label ids.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    name = models.CharField(max_length=100)
+    label_ids = PortableArrayField(models.BigIntegerField(), default=list, blank=True)
+    related_mot = models.ForeignKey(
+        'task.MultiOccurencesTask', on_delete=models.CASCADE, null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        abstract = True
+
+
+class ArchivedDatedTask(ArchivedTask):
+    date = models.DateField(db_index=True)
+
+
+class ArchivedWeekTask(ArchivedTask):
+    year = models.PositiveSmallIntegerField()
+    week_number = models.PositiveSmallIntegerField()
+
+
+class RetiredOccurrence(models.Model):
+    """
+    Abstract occurrence of a mot whose task was deleted or archived, so that it is not
+    generated again (see task.occurrences).
+    """
+    related_mot = models.ForeignKey('task.MultiOccurencesTask', on_delete=models.CASCADE)
+    occurrence = models.PositiveSmallIntegerField()
+
+    class Meta:
+        abstract = True
+
+
+class RetiredDatedOccurrence(RetiredOccurrence):
+    date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['related_mot', 'date', 'occurrence'],
+                name='unique_retired_dated_occurrence')
+        ]
+
+
+class RetiredWeekOccurrence(RetiredOccurrence):
+    year = models.PositiveSmallIntegerField()
+    week_number = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['related_mot', 'year', 'week_number', 'occurrence'],
+                name='unique_retired_week_occurrence')
+        ]
+
+
+class ArchiveRollup(models.Model):
+    """
+    Number of archived tasks per mot, label and week. Still correct after archived tasks
+    are purged.
+    0 is used for tasks without mot, and for the row of a mot/week counting every task
+    whatever its labels, so that it can be part of the unique constraint.
+    """
+    mot_id = models.BigIntegerField(default=0)
+    label_id = models.BigIntegerField(default=0)
+    year = models.PositiveSmallIntegerField()
+    week_number = models.PositiveSmallIntegerField()
+    task_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['mot_id', 'label_id', 'year', 'week_number'], name='unique_archive_rollup')
+        ]
+
+
+class TaskStat(models.Model):
+    """
+    Number of tasks and of done tasks per iso week, label and mot, see task.stats.
+    label_id 0 counts every task whatever its labels, mot_id 0 counts tasks without mot.
+    """
+    iso_year = models.PositiveSmallIntegerField()
+    iso_week = models.PositiveSmallIntegerField()
+    label_id = models.BigIntegerField(default=0)
+    mot_id = models.BigIntegerField(default=0)
+    total = models.IntegerField(default=0)
+    done = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['iso_year', 'iso_week', 'label_id', 'mot_id'], name='unique_task_stat')
+        ]
+
+
+class Tombstone(models.Model):
+    """
+    Deleted task, mot or label, so that clients syncing changes can remove it.
+    """
+    model_name = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_default=Now(), db_index=True)
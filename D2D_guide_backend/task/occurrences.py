@@ -0,0 +1,379 @@
+"""
+Generation of the tasks related to a multi occurences task.
+Two backends write the same rows, with the labels of the mot:
+- postgresql expands the recurrence inside the database (generate_series) and writes the
+rows with a single INSERT ... SELECT per recurrence field,
+- python computes the occurrences and bulk inserts them, it is the portable fallback.
+Generated tasks are identified by (related_mot, date or week, occurrence), occurrence being
+their rank among the tasks of the mot on that date or week. Both backends insert with
+ON CONFLICT DO NOTHING on that key, so generating the same range again, from a retry or an
+overlapping job, creates missing tasks only. Occurrences whose task was deleted or archived
+are retired (see retire_occurrences) and skipped by every backend.
+Dated occurrences computed in python are kept in a bounded LRU cache keyed by the recurrence
+signature of the mot and the window. It is mostly a preview cache: mot previews and the
+seed_tasks command read from it, and so does the python backend, used on databases other
+than PostgreSQL. Generation on PostgreSQL, mot updates included, expands occurrences in SQL
+without it.
+"""
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.db import connection
+
+from task.bulk import reserve_ids
+from task.utils import month_range
+
+# Number of rows per INSERT query for the python backend.
+BULK_BATCH_SIZE = 1000
+# Number of (signature, window) entries kept by the occurrence cache of each process.
+OCCURRENCE_CACHE_SIZE = 256
+
+
+def days(start_date, end_date):
+    running_date = start_date
+    while running_date <= end_date:
+        yield running_date
+        running_date = running_date + timedelta(days=1)
+
+
+class OccurrenceCache:
+    """
+    Least recently used values of at most maxsize keys, with hit and miss counters.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, compute):
+        """
+        Return the value of key, calling compute() to get it on a miss.
+        """
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self.misses += 1
+        value = compute()
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'hits': self.hits, 'misses': self.misses, 'size': len(self.entries),
+                'maxsize': self.maxsize}
+
+
+occurrence_cache = OccurrenceCache(OCCURRENCE_CACHE_SIZE)
+
+
+def dated_occurrences(mot, start_date, end_date):
+    """
+    Return the (date, occurrence) of the dated tasks of a mot between start and end dates.
+    A date appears as many times as there are tasks to create on it, with occurrences 1, 2...
+    The returned tuple comes from occurrence_cache, it is shared by mots with the same
+    recurrence.
+    """
+    return occurrence_cache.get(
+        (mot.recurrence_signature, start_date, end_date),
+        lambda: expand_dated_occurrences(mot, start_date, end_date))
+
+
+def expand_dated_occurrences(mot, start_date, end_date):
+    occurrences = []
+    for day in days(start_date, end_date):
+        count = 0
+        if mot.every_week and day.weekday() + 1 in mot.every_week:
+            count += 1
+        if mot.every_month and day.day in mot.every_month:
+            count += 1
+        if mot.every_last_day_of_month and day.day == month_range(day.year, day.month):
+            count += 1
+        for date_dict in mot.every_year:
+            if (day.month, day.day) == (date_dict['month'], date_dict['day']):
+                count += 1
+        count += mot.number_a_day or 0
+        occurrences.extend((day, occurrence) for occurrence in range(1, count + 1))
+    return tuple(occurrences)
+
+
+def week_occurrences(start_date, end_date):
+    """
+    Return the (year, week_number) of the weeks between start and end dates.
+    Note that year is the calendar year of the days, as it has always been for week tasks.
+    """
+    weeks = {}
+    for day in days(start_date, end_date):
+        weeks.setdefault((day.year, day.isocalendar().week), None)
+    return list(weeks)
+
+
+def available_backends():
+    return ['python', 'postgresql'] if connection.vendor == 'postgresql' else ['python']
+
+
+def default_backend():
+    return available_backends()[-1]
+
+
+def generate_related_tasks(mot, start_date, end_date, backend=None):
+    """
+    Create the tasks of a mot between start and end dates, with the labels of the mot.
+    """
+    from task.events import publish_rows
+    from task.models import DatedTask, WeekTask
+    from task.stats import refresh_mot_stats
+
+    if start_date > end_date:
+        return
+    if (backend or default_backend()) == 'postgresql':
+        postgresql_generate(mot, start_date, end_date)
+    else:
+        python_generate(mot, start_date, end_date)
+    # Bulk writes don't send model signals.
+    refresh_mot_stats(mot)
+    publish_rows(DatedTask, DatedTask.objects.filter(
+        related_mot=mot, date__range=(start_date, end_date)), 'create')
+    if mot.number_a_week:
+        publish_rows(WeekTask, WeekTask.objects.filter(related_mot=mot).filter(
+            year__range=(start_date.year, end_date.year)), 'create')
+
+
+def bulk_create_with_labels(model, tasks, mot):
+    """
+    Insert tasks skipping existing and retired occurrences, then the labels of inserted ones
+    from their label_ids.
+    Ids are reserved beforehand: inserted tasks are the ones whose id exists afterwards.
+    Return the inserted tasks.
+    """
+    retired_model, keys = retired_occurrences(model)
+    retired = set(retired_model.objects.filter(related_mot=mot).values_list(
+        *keys, 'occurrence'))
+    tasks = [
+        task for task in tasks
+        if tuple(getattr(task, field) for field in [*keys, 'occurrence']) not in retired]
+    if not tasks:
+        return []
+    for task_id, task in zip(reserve_ids(model, len(tasks)), tasks):
+        task.id = task_id
+    model.objects.bulk_create(tasks, batch_size=BULK_BATCH_SIZE, ignore_conflicts=True)
+    # Reserved ids may interleave with the ones of concurrent reservations.
+    reserved = {task.id: task for task in tasks}
+    inserted = [
+        reserved[task_id] for task_id in model.objects.filter(
+            id__range=(min(reserved), max(reserved))).values_list('id', flat=True)
+        if task_id in reserved]
+    through = model.label.through
+    task_field = through._meta.get_field(model._meta.model_name).attname
+    through.objects.bulk_create([
+        through(**{task_field: task.id, 'label_id': label_id})
+        for task in inserted for label_id in task.label_ids], batch_size=BULK_BATCH_SIZE)
+    return inserted
+
+
+def retired_occurrences(model):
+    """
+    Return the model of retired occurrences of a task model, and the fields of their date or
+    week.
+    """
+    from task.models import DatedTask, RetiredDatedOccurrence, RetiredWeekOccurrence
+
+    if model is DatedTask:
+        return RetiredDatedOccurrence, ['date']
+    return RetiredWeekOccurrence, ['year', 'week_number']
+
+
+def retire_occurrences(model, tasks):
+    """
+    Keep the occurrences of deleted or archived tasks (dicts of field values) generated by a
+    mot, so that they are not generated again.
+    """
+    retired_model, keys = retired_occurrences(model)
+    retired_model.objects.bulk_create([
+        retired_model(
+            related_mot_id=task['related_mot_id'], occurrence=task['occurrence'],
+            **{field: task[field] for field in keys})
+        for task in tasks if task['related_mot_id'] and task['occurrence']],
+        ignore_conflicts=True)
+
+
+def python_generate(mot, start_date, end_date):
+    from task.models import DatedTask, WeekTask
+
+    label_ids = list(mot.label.order_by('id').values_list('id', flat=True))
+    bulk_create_with_labels(DatedTask, [
+        DatedTask(
+            name=mot.task_name, date=day, related_mot=mot, occurrence=occurrence,
+            label_ids=label_ids)
+        for day, occurrence in dated_occurrences(mot, start_date, end_date)], mot)
+    if mot.number_a_week:
+        # Weeks starting before start_date may already have tasks, see modify_related_tasks.
+        bulk_create_with_labels(WeekTask, [
+            WeekTask(
+                name=mot.task_name, year=year, week_number=week_number, related_mot=mot,
+                occurrence=occurrence, label_ids=label_ids)
+            for year, week_number in week_occurrences(start_date, end_date)
+            for occurrence in range(1, mot.number_a_week + 1)], mot)
+
+
+def table_names(model):
+    """
+    Return quoted names used to write a task model and its labels.
+    """
+    quote = connection.ops.quote_name
+    through = model.label.through
+    return {
+        'table': quote(model._meta.db_table),
+        'pk': quote(model._meta.pk.column),
+        'name': quote(model._meta.get_field('name').column),
+        'done': quote(model._meta.get_field('done').column),
+        'related_mot': quote(model._meta.get_field('related_mot').column),
+        'occurrence': quote(model._meta.get_field('occurrence').column),
+        'label_ids': quote(model._meta.get_field('label_ids').column),
+        'retired': quote(retired_occurrences(model)[0]._meta.db_table),
+        'through': quote(through._meta.db_table),
+        'through_task': quote(through._meta.get_field(model._meta.model_name).column),
+        'through_label': quote(through._meta.get_field('label').column),
+    }
+
+
+def mot_table_names(mot_model):
+    """
+    Return quoted names used to read the labels of mots.
+    """
+    quote = connection.ops.quote_name
+    through = mot_model.label.through
+    return {
+        'mot_through': quote(through._meta.db_table),
+        'mot_through_mot': quote(through._meta.get_field(mot_model._meta.model_name).column),
+        'mot_through_label': quote(through._meta.get_field('label').column),
+    }
+
+
+# Labels of the mot are copied to inserted rows in the same statement.
+COPY_LABELS_SQL = """
+    INSERT INTO {through} ({through_task}, {through_label})
+    SELECT inserted.{pk}, mot_label.{mot_through_label}
+    FROM inserted
+    CROSS JOIN {mot_through} AS mot_label
+    WHERE mot_label.{mot_through_mot} = %(mot)s
+"""
+
+# Retired occurrences have the columns of tasks.
+NOT_RETIRED_SQL = """
+    NOT EXISTS (
+        SELECT 1 FROM {retired} AS retired
+        WHERE retired.{related_mot} = %(mot)s AND retired.{occurrence} = {occurrence_value}
+        AND {retired_keys}
+    )
+"""
+
+# RETURNING only gives inserted rows, existing occurrences keep their labels.
+DATED_TASKS_SQL = """
+    WITH inserted AS (
+        INSERT INTO {table} ({name}, {done}, {date}, {related_mot}, {occurrence}, {label_ids})
+        SELECT %(name)s, false, day::date, %(mot)s, {occurrence_value}, %(label_ids)s::bigint[]
+        FROM generate_series(%(start)s::date, %(end)s::date, interval '1 day') AS day
+        {repeat}
+        WHERE {condition} AND {not_retired}
+        ON CONFLICT DO NOTHING
+        RETURNING {pk}
+    )
+""" + COPY_LABELS_SQL
+
+WEEK_TASKS_SQL = """
+    WITH weeks AS (
+        SELECT DISTINCT
+            EXTRACT(YEAR FROM day)::integer AS year,
+            EXTRACT(WEEK FROM day)::integer AS week_number
+        FROM generate_series(%(start)s::date, %(end)s::date, interval '1 day') AS day
+    ), inserted AS (
+        INSERT INTO {table} (
+            {name}, {done}, {year}, {week_number}, {related_mot}, {occurrence}, {label_ids})
+        SELECT
+            %(name)s, false, weeks.year, weeks.week_number, %(mot)s, ranks.occurrence,
+            %(label_ids)s::bigint[]
+        FROM weeks
+        CROSS JOIN generate_series(1, %(number)s) AS ranks (occurrence)
+        WHERE {not_retired}
+        ON CONFLICT DO NOTHING
+        RETURNING {pk}
+    )
+""" + COPY_LABELS_SQL
+
+
+def dated_conditions(mot):
+    """
+    Yield (condition on the generated day, repeat clause, occurrence, params) per recurrence
+    field. Only one field is set (see MultiOccurencesTask.clean), so occurrences of the other
+    ones are 1.
+    """
+    if mot.every_week:
+        yield 'EXTRACT(ISODOW FROM day) = ANY(%(values)s)', '', '1', {
+            'values': list(mot.every_week)}
+    if mot.every_month:
+        yield 'EXTRACT(DAY FROM day) = ANY(%(values)s)', '', '1', {
+            'values': list(mot.every_month)}
+    if mot.every_last_day_of_month:
+        yield "EXTRACT(DAY FROM day + interval '1 day') = 1", '', '1', {}
+    if mot.every_year:
+        month_days = [
+            f'{date_dict["month"]:02d}-{date_dict["day"]:02d}' for date_dict in mot.every_year]
+        yield "to_char(day, 'MM-DD') = ANY(%(values)s)", '', '1', {'values': month_days}
+    if mot.number_a_day:
+        yield (
+            'true', 'CROSS JOIN generate_series(1, %(number)s) AS ranks (occurrence)',
+            'ranks.occurrence',
+            {'number': mot.number_a_day})
+
+
+def postgresql_generate(mot, start_date, end_date):
+    from task.models import DatedTask, WeekTask
+
+    quote = connection.ops.quote_name
+    mot_names = mot_table_names(type(mot))
+    params = {
+        'name': mot.task_name, 'mot': mot.id, 'start': start_date, 'end': end_date,
+        'label_ids': list(mot.label.order_by('id').values_list('id', flat=True))}
+    with connection.cursor() as cursor:
+        names = {
+            **table_names(DatedTask), **mot_names,
+            'date': quote(DatedTask._meta.get_field('date').column)}
+        for condition, repeat, occurrence, condition_params in dated_conditions(mot):
+            not_retired = NOT_RETIRED_SQL.format(
+                occurrence_value=occurrence, retired_keys=f'retired.{names["date"]} = day::date',
+                **names)
+            cursor.execute(
+                DATED_TASKS_SQL.format(
+                    condition=condition, repeat=repeat, occurrence_value=occurrence,
+                    not_retired=not_retired, **names),
+                {**params, **condition_params})
+        if mot.number_a_week:
+            names = {
+                **table_names(WeekTask), **mot_names,
+                'year': quote(WeekTask._meta.get_field('year').column),
+                'week_number': quote(WeekTask._meta.get_field('week_number').column)}
+            not_retired = NOT_RETIRED_SQL.format(
+                occurrence_value='ranks.occurrence', retired_keys=(
+                    f'retired.{names["year"]} = weeks.year '
+                    f'AND retired.{names["week_number"]} = weeks.week_number'),
+                **names)
+            cursor.execute(
+                WEEK_TASKS_SQL.format(not_retired=not_retired, **names),
+                {**params, 'number': mot.number_a_week})
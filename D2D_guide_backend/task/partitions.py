@@ -0,0 +1,127 @@
+"""
+Yearly range partitions of the dated task table (see migration 0015).
+Rows outside of every yearly partition go to the default partition, creating a partition
+for their year moves them out of it.
+"""
+from datetime import date
+
+from django.db import connection, transaction
+
+from task.models import DatedTask, Tombstone
+
+
+def partition_name(year):
+    return f'{DatedTask._meta.db_table}_y{year}'
+
+
+def default_partition_name():
+    return f'{DatedTask._meta.db_table}_default'
+
+
+def partition_years():
+    """
+    Return the sorted years having a partition.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = %s
+        """, [DatedTask._meta.db_table])
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = partition_name('')
+    return sorted(int(name[len(prefix):]) for name in names if name[len(prefix):].isdigit())
+
+
+def create_partition(year):
+    """
+    Create the partition of a year. Rows of that year already written in the default
+    partition are moved to the new partition, with their labels.
+    """
+    quote = connection.ops.quote_name
+    through = DatedTask.label.through
+    names = {
+        'parent': quote(DatedTask._meta.db_table),
+        'partition': quote(partition_name(year)),
+        'default': quote(default_partition_name()),
+        'pk': quote(DatedTask._meta.pk.column),
+        'date': quote(DatedTask._meta.get_field('date').column),
+        'through': quote(through._meta.db_table),
+        'through_columns': ', '.join(quote(field.column) for field in through._meta.fields),
+        'through_task': quote(through._meta.get_field('datedtask').column),
+    }
+    bounds = [date(year, 1, 1), date(year + 1, 1, 1)]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT EXISTS (SELECT 1 FROM {default} WHERE {date} >= %s AND {date} < %s)'.format(
+                **names), bounds)
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                'CREATE TABLE {partition} PARTITION OF {parent} '
+                'FOR VALUES FROM (%s) TO (%s)'.format(**names), bounds)
+            return
+        # Attaching a partition fails while the default partition has rows in its range.
+        # Check constraints of the parent must be on the partition to attach it.
+        cursor.execute(
+            'CREATE TABLE {partition} (LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+            .format(**names))
+        # Labels reference their task, deleting it from the default partition deletes them.
+        cursor.execute("""
+            CREATE TEMPORARY TABLE moved_labels AS
+            SELECT {through_columns} FROM {through} WHERE {through_task} IN (
+                SELECT {pk} FROM {default} WHERE {date} >= %s AND {date} < %s)
+        """.format(**names), bounds)
+        cursor.execute("""
+            WITH moved AS (
+                DELETE FROM {default} WHERE {date} >= %s AND {date} < %s RETURNING *
+            )
+            INSERT INTO {partition} SELECT * FROM moved
+        """.format(**names), bounds)
+        cursor.execute(
+            'ALTER TABLE {parent} ATTACH PARTITION {partition} '
+            'FOR VALUES FROM (%s) TO (%s)'.format(**names), bounds)
+        cursor.execute(
+            'INSERT INTO {through} ({through_columns}) '
+            'SELECT {through_columns} FROM moved_labels'.format(**names))
+        cursor.execute('DROP TABLE moved_labels')
+
+
+def create_partitions(first_year, last_year):
+    """
+    Create missing partitions between first and last years, return the created years.
+    """
+    existing = set(partition_years())
+    created = [year for year in range(first_year, last_year + 1) if year not in existing]
+    for year in created:
+        create_partition(year)
+    return created
+
+
+def detach_partition(year):
+    """
+    Detach the partition of a year from the dated task table, its rows are kept in a
+    standalone table of the same name. Labels of the detached tasks are deleted and
+    tombstones are recorded for sync.
+    """
+    quote = connection.ops.quote_name
+    through = DatedTask.label.through
+    names = {
+        'parent': quote(DatedTask._meta.db_table),
+        'partition': quote(partition_name(year)),
+        'pk': quote(DatedTask._meta.pk.column),
+        'through': quote(through._meta.db_table),
+        'through_task': quote(through._meta.get_field('datedtask').column),
+        'tombstone': quote(Tombstone._meta.db_table),
+        'tombstone_model': quote(Tombstone._meta.get_field('model_name').column),
+        'tombstone_object': quote(Tombstone._meta.get_field('object_id').column),
+    }
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Labels reference their task, they are deleted while it is still in the table.
+        cursor.execute(
+            'DELETE FROM {through} WHERE {through_task} IN (SELECT {pk} FROM {partition})'.format(
+                **names))
+        cursor.execute('ALTER TABLE {parent} DETACH PARTITION {partition}'.format(**names))
+        cursor.execute(
+            'INSERT INTO {tombstone} ({tombstone_model}, {tombstone_object}) '
+            'SELECT %s, {pk} FROM {partition}'.format(**names), [DatedTask._meta.model_name])
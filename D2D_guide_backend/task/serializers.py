@@ -4,9 +4,11 @@ Serializers for task app.
 from rest_framework import serializers
 
 from task.models import DatedTask, WeekTask, MultiOccurencesTask, Label
+from D2D_guide_backend.mixins.normalized_labels_mixin import NormalizedLabelsSerializerMixin
+from D2D_guide_backend.mixins.sparse_fieldset_mixin import SparseFieldsetMixin
 
 
-class LabelSerializer(serializers.ModelSerializer):
+class LabelSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Label
         fields = ['name', 'id']
@@ -22,65 +24,70 @@ class LabelTaskSerializer(serializers.ModelSerializer):
         fields = ['name', 'id']
 
 
-class DatedTaskSerializer(serializers.ModelSerializer):
-    label = LabelTaskSerializer(many=True)
-
-    class Meta:
-        model = DatedTask
-        fields = ['name', 'date', 'done', 'id', 'label']
+def set_labels(task, label_ids, current_ids=None):
+    """
+    Write the difference between the current labels of a task and label_ids, as one bulk
+    insert and one delete of through rows. Nothing is written when labels are unchanged.
+    """
+    if current_ids is None:
+        current_ids = set(task.label.values_list('id', flat=True))
+    if label_ids - current_ids:
+        task.label.add(*(label_ids - current_ids))
+    if current_ids - label_ids:
+        task.label.remove(*(current_ids - label_ids))
+
+
+class LabelWriteMixin:
+    """
+    Validate posted label ids with one query and only write label changes, see set_labels.
+    Labels are left unchanged by updates without label.
+    """
+    def validate_label(self, value):
+        label_ids = {label['id'] for label in value}
+        unknown = label_ids - set(
+            Label.objects.filter(id__in=label_ids).values_list('id', flat=True))
+        if unknown:
+            raise serializers.ValidationError(
+                f'Unknown label ids: {", ".join(map(str, sorted(unknown)))}')
+        return value
 
     def create(self, validated_data):
-        """
-        Handle labels.
-        """
         label_data = validated_data.pop('label')
-        dated_task = super(DatedTaskSerializer, self).create(validated_data)
-        for label in label_data:
-            dated_task.label.add(label['id'])
-        return dated_task
+        task = super().create(validated_data)
+        set_labels(task, {label['id'] for label in label_data}, current_ids=set())
+        return task
 
     def update(self, instance, validated_data):
-        """
-        Handle labels update.
-        """
-        label_data = validated_data.pop('label')
-        dated_task = super(DatedTaskSerializer, self).update(instance, validated_data)
-        dated_task.label.clear()
-        for label in label_data:
-            dated_task.label.add(label['id'])
-        return dated_task
+        label_data = validated_data.pop('label', None)
+        task = super().update(instance, validated_data)
+        if label_data is not None:
+            set_labels(task, {label['id'] for label in label_data})
+        return task
 
 
-class WeekTaskSerializer(serializers.ModelSerializer):
+class DatedTaskSerializer(
+        LabelWriteMixin, NormalizedLabelsSerializerMixin, SparseFieldsetMixin,
+        serializers.ModelSerializer):
     label = LabelTaskSerializer(many=True)
 
     class Meta:
-        model = WeekTask
-        fields = ['name', 'week_number', 'year', 'done', 'id', 'label']
+        model = DatedTask
+        fields = ['name', 'date', 'done', 'id', 'label']
 
-    def create(self, validated_data):
-        """
-        Handle labels.
-        """
-        label_data = validated_data.pop('label')
-        week_task = super(WeekTaskSerializer, self).create(validated_data)
-        for label in label_data:
-            week_task.label.add(label['id'])
-        return week_task
 
-    def update(self, instance, validated_data):
-        """
-        Handle labels update.
-        """
-        label_data = validated_data.pop('label')
-        week_task = super(WeekTaskSerializer, self).update(instance, validated_data)
-        week_task.label.clear()
-        for label in label_data:
-            week_task.label.add(label['id'])
-        return week_task
+class WeekTaskSerializer(
+        LabelWriteMixin, NormalizedLabelsSerializerMixin, SparseFieldsetMixin,
+        serializers.ModelSerializer):
+    label = LabelTaskSerializer(many=True)
+
+    class Meta:
+        model = WeekTask
+        fields = ['name', 'week_number', 'year', 'done', 'id', 'label']
 
 
-class MultiOccurencesTaskSerializer(serializers.ModelSerializer):
+class MultiOccurencesTaskSerializer(
+        LabelWriteMixin, NormalizedLabelsSerializerMixin, SparseFieldsetMixin,
+        serializers.ModelSerializer):
     label = LabelTaskSerializer(many=True)
 
     class Meta:
@@ -88,8 +95,9 @@ class MultiOccurencesTaskSerializer(serializers.ModelSerializer):
         fields = [
             'name', 'done', 'id', 'start_date', 'end_date', 'every_week', 'every_month', 'label',
             'every_year', 'every_last_day_of_month', 'number_a_day', 'number_a_week', 'task_name',
-            'related_tasks_count', 'done_tasks_count'
+            'related_tasks_count', 'done_tasks_count', 'version'
         ]
+        read_only_fields = ['version']
 
     def to_internal_value(self, data):
         # Handle the case of empty string posted for number_a_day and number_a_week
@@ -99,30 +107,17 @@ class MultiOccurencesTaskSerializer(serializers.ModelSerializer):
             data['number_a_week'] = None
         return super(MultiOccurencesTaskSerializer, self).to_internal_value(data)
 
-    def create(self, validated_data):
-        """
-        Handle labels.
-        """
-        label_data = validated_data.pop('label')
-        mot = super(MultiOccurencesTaskSerializer, self).create(validated_data)
-        for label in label_data:
-            mot.label.add(label['id'])
-        return mot
-
     def update(self, instance, validated_data):
         """
-        Handle labels.
+        Labels are only set when given, as mot label changes are propagated to its tasks.
         """
-        label_data = validated_data.pop('label', 'not informed')
-        labels_id = []
-        for label in label_data:
-            labels_id.append(label['id'])
+        label_data = validated_data.pop('label', None)
         for field in self.get_fields().keys():
             try:
                 setattr(instance, field, validated_data[field])
             except KeyError: # partial updated allowed
                 pass
         instance.save()
-        if label_data != 'not_informed':
-            instance.label.set(labels_id)
+        if label_data is not None:
+            set_labels(instance, {label['id'] for label in label_data})
         return instance
@@ -1,9 +1,18 @@
-from django.db.models.signals import pre_save, post_save, m2m_changed
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.db import transaction
 from django.dispatch import receiver
 from django.core.exceptions import ValidationError
 
-from task.models import WeekTask, MultiOccurencesTask, DatedTask
+from task.models import WeekTask, MultiOccurencesTask, DatedTask, Label, TaskStat, Tombstone
 from task.utils import number_of_weeks
+from task.ical import invalidate_feed
+from task.events import instance_event, publish
+from task.deletion import delete_task_batches
+from task.occurrences import retire_occurrences
+from task.labels import (
+    sync_label_ids, sync_task_label_ids, remove_label_id, set_mot_task_labels)
+from task.stats import (
+    previous_stat_values, task_changed, task_deleted, linked_pairs, labels_changed)
 
 
 @receiver(pre_save, sender=WeekTask)
@@ -27,9 +36,108 @@ def create_dated_tasks(sender, instance, created, **kwargs):
     if created:
         instance.create_related_tasks()
 
+@receiver(pre_delete, sender=MultiOccurencesTask)
+def delete_related_tasks(sender, instance, **kwargs):
+    """
+    Related tasks are not collected by Django. They are usually deleted before, by
+    task.deletion.delete_mot_tasks, the ones left are deleted within this transaction.
+    """
+    delete_task_batches(DatedTask, DatedTask.objects.filter(related_mot=instance))
+    delete_task_batches(WeekTask, WeekTask.objects.filter(related_mot=instance))
+
 @receiver(m2m_changed, sender=MultiOccurencesTask.label.through)
-def update_labels(sender, instance, action, **kwargs):
-    # Changing task label should change related task label.
-    if action in ['post_add', 'post_remove']:
-        for task in DatedTask.objects.filter(related_mot=instance):
-            task.label.set(instance.label.all())
+def update_labels(sender, instance, action, reverse, pk_set, **kwargs):
+    # Changing mot label should change related task label.
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if not reverse:
+        set_mot_task_labels(instance)
+    elif pk_set:
+        for mot in MultiOccurencesTask.objects.filter(pk__in=pk_set):
+            set_mot_task_labels(mot)
+
+@receiver([post_save, post_delete], sender=DatedTask)
+@receiver([post_save, post_delete], sender=WeekTask)
+@receiver([post_save, post_delete], sender=MultiOccurencesTask)
+@receiver([post_save, post_delete], sender=Label)
+@receiver(m2m_changed, sender=DatedTask.label.through)
+@receiver(m2m_changed, sender=WeekTask.label.through)
+@receiver(m2m_changed, sender=MultiOccurencesTask.label.through)
+def invalidate_calendar_feed(sender, **kwargs):
+    # A feed read before commit would be cached from the previous data.
+    transaction.on_commit(invalidate_feed)
+
+@receiver(pre_save, sender=DatedTask)
+@receiver(pre_save, sender=WeekTask)
+def keep_previous_stat_values(sender, instance, **kwargs):
+    instance._previous_stat_values = previous_stat_values(instance)
+
+@receiver(post_save, sender=DatedTask)
+@receiver(post_save, sender=WeekTask)
+def update_task_stats(sender, instance, **kwargs):
+    task_changed(instance, instance._previous_stat_values)
+
+@receiver(pre_delete, sender=DatedTask)
+@receiver(pre_delete, sender=WeekTask)
+def remove_task_stats(sender, instance, **kwargs):
+    # Labels are not deleted yet.
+    task_deleted(instance)
+
+@receiver(m2m_changed, sender=DatedTask.label.through)
+@receiver(m2m_changed, sender=WeekTask.label.through)
+def update_label_stats(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Removed labels are counted before removal, as cleared labels are not given by the signal.
+    """
+    task_model = model if reverse else type(instance)
+    if action == 'post_add':
+        labels_changed(task_model, linked_pairs(task_model, instance, reverse, pk_set, False), 1)
+    elif action in ['pre_remove', 'pre_clear']:
+        labels_changed(task_model, linked_pairs(task_model, instance, reverse, pk_set, True), -1)
+
+@receiver(post_delete, sender=Label)
+def remove_label_stats(sender, instance, **kwargs):
+    TaskStat.objects.filter(label_id=instance.id).delete()
+
+@receiver(m2m_changed, sender=DatedTask.label.through)
+@receiver(m2m_changed, sender=WeekTask.label.through)
+@receiver(m2m_changed, sender=MultiOccurencesTask.label.through)
+def update_label_ids(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Keep label_ids in sync with labels.
+    When labels of a task are changed from the label side, instance is the label and
+    pk_set holds task ids, or is None if they are cleared.
+    """
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if not reverse:
+        sync_task_label_ids(instance)
+    elif pk_set is None:
+        sync_label_ids(model, model.objects.filter(label_ids__contains=[instance.pk]).values('pk'))
+    else:
+        sync_label_ids(model, pk_set)
+
+@receiver(post_delete, sender=Label)
+def remove_deleted_label_id(sender, instance, **kwargs):
+    remove_label_id(instance.id)
+
+@receiver(post_delete, sender=DatedTask)
+@receiver(post_delete, sender=WeekTask)
+def retire_deleted_occurrence(sender, instance, **kwargs):
+    # A deleted task of a mot is not generated again.
+    retire_occurrences(sender, [instance.__dict__])
+
+@receiver(post_delete, sender=DatedTask)
+@receiver(post_delete, sender=WeekTask)
+@receiver(post_delete, sender=MultiOccurencesTask)
+@receiver(post_delete, sender=Label)
+def add_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(model_name=sender._meta.model_name, object_id=instance.pk)
+
+@receiver([post_save, post_delete], sender=DatedTask)
+@receiver([post_save, post_delete], sender=WeekTask)
+@receiver([post_save, post_delete], sender=MultiOccurencesTask)
+@receiver([post_save, post_delete], sender=Label)
+def publish_change(sender, instance, signal, created=False, **kwargs):
+    operation = 'delete' if signal is post_delete else 'create' if created else 'update'
+    publish([instance_event(instance, operation)])
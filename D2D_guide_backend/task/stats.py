@@ -0,0 +1,232 @@
+"""
+Completion statistics of tasks, kept in the TaskStat summary table.
+Rows are keyed by (iso_year, iso_week, label_id, mot_id), label_id 0 counts every task
+whatever its labels and mot_id 0 counts tasks without mot, like ArchiveRollup.
+Model signals update the table one task at a time, bulk writes refresh it per mot or
+add their counts directly. Archived tasks stay counted (archival doesn't send signals).
+"""
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum, F, DEFERRED
+from django.db.models.functions import Coalesce, ExtractIsoYear, ExtractWeek
+
+from task.models import DatedTask, WeekTask, ArchiveRollup, TaskStat
+
+UPSERT_SQL = """
+    INSERT INTO {table} ({iso_year}, {iso_week}, {label}, {mot}, {total}, {done})
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT ({iso_year}, {iso_week}, {label}, {mot})
+    DO UPDATE SET {total} = {table}.{total} + EXCLUDED.{total},
+    {done} = {table}.{done} + EXCLUDED.{done}
+"""
+
+
+def task_week(model, values):
+    """
+    Return (iso_year, iso_week) of a task from its field values.
+    Week tasks year is used as iso year, see task.occurrences.week_occurrences.
+    """
+    if model is DatedTask:
+        return tuple(values['date'].isocalendar())[:2]
+    return values['year'], values['week_number']
+
+
+def stat_values(task):
+    fields = ['date'] if isinstance(task, DatedTask) else ['year', 'week_number']
+    return {field: getattr(task, field) for field in fields + ['related_mot_id', 'done']}
+
+
+def task_counts(model, values, label_ids, sign=1):
+    """
+    Return the counts of a task for its labels and for label 0.
+    """
+    counts = {}
+    week = task_week(model, values)
+    for label_id in [0, *label_ids]:
+        key = (*week, label_id, values['related_mot_id'] or 0)
+        counts[key] = (sign, sign if values['done'] else 0)
+    return counts
+
+
+def add_stats(counts):
+    """
+    Add {(iso_year, iso_week, label_id, mot_id): (total, done)} to the summary table.
+    """
+    counts = {key: value for key, value in counts.items() if value != (0, 0)}
+    if not counts:
+        return
+    quote = connection.ops.quote_name
+    names = {
+        'table': quote(TaskStat._meta.db_table),
+        **{name: quote(TaskStat._meta.get_field(field).column) for name, field in [
+            ('iso_year', 'iso_year'), ('iso_week', 'iso_week'), ('label', 'label_id'),
+            ('mot', 'mot_id'), ('total', 'total'), ('done', 'done')]},
+    }
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            UPSERT_SQL.format(**names), [(*key, *value) for key, value in counts.items()])
+
+
+def merge(counts, other):
+    for key, (total, done) in other.items():
+        previous_total, previous_done = counts.get(key, (0, 0))
+        counts[key] = (previous_total + total, previous_done + done)
+    return counts
+
+
+def previous_stat_values(task):
+    """
+    Return stat values of a task as last read from the database, None for a new task.
+    """
+    if task._state.adding:
+        return None
+    fields = list(stat_values(task))
+    loaded = getattr(task, '_loaded_values', {})
+    if all(loaded.get(field, DEFERRED) is not DEFERRED for field in fields):
+        return {field: loaded[field] for field in fields}
+    return type(task).objects.filter(pk=task.pk).values(*fields).first()
+
+
+def task_changed(task, previous_values):
+    """
+    Move the counts of a saved task from its previous values to the current ones.
+    """
+    model = type(task)
+    values = stat_values(task)
+    task._loaded_values = {**getattr(task, '_loaded_values', {}), **values}
+    if values == previous_values:
+        return
+    label_ids = list(task.label.values_list('id', flat=True))
+    counts = task_counts(model, values, label_ids)
+    if previous_values:
+        merge(counts, task_counts(model, previous_values, label_ids, sign=-1))
+    add_stats(counts)
+
+
+def task_deleted(task):
+    add_stats(task_counts(
+        type(task), stat_values(task), list(task.label.values_list('id', flat=True)), sign=-1))
+
+
+def linked_pairs(model, instance, reverse, pk_set, existing):
+    """
+    Return (task, label id) pairs of a m2m_changed signal of a task model labels.
+    If existing, only currently linked pairs are returned, all of them if pk_set is None.
+    """
+    through = model.label.through
+    task_field = model._meta.model_name
+    if existing:
+        links = through.objects.filter(**{'label' if reverse else task_field: instance.pk})
+        if pk_set is not None:
+            links = links.filter(**{f'{task_field if reverse else "label"}__in': pk_set})
+        pk_set = list(links.values_list(f'{task_field}_id' if reverse else 'label_id', flat=True))
+    if reverse:
+        return [(task, instance.pk) for task in model.objects.filter(pk__in=pk_set)]
+    return [(instance, label_id) for label_id in pk_set]
+
+
+def labels_changed(model, pairs, sign):
+    """
+    Add (sign 1) or remove (sign -1) the label counts of (task, label id) pairs.
+    """
+    counts = {}
+    for task, label_id in pairs:
+        key = (*task_week(model, stat_values(task)), label_id, task.related_mot_id or 0)
+        merge(counts, {key: (sign, sign if task.done else 0)})
+    add_stats(counts)
+
+
+def live_counts(model, tasks):
+    """
+    Return counts of a task queryset, computed with GROUP BY queries.
+    """
+    if model is DatedTask:
+        week = {'iso_year': ExtractIsoYear('date'), 'iso_week': ExtractWeek('date')}
+    else:
+        week = {'iso_year': F('year'), 'iso_week': F('week_number')}
+    counts = {}
+    groups = tasks.order_by().values(**week, mot_id=Coalesce('related_mot', 0))
+    for row in groups.annotate(total=Count('id'), done=Count('id', filter=Q(done=True))):
+        merge(counts, {
+            (row['iso_year'], row['iso_week'], 0, row['mot_id']): (row['total'], row['done'])})
+    groups = tasks.order_by().filter(label__isnull=False).values(
+        **week, label_id=F('label'), mot_id=Coalesce('related_mot', 0))
+    for row in groups.annotate(total=Count('id'), done=Count('id', filter=Q(done=True))):
+        merge(counts, {
+            (row['iso_year'], row['iso_week'], row['label_id'], row['mot_id']):
+            (row['total'], row['done'])})
+    return counts
+
+
+def archived_counts(rollups):
+    counts = {}
+    for row in rollups.values(
+            'year', 'week_number', 'label_id', 'mot_id').annotate(count=Sum('task_count')):
+        merge(counts, {
+            (row['year'], row['week_number'], row['label_id'], row['mot_id']):
+            (row['count'], row['count'])})
+    return counts
+
+
+def write_counts(counts):
+    TaskStat.objects.bulk_create([
+        TaskStat(iso_year=iso_year, iso_week=iso_week, label_id=label_id, mot_id=mot_id,
+                 total=total, done=done)
+        for (iso_year, iso_week, label_id, mot_id), (total, done) in counts.items() if total],
+        batch_size=1000)
+
+
+def refresh_mot_stats(mot):
+    """
+    Recompute the rows of a mot, after its tasks were written in bulk.
+    """
+    with transaction.atomic():
+        TaskStat.objects.filter(mot_id=mot.id).delete()
+        counts = live_counts(DatedTask, DatedTask.objects.filter(related_mot=mot))
+        merge(counts, live_counts(WeekTask, WeekTask.objects.filter(related_mot=mot)))
+        merge(counts, archived_counts(ArchiveRollup.objects.filter(mot_id=mot.id)))
+        write_counts(counts)
+
+
+def rebuild_stats():
+    """
+    Recompute the whole summary table from tasks and archive rollups.
+    """
+    with transaction.atomic():
+        TaskStat.objects.all().delete()
+        counts = live_counts(DatedTask, DatedTask.objects.all())
+        merge(counts, live_counts(WeekTask, WeekTask.objects.all()))
+        merge(counts, archived_counts(ArchiveRollup.objects.all()))
+        write_counts(counts)
+        return len(counts)
+
+
+def completion(rows, keys):
+    return [{
+        **{key: row[key] for key in keys},
+        'total': row['total_sum'],
+        'done': row['done_sum'],
+        'completion_rate': round(row['done_sum'] / row['total_sum'], 4),
+    } for row in rows.values(*keys).annotate(
+        total_sum=Sum('total'), done_sum=Sum('done')).filter(total_sum__gt=0).order_by(*keys)]
+
+
+def get_stats(iso_year=None, iso_week=None, label_id=None, mot_id=None):
+    """
+    Return completion per label, per mot and per week, read from the summary table only.
+    """
+    stats = TaskStat.objects.all()
+    if iso_year is not None:
+        stats = stats.filter(iso_year=iso_year)
+    if iso_week is not None:
+        stats = stats.filter(iso_week=iso_week)
+    if mot_id is not None:
+        stats = stats.filter(mot_id=mot_id)
+    labels = stats.exclude(label_id=0)
+    if label_id is not None:
+        labels = labels.filter(label_id=label_id)
+    stats = stats.filter(label_id=label_id or 0)
+    return {
+        'labels': completion(labels, ['label_id']),
+        'mots': completion(stats.exclude(mot_id=0), ['mot_id']),
+        'weeks': completion(stats, ['iso_year', 'iso_week']),
+    }
@@ -0,0 +1,139 @@
+"""
+Changes of tasks, mots and labels since a sync token.
+Rows have an updated_at set on save (auto_now) or by the database for raw writes, deleted
+rows leave a Tombstone. A token is the time a sync started. Transactions may commit rows
+with an updated_at older than a token, so changes are read from SYNC_OVERLAP before it:
+clients may receive a row twice and must apply changes idempotently.
+A sync returns at most SYNC_PAGE_SIZE rows and deleted ids per call, read by id. Until the
+last page, the token also holds where the sync stopped, the token of the last page is the
+time the first one started.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+from task.models import DatedTask, WeekTask, MultiOccurencesTask, Label, Tombstone
+from task.serializers import (
+    DatedTaskSerializer, WeekTaskSerializer, MultiOccurencesTaskSerializer, LabelSerializer)
+
+SYNC_OVERLAP = timedelta(minutes=1)
+# Tombstones are pruned after this delay, older tokens need a full sync.
+TOMBSTONE_RETENTION = timedelta(days=30)
+# Rows and deleted ids returned by a sync call at most.
+SYNC_PAGE_SIZE = 1000
+# Response key: (model, serializer)
+SYNC_MODELS = {
+    'dated_task': (DatedTask, DatedTaskSerializer),
+    'week_task': (WeekTask, WeekTaskSerializer),
+    'multi_occurences_task': (MultiOccurencesTask, MultiOccurencesTaskSerializer),
+    'label': (Label, LabelSerializer),
+}
+
+
+class InvalidTokenError(ValueError):
+    pass
+
+
+def timestamp(moment):
+    return int(moment.timestamp() * 1_000_000)
+
+
+def make_token(moment, since=None, stream=0, last_id=0):
+    """
+    Return the token of a sync started at moment. Tokens of a sync with pages left hold its
+    since (0 for a full sync), the stream where it stopped and the last id read in it.
+    """
+    if not stream and not last_id:
+        return str(timestamp(moment))
+    values = [timestamp(since) if since else 0, timestamp(moment), stream, last_id]
+    return '.'.join(str(value) for value in values)
+
+
+def parse_token(token):
+    """
+    Return (since, started, stream, last id) of a token, started being None for the token of
+    a finished sync and since None for a full sync.
+    """
+    try:
+        values = [int(value) for value in token.split('.')]
+        moments = [
+            datetime.fromtimestamp(value / 1_000_000, tz=dt_timezone.utc) if value else None
+            for value in values[:2]]
+    except (AttributeError, ValueError, OverflowError, OSError):
+        raise InvalidTokenError('since must be a token returned by a previous sync')
+    if len(values) == 1 and moments[0]:
+        return moments[0], None, 0, 0
+    if len(values) == 4 and moments[1] and values[2] >= 0:
+        return moments[0], moments[1], values[2], values[3]
+    raise InvalidTokenError('since must be a token returned by a previous sync')
+
+
+def add_tombstones(model, ids):
+    """
+    Record deleted rows, for deletes that don't send model signals.
+    """
+    Tombstone.objects.bulk_create([
+        Tombstone(model_name=model._meta.model_name, object_id=object_id) for object_id in ids],
+        batch_size=1000)
+
+
+def prune_tombstones(now=None):
+    return Tombstone.objects.filter(
+        deleted_at__lt=(now or timezone.now()) - TOMBSTONE_RETENTION).delete()[0]
+
+
+def sync_streams(since):
+    """
+    Return the (response key, deleted, queryset) read in turn by a sync: rows of each model
+    then, unless since is None, its deleted ids. Querysets are ordered by id.
+    """
+    streams = []
+    for key, (model, _) in SYNC_MODELS.items():
+        queryset = model.objects.order_by('id')
+        if model is not Label:
+            queryset = queryset.prefetch_related('label')
+        if since is not None:
+            queryset = queryset.filter(updated_at__gte=since - SYNC_OVERLAP)
+        streams.append((key, False, queryset))
+        if since is not None:
+            streams.append((key, True, Tombstone.objects.filter(
+                model_name=model._meta.model_name,
+                deleted_at__gte=since - SYNC_OVERLAP).order_by('id')))
+    return streams
+
+
+def get_changes(token=None, context=None, page_size=SYNC_PAGE_SIZE):
+    """
+    Return at most page_size rows changed and ids deleted since token (everything if token
+    is None), with the token of the next call. full is True when the whole data is returned,
+    clients must then replace their data once every page is read. more is True when pages
+    are left, the token then reads the next page of the same sync.
+    """
+    since, started, stream, last_id = parse_token(token) if token else (None, None, 0, 0)
+    started = started or timezone.now()
+    if since is not None and since < started - TOMBSTONE_RETENTION:
+        since = None
+    changes = {
+        'full': since is None, 'more': False, 'deleted': {key: [] for key in SYNC_MODELS},
+        **{key: [] for key in SYNC_MODELS}}
+    streams = sync_streams(since)
+    remaining = page_size
+    for index in range(stream, len(streams)):
+        key, deleted, queryset = streams[index]
+        if deleted:
+            rows = list(queryset.filter(id__gt=last_id).values_list('id', 'object_id')[
+                :remaining])
+            changes['deleted'][key] = list(dict.fromkeys(object_id for _, object_id in rows))
+            ids = [row_id for row_id, _ in rows]
+        else:
+            rows = list(queryset.filter(id__gt=last_id)[:remaining])
+            changes[key] = SYNC_MODELS[key][1](rows, many=True, context=context).data
+            ids = [row.id for row in rows]
+        remaining -= len(rows)
+        if not remaining:
+            changes['more'] = True
+            changes['token'] = make_token(started, since, index, ids[-1])
+            return changes
+        last_id = 0
+    changes['token'] = make_token(started)
+    return changes
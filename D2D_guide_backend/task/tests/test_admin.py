@@ -0,0 +1,82 @@
+from datetime import date
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from task.admin import EstimatedCountPaginator, estimated_count
+from task.models import MultiOccurencesTask, DatedTask, WeekTask, Label, TaskStat
+
+
+class TaskAdminTestCase(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='admin'))
+        self.label = Label.objects.create(name='lab')
+        self.mot = MultiOccurencesTask.objects.create(
+            name='mot', task_name='task', start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 31), every_week=[1, 3])
+        self.mot.label.set([self.label])
+
+    def test_changelists(self):
+        """
+        Make sure that changelists, searches and autocompletes work, with a number of
+        queries that doesn't depend on the number of rows.
+        """
+        for url in [
+                '/admin/task/datedtask/', '/admin/task/weektask/',
+                '/admin/task/multioccurencestask/', '/admin/task/label/',
+                '/admin/task/datedtask/?q=task&date__year=2025',
+                '/admin/task/datedtask/?done__exact=0']:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/task/datedtask/')
+        self.assertContains(response, '>lab<', count=9)
+        other_mot = MultiOccurencesTask.objects.create(
+            name='other', task_name='other', start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 31), every_week=[2])
+        other_mot.label.set([self.label])
+        with self.assertNumQueries(len(queries)):
+            self.client.get('/admin/task/datedtask/')
+        WeekTask.objects.create(name='week', year=2025, week_number=2, related_mot=self.mot)
+        response = self.client.get('/admin/autocomplete/', {
+            'app_label': 'task', 'model_name': 'datedtask', 'field_name': 'related_mot',
+            'term': 'mo'})
+        self.assertEqual(
+            [result['id'] for result in response.json()['results']], [str(self.mot.id)])
+
+    def test_mark_done(self):
+        """
+        Make sure that marking tasks as done updates them and their stats in bulk.
+        """
+        tasks = DatedTask.objects.filter(related_mot=self.mot, date__lt=date(2025, 1, 15))
+        response = self.client.post('/admin/task/datedtask/', {
+            'action': 'mark_done', '_selected_action': list(tasks.values_list('id', flat=True))})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(DatedTask.objects.filter(done=True).count(), 4)
+        self.assertEqual(
+            TaskStat.objects.get(iso_year=2025, iso_week=2, label_id=self.label.id).done, 2)
+        self.client.post('/admin/task/datedtask/', {
+            'action': 'mark_not_done', '_selected_action': [tasks.first().id]})
+        self.assertEqual(DatedTask.objects.filter(done=True).count(), 3)
+        self.assertEqual(
+            sum(TaskStat.objects.filter(label_id=0).values_list('done', flat=True)), 3)
+
+    def test_paginator_count(self):
+        """
+        Make sure that small querysets are counted exactly.
+        """
+        paginator = EstimatedCountPaginator(DatedTask.objects.all(), 100)
+        self.assertEqual(paginator.count, 9)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Estimates come from the PostgreSQL planner.')
+    def test_estimated_count(self):
+        """
+        Make sure that row counts are estimated from the query plan.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE task_datedtask')
+        self.assertGreater(estimated_count(DatedTask.objects.filter(done=False)), 0)
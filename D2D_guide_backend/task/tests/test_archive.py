@@ -0,0 +1,98 @@
+from datetime import date
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from task.archive import months_before
+from task.models import (
+    MultiOccurencesTask, DatedTask, WeekTask, Label, ArchivedDatedTask, ArchivedWeekTask,
+    ArchiveRollup)
+
+
+class ArchiveTestCase(TestCase):
+
+    def setUp(self):
+        self.label = Label.objects.create(name='lab')
+        self.mot = MultiOccurencesTask.objects.create(
+            name='mot',
+            task_name='mot task',
+            start_date=date(2024, 1, 1),
+            end_date=date(2024, 1, 31),
+            every_week=[1]
+        )
+        self.mot.label.set([self.label])
+        DatedTask.objects.filter(related_mot=self.mot, date__lt=date(2024, 1, 20)).update(
+            done=True)
+        self.old_task = DatedTask.objects.create(name='old', date=date(2024, 2, 1), done=True)
+        self.old_task.label.add(self.label)
+        self.late_task = DatedTask.objects.create(name='late', date=date(2024, 2, 1))
+        self.recent_task = DatedTask.objects.create(
+            name='recent', date=date(2025, 2, 1), done=True)
+        self.old_week_task = WeekTask.objects.create(
+            name='old week', year=2024, week_number=5, done=True)
+
+    def archive(self, **kwargs):
+        call_command('archive_tasks', today=date(2025, 3, 1), months=12, batch_size=2,
+                     stdout=StringIO(), **kwargs)
+
+    def test_months_before(self):
+        """
+        Make sure that months are removed with the day clamped to the month range.
+        """
+        self.assertEqual(months_before(date(2025, 3, 31), 1), date(2025, 2, 28))
+        self.assertEqual(months_before(date(2025, 3, 1), 15), date(2023, 12, 1))
+
+    def test_archive_tasks(self):
+        """
+        Make sure that only old done tasks are archived, with their labels and rollups,
+        and that mot counters don't change.
+        """
+        counts = (self.mot.related_tasks_count, self.mot.done_tasks_count)
+        self.archive()
+        self.assertEqual(
+            set(ArchivedDatedTask.objects.values_list('name', flat=True)), {'old', 'mot task'})
+        self.assertEqual(ArchivedDatedTask.objects.filter(related_mot=self.mot).count(), 3)
+        self.assertEqual(
+            ArchivedDatedTask.objects.get(id=self.old_task.id).label_ids, [self.label.id])
+        self.assertEqual(ArchivedWeekTask.objects.get().id, self.old_week_task.id)
+        self.assertFalse(DatedTask.objects.filter(id=self.old_task.id).exists())
+        self.assertFalse(
+            DatedTask.label.through.objects.filter(datedtask=self.old_task.id).exists())
+        self.assertEqual(
+            set(DatedTask.objects.filter(related_mot=None).values_list('name', flat=True)),
+            {'late', 'recent'})
+        self.assertEqual((self.mot.related_tasks_count, self.mot.done_tasks_count), counts)
+        rollup = ArchiveRollup.objects.get(mot_id=0, label_id=self.label.id)
+        self.assertEqual(
+            (rollup.year, rollup.week_number, rollup.task_count), (2024, 5, 1))
+        # Purged archived tasks are still counted by rollups.
+        self.archive(purge_months=0)
+        self.assertFalse(ArchivedDatedTask.objects.exists())
+        self.assertEqual((self.mot.related_tasks_count, self.mot.done_tasks_count), counts)
+        # Archived occurrences are not generated again.
+        self.mot.create_related_tasks()
+        call_command('generate_occurrences', start=date(2024, 1, 1), weeks=5, stdout=StringIO())
+        self.assertEqual((self.mot.related_tasks_count, self.mot.done_tasks_count), counts)
+
+    def test_include_archived(self):
+        """
+        Make sure that archived tasks are listed with include_archived, using task filters.
+        """
+        self.archive()
+        client = APIClient()
+        response = client.get('/dated_task/', {'year': 2024, 'include_archived': 'true'})
+        self.assertEqual(response.data['count'], 7)
+        tasks = response.data['results']
+        self.assertEqual([task['date'] for task in tasks], sorted(task['date'] for task in tasks))
+        old_task = next(task for task in tasks if task['id'] == self.old_task.id)
+        self.assertEqual(old_task['label'], [{'name': 'lab', 'id': self.label.id}])
+        self.assertTrue(old_task['archived'] and old_task['done'])
+        response = client.get('/dated_task/', {'label': self.label.id, 'include_archived': '1'})
+        self.assertEqual(response.data['count'], 6)
+        response = client.get('/dated_task/', {'done': 'false', 'include_archived': '1'})
+        self.assertEqual(response.data['count'], 3)
+        response = client.get('/week_task/', {'year': 2024, 'include_archived': 'true'})
+        self.assertEqual([task['id'] for task in response.data['results']], [self.old_week_task.id])
+        self.assertEqual(client.get('/dated_task/', {'year': 2024}).data['count'], 3)
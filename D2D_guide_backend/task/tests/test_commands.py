@@ -0,0 +1,75 @@
+from datetime import date
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from task.management.commands.replay_load import percentile
+from task.models import MultiOccurencesTask, DatedTask, WeekTask, Label
+
+
+class SeedTasksTestCase(TestCase):
+
+    def seed(self, **kwargs):
+        options = {
+            'seed': 1,
+            'labels': 5,
+            'mots': 10,
+            'dated_tasks': 300,
+            'week_tasks': 50,
+            'weeks': 20,
+            'today': date(2024, 3, 1),
+            'batch_size': 100,
+            'flush': True,
+            'stdout': StringIO(),
+        }
+        options.update(kwargs)
+        call_command('seed_tasks', **options)
+        return (
+            list(DatedTask.objects.order_by('id').values_list(
+                'id', 'name', 'date', 'done', 'related_mot')),
+            list(WeekTask.objects.order_by('id').values_list(
+                'id', 'name', 'year', 'week_number', 'done', 'related_mot')),
+            list(DatedTask.label.through.objects.order_by('datedtask', 'label').values_list(
+                'datedtask', 'label')),
+        )
+
+    def test_seed_tasks_volumes(self):
+        """
+        Make sure that seeding creates the requested volumes and valid mot related tasks.
+        """
+        self.seed()
+        self.assertEqual(Label.objects.count(), 5)
+        self.assertEqual(MultiOccurencesTask.objects.count(), 10)
+        self.assertEqual(DatedTask.objects.filter(related_mot__isnull=True).count(), 300)
+        self.assertEqual(WeekTask.objects.filter(related_mot__isnull=True).count(), 50)
+        for task in DatedTask.objects.filter(related_mot__isnull=False).select_related(
+                'related_mot'):
+            self.assertTrue(task.related_mot.start_date <= task.date <= task.related_mot.end_date)
+        # Past tasks are mostly done, future ones mostly not.
+        past = DatedTask.objects.filter(date__lt=date(2024, 3, 1))
+        future = DatedTask.objects.filter(date__gte=date(2024, 3, 1))
+        self.assertGreater(past.filter(done=True).count(), past.count() / 2)
+        self.assertLess(future.filter(done=True).count(), future.count() / 2)
+
+    def test_seed_tasks_deterministic(self):
+        """
+        Make sure that two runs with the same seed produce the same rows.
+        """
+        first_run = self.seed()
+        self.assertEqual(self.seed(), first_run)
+        self.assertNotEqual(self.seed(seed=2), first_run)
+
+
+class ReplayLoadTestCase(TestCase):
+
+    def test_percentile(self):
+        """
+        Make sure that percentiles follow the nearest-rank definition.
+        """
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3], 99), 3)
+        self.assertEqual(percentile([], 50), 0)
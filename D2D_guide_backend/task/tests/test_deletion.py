@@ -0,0 +1,158 @@
+from datetime import date
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from task.deletion import delete_task_batch, delete_task_batches
+from task.models import (
+    MultiOccurencesTask, DatedTask, WeekTask, Label, TaskStat, Tombstone, ConcurrentUpdateError)
+from task.stats import rebuild_stats
+
+
+def stat_rows():
+    return sorted(TaskStat.objects.filter(total__gt=0).values_list(
+        'iso_year', 'iso_week', 'label_id', 'mot_id', 'total', 'done'))
+
+
+class DeletionTestCase(TestCase):
+
+    def setUp(self):
+        self.label = Label.objects.create(name='lab')
+        self.mot = MultiOccurencesTask.objects.create(
+            name='mot', task_name='task', start_date=date(2025, 1, 1),
+            end_date=date(2025, 3, 31), every_week=[1, 3, 5])
+        self.mot.label.set([self.label])
+        self.week_mot = MultiOccurencesTask.objects.create(
+            name='week', task_name='week', start_date=date(2025, 1, 1),
+            end_date=date(2025, 3, 31), number_a_week=2)
+        self.week_mot.label.set([self.label])
+        self.other_mot = MultiOccurencesTask.objects.create(
+            name='other', task_name='other', start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 31), every_week=[2])
+        self.other_mot.label.set([self.label])
+
+    def assertStatsRebuilt(self):
+        incremental = stat_rows()
+        rebuild_stats()
+        self.assertEqual(incremental, stat_rows())
+
+    def test_delete_mot(self):
+        """
+        Make sure that deleting a mot deletes its tasks, their labels and stats by batches,
+        with a number of queries that doesn't depend on the number of tasks.
+        """
+        dated_ids = set(DatedTask.objects.filter(related_mot=self.mot).values_list(
+            'id', flat=True))
+        week_ids = set(WeekTask.objects.filter(related_mot=self.week_mot).values_list(
+            'id', flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            self.mot.delete()
+        self.week_mot.delete()
+        self.assertLess(len(queries), 40)
+        self.assertFalse(DatedTask.objects.filter(id__in=dated_ids).exists())
+        self.assertFalse(WeekTask.objects.filter(id__in=week_ids).exists())
+        self.assertFalse(DatedTask.label.through.objects.filter(
+            datedtask_id__in=dated_ids).exists())
+        self.assertEqual(DatedTask.objects.count(), 4)
+        self.assertEqual(
+            set(Tombstone.objects.filter(model_name='datedtask').values_list(
+                'object_id', flat=True)),
+            dated_ids)
+        self.assertEqual(
+            Tombstone.objects.filter(model_name='weektask').count(), len(week_ids))
+        self.assertStatsRebuilt()
+
+    def test_delete_task_batches(self):
+        """
+        Make sure that tasks of a queryset are all deleted, whatever the batch size.
+        """
+        tasks = DatedTask.objects.filter(related_mot=self.mot, date__gte=date(2025, 3, 1))
+        count = tasks.count()
+        self.assertEqual(delete_task_batches(DatedTask, tasks, batch_size=2), count)
+        self.assertFalse(tasks.exists())
+        self.assertEqual(delete_task_batches(DatedTask, tasks, batch_size=2), 0)
+        self.assertStatsRebuilt()
+
+    def test_trim_mot(self):
+        """
+        Make sure that tasks out of the new dates of a mot are deleted with their stats.
+        """
+        self.mot.start_date = date(2025, 2, 1)
+        self.mot.end_date = date(2025, 2, 28)
+        self.mot.save()
+        self.assertFalse(DatedTask.objects.filter(
+            related_mot=self.mot, date__lt=date(2025, 2, 1)).exists())
+        self.assertFalse(DatedTask.objects.filter(
+            related_mot=self.mot, date__gt=date(2025, 2, 28)).exists())
+        self.assertEqual(DatedTask.objects.filter(related_mot=self.mot).count(), 12)
+        self.assertStatsRebuilt()
+
+    def test_delete_label(self):
+        """
+        Make sure that deleting a label removes its links and its id from label_ids.
+        """
+        task = DatedTask.objects.create(name='single', date=date(2025, 1, 6))
+        task.label.add(self.label)
+        label_id = self.label.id
+        self.label.delete()
+        for model in [DatedTask, WeekTask, MultiOccurencesTask]:
+            self.assertFalse(model.label.through.objects.filter(label_id=label_id).exists())
+            self.assertFalse(model.objects.filter(label_ids__contains=[label_id]).exists())
+        self.assertEqual(DatedTask.objects.count(), 44)
+        self.assertStatsRebuilt()
+
+
+class MotDeletionTestCase(TransactionTestCase):
+
+    def setUp(self):
+        self.mot = MultiOccurencesTask.objects.create(
+            name='mot', task_name='task', start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 31), every_week=[1, 3, 5])
+        self.client = APIClient()
+        self.url = f'/multi_occurences_task/{self.mot.id}/'
+
+    def test_batches_are_committed(self):
+        """
+        Make sure that the tasks of a mot deleted through the api are deleted by batches
+        outside of any transaction, before the mot, which can't be saved nor read meanwhile.
+        """
+        batches = []
+
+        def small_batch(model, tasks, batch_size):
+            deleted = delete_task_batch(model, tasks, 2)
+            batches.append((deleted, len(connection.atomic_blocks)))
+            if deleted:
+                self.assertEqual(self.client.get(self.url).status_code, 404)
+                self.assertEqual(self.client.patch(
+                    self.url, {'end_date': '2025-02-28'}, format='json').status_code, 404)
+                with self.assertRaises(ConcurrentUpdateError):
+                    self.mot.save()
+            return deleted
+
+        with mock.patch('task.deletion.delete_task_batch', small_batch):
+            response = self.client.delete(self.url, HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(sum(deleted for deleted, _ in batches), 14)
+        self.assertEqual({depth for deleted, depth in batches if deleted}, {0})
+        self.assertFalse(DatedTask.objects.exists())
+        self.assertFalse(MultiOccurencesTask.objects.exists())
+
+    def test_resume_deletion(self):
+        """
+        Make sure that a mot whose deletion stopped halfway is deleted by deleting it again.
+        """
+        def failing_batch(model, tasks, batch_size):
+            delete_task_batch(model, tasks, 2)
+            raise RuntimeError('Interrupted deletion.')
+
+        with mock.patch('task.deletion.delete_task_batch', failing_batch):
+            with self.assertRaises(RuntimeError):
+                self.client.delete(self.url)
+        self.assertEqual(DatedTask.objects.count(), 12)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertFalse(DatedTask.objects.exists())
+        self.assertFalse(MultiOccurencesTask.objects.exists())
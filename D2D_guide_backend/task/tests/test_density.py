@@ -0,0 +1,72 @@
+from datetime import date
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from task.models import MultiOccurencesTask, DatedTask, WeekTask, Label, ArchivedDatedTask
+
+
+class DensityTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.label = Label.objects.create(name='lab')
+        self.mot = MultiOccurencesTask.objects.create(
+            name='mot', task_name='mot task', start_date=date(2024, 12, 1),
+            end_date=date(2025, 1, 31), every_week=[1])
+        self.week_mot = MultiOccurencesTask.objects.create(
+            name='week', task_name='week task', start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 31), number_a_week=2)
+        task = DatedTask.objects.create(name='task', date=date(2025, 1, 6), done=True)
+        task.label.add(self.label)
+        WeekTask.objects.filter(year=2025, week_number=2).first().delete()
+        ArchivedDatedTask.objects.create(id=1000, name='archived', date=date(2025, 1, 8))
+
+    def get_density(self, **params):
+        response = self.client.get(
+            '/density', {'start': '2025-01-01', 'end': '2025-01-14', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_density_per_day(self):
+        """
+        Make sure that dated tasks are counted per day and week tasks per week.
+        """
+        self.assertEqual(self.get_density(), {
+            'days': [
+                {'date': '2025-01-06', 'total': 2, 'done': 1},
+                {'date': '2025-01-13', 'total': 1, 'done': 0}],
+            'weeks': [
+                {'year': 2025, 'week_number': 1, 'total': 2, 'done': 0},
+                {'year': 2025, 'week_number': 2, 'total': 1, 'done': 0},
+                {'year': 2025, 'week_number': 3, 'total': 2, 'done': 0}]})
+        self.assertEqual(self.get_density(label=self.label.id, include_archived='true'), {
+            'days': [{'date': '2025-01-06', 'total': 1, 'done': 1}], 'weeks': []})
+        self.assertEqual(self.get_density(mot=self.mot.id, include_archived='true')['days'], [
+            {'date': '2025-01-06', 'total': 1, 'done': 0},
+            {'date': '2025-01-13', 'total': 1, 'done': 0}])
+
+    def test_density_per_week(self):
+        """
+        Make sure that dated and week tasks are counted together per week, archived tasks
+        being done tasks, with a query per table.
+        """
+        with self.assertNumQueries(4):
+            density = self.get_density(group_by='week', include_archived='true')
+        self.assertEqual(density, {
+            'days': [],
+            'weeks': [
+                {'year': 2025, 'week_number': 1, 'total': 2, 'done': 0},
+                {'year': 2025, 'week_number': 2, 'total': 4, 'done': 2},
+                {'year': 2025, 'week_number': 3, 'total': 3, 'done': 0}]})
+
+    def test_invalid_params(self):
+        """
+        Make sure that invalid query params are answered with 400.
+        """
+        for params in [
+                {}, {'start': '2025-01-01'}, {'start': '2025-01-14', 'end': '2025-01-01'},
+                {'start': '2025-01-01', 'end': '2025-01-14', 'group_by': 'month'},
+                {'start': '2025-01-01', 'end': '2025-01-14', 'label': 'lab'}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/density', params).status_code, 400)
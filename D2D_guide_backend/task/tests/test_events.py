@@ -0,0 +1,125 @@
+import asyncio
+import io
+from datetime import date
+
+from unittest import skipUnless
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from task import events
+from task.events import (
+    EventHub, hub, matching, server_sent_events, websocket_events, week_events)
+from task.importer import TaskImporter
+from task.models import MultiOccurencesTask, DatedTask, Label
+
+
+class EventsTestCase(TestCase):
+
+    def test_matching(self):
+        """
+        Make sure that events are filtered by model and week, events without week and resync
+        events matching any week.
+        """
+        task_events = week_events(DatedTask, [(2025, 2), (2025, 3), (2025, 2)], 'create') + [
+            {'model': 'label', 'id': 1, 'week': None, 'op': 'delete'},
+            events.RESYNC_EVENT]
+        self.assertEqual([event['week'] for event in task_events[:2]], ['2025-W02', '2025-W03'])
+        self.assertEqual(matching(task_events, set(), set()), task_events)
+        self.assertEqual(
+            matching(task_events, {'datedtask'}, {'2025-W03'}),
+            [task_events[1], events.RESYNC_EVENT])
+        self.assertEqual(matching(task_events, set(), {'2025-W03'}), task_events[1:])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Events need PostgreSQL.')
+    async def test_event_stream(self):
+        """
+        Make sure that events are served as server-sent events.
+        """
+        response = await self.async_client.get('/events', {'week': '2025-W02,2025-W03'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+    async def test_server_sent_events(self):
+        """
+        Make sure that events of the hub are streamed as server-sent events.
+        """
+        stream = server_sent_events(set(), {'2025-W02'})
+        self.assertEqual(await anext(stream), 'retry: 5000\n\n')
+        hub.dispatch([{'model': 'datedtask', 'id': 1, 'week': '2025-W01', 'op': 'update'}])
+        hub.dispatch([{'model': 'datedtask', 'id': 2, 'week': '2025-W02', 'op': 'update'}])
+        self.assertEqual(
+            await anext(stream),
+            'event: change\ndata: [{"model":"datedtask","id":2,"week":"2025-W02",'
+            '"op":"update"}]\n\n')
+        await stream.aclose()
+        self.assertFalse(hub.queues)
+
+    async def test_websocket_events(self):
+        """
+        Make sure that events of the hub are sent to websocket clients until they disconnect.
+        """
+        received = asyncio.Queue()
+        sent = []
+        await received.put({'type': 'websocket.connect'})
+
+        async def send(message):
+            sent.append(message)
+
+        client = asyncio.ensure_future(websocket_events(
+            {'type': 'websocket', 'path': '/events', 'query_string': b'model=weektask'},
+            received.get, send))
+        while not hub.queues:
+            await asyncio.sleep(0)
+        hub.dispatch([{'model': 'datedtask', 'id': 1, 'week': '2025-W01', 'op': 'update'}])
+        hub.dispatch([{'model': 'weektask', 'id': 2, 'week': '2025-W01', 'op': 'delete'}])
+        while len(sent) < 2:
+            await asyncio.sleep(0)
+        await received.put({'type': 'websocket.disconnect'})
+        await asyncio.wait_for(client, 5)
+        self.assertEqual(sent, [
+            {'type': 'websocket.accept'},
+            {'type': 'websocket.send',
+             'text': '[{"model":"weektask","id":2,"week":"2025-W01","op":"delete"}]'}])
+        self.assertFalse(hub.queues)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Events need PostgreSQL.')
+class NotifyTestCase(TransactionTestCase):
+
+    async def next_events(self, queue):
+        return await asyncio.wait_for(queue.get(), 5)
+
+    async def test_published_events(self):
+        """
+        Make sure that committed changes of signals and bulk writes reach hub subscribers
+        through PostgreSQL notifications.
+        """
+        event_hub = EventHub()
+        queue = event_hub.subscribe()
+        await asyncio.wait_for(event_hub.listening.wait(), 5)
+        try:
+            task = await sync_to_async(DatedTask.objects.create)(
+                name='task', date=date(2025, 1, 6))
+            self.assertEqual(await self.next_events(queue), [
+                {'model': 'datedtask', 'id': task.id, 'week': '2025-W02', 'op': 'create'}])
+            label = await sync_to_async(Label.objects.create)(name='lab')
+            await self.next_events(queue)
+            mot = await sync_to_async(MultiOccurencesTask.objects.create)(
+                name='mot', task_name='mot task', start_date=date(2025, 1, 6),
+                end_date=date(2025, 1, 19), every_week=[1])
+            self.assertEqual(await self.next_events(queue), [
+                {'model': 'datedtask', 'id': None, 'week': '2025-W02', 'op': 'create'},
+                {'model': 'datedtask', 'id': None, 'week': '2025-W03', 'op': 'create'}])
+            self.assertEqual(await self.next_events(queue), [
+                {'model': 'multioccurencestask', 'id': mot.id, 'week': None, 'op': 'create'}])
+            await sync_to_async(TaskImporter().load)(io.StringIO(
+                '{"name": "imported", "year": 2025, "week_number": 5}\n'), 'ndjson')
+            self.assertEqual(await self.next_events(queue), [
+                {'model': 'weektask', 'id': None, 'week': '2025-W05', 'op': 'create'}])
+            label_id = label.id
+            await sync_to_async(label.delete)()
+            self.assertEqual(await self.next_events(queue), [
+                {'model': 'label', 'id': label_id, 'week': None, 'op': 'delete'}])
+        finally:
+            event_hub.unsubscribe(queue)
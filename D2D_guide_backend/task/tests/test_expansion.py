@@ -0,0 +1,83 @@
+from datetime import date
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from task.deletion import delete_tasks
+from task.expansion import Calendar, expand_mots
+from task.models import MultiOccurencesTask, DatedTask, WeekTask, Label
+from task.occurrences import dated_occurrences, week_occurrences
+from task.tests.test_occurrences import RECURRENCES
+
+
+class ExpansionTestCase(TestCase):
+
+    def test_expand_mots(self):
+        """
+        Make sure that batch expansion gives the occurrences of each mot within the window.
+        """
+        mots = [
+            MultiOccurencesTask.objects.create(
+                name='mot', task_name='task', start_date=date(2023, 12, 27),
+                end_date=date(2025, 3, 1), **recurrence)
+            for recurrence in RECURRENCES]
+        start_date, end_date = date(2024, 2, 10), date(2025, 6, 1)
+        dated, week = expand_mots(mots, Calendar(start_date, end_date))
+        for mot in mots:
+            with self.subTest(mot=mot.id):
+                self.assertEqual(
+                    [(day, occurrence) for mot_id, day, occurrence in zip(*dated.values())
+                     if mot_id == mot.id],
+                    list(dated_occurrences(mot, start_date, mot.end_date)))
+                expected_weeks = [
+                    (year, week_number, occurrence)
+                    for year, week_number in week_occurrences(start_date, mot.end_date)
+                    for occurrence in range(1, (mot.number_a_week or 0) + 1)]
+                self.assertEqual(
+                    [row[1:] for row in zip(*week.values()) if row[0] == mot.id],
+                    expected_weeks)
+
+    def test_generate_occurrences(self):
+        """
+        Make sure that missing tasks of every mot are created with the labels of their mot,
+        and only once, deleted tasks being not created again. Only weeks of created tasks are
+        published.
+        """
+        label = Label.objects.create(name='lab')
+        mot = MultiOccurencesTask.objects.create(
+            name='mot', task_name='task', start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 31), every_week=[1, 3])
+        mot.label.set([label])
+        week_mot = MultiOccurencesTask.objects.create(
+            name='week mot', task_name='week task', start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 31), number_a_week=2)
+        # Tasks removed without Django are missing, as if they were never generated.
+        delete_tasks(DatedTask, DatedTask.objects.filter(
+            related_mot=mot, date__gte=date(2025, 1, 15)).values_list('id', flat=True))
+        delete_tasks(WeekTask, WeekTask.objects.filter(
+            related_mot=week_mot, week_number=3, occurrence=2).values_list('id', flat=True))
+        DatedTask.objects.get(related_mot=mot, date=date(2025, 1, 13)).delete()
+        WeekTask.objects.filter(related_mot=week_mot, week_number=2, occurrence=1).delete()
+        out = StringIO()
+        with mock.patch('task.expansion.publish') as publish:
+            call_command(
+                'generate_occurrences', start=date(2025, 1, 6), weeks=3, batch_size=1,
+                stdout=out)
+        self.assertIn('2 mots expanded, 4 tasks created.', out.getvalue())
+        self.assertEqual(
+            [(event['model'], event['week']) for call in publish.call_args_list
+             for event in call.args[0]],
+            [('datedtask', '2025-W03'), ('datedtask', '2025-W04'), ('weektask', '2025-W03')])
+        self.assertEqual(
+            sorted(DatedTask.objects.filter(
+                related_mot=mot, date__gte=date(2025, 1, 15)).values_list('date', 'label')),
+            [(date(2025, 1, 15), label.id), (date(2025, 1, 20), label.id),
+             (date(2025, 1, 22), label.id)])
+        self.assertFalse(DatedTask.objects.filter(
+            related_mot=mot, date=date(2025, 1, 13)).exists())
+        self.assertEqual(WeekTask.objects.filter(related_mot=week_mot, week_number=3).count(), 2)
+        self.assertEqual(WeekTask.objects.filter(related_mot=week_mot, week_number=2).count(), 1)
+        call_command('generate_occurrences', start=date(2025, 1, 6), weeks=3, stdout=out)
+        self.assertIn('2 mots expanded, 0 tasks created.', out.getvalue())
@@ -2,7 +2,7 @@ from datetime import date
 
 from django.test import TestCase
 
-from task.models import MultiOccurencesTask, DatedTask, WeekTask
+from task.models import MultiOccurencesTask, DatedTask, WeekTask, ConcurrentUpdateError
 
 
 class MultiOccurencesTaskTestCase(TestCase):
@@ -28,6 +28,29 @@ class MultiOccurencesTaskTestCase(TestCase):
         mot.delete()
         self.assertEqual(DatedTask.objects.count(), dated_count)
 
+    def test_mot_stale_save(self):
+        """
+        Make sure that saving a mot modified since it was read fails without modifying it
+        nor its related tasks.
+        """
+        mot = MultiOccurencesTask.objects.create(
+            name='mot', task_name='task', start_date=date(2024, 7, 1),
+            end_date=date(2024, 7, 31), every_week=[2])
+        stale_mot = MultiOccurencesTask.objects.get(id=mot.id)
+        mot.task_name = 'new task'
+        mot.save()
+        self.assertEqual(mot.version, 2)
+        stale_mot.task_name = 'stale task'
+        stale_mot.every_week = [3]
+        with self.assertRaises(ConcurrentUpdateError):
+            stale_mot.save()
+        mot.refresh_from_db()
+        self.assertEqual((mot.task_name, mot.version), ('new task', 2))
+        self.assertEqual(
+            set(DatedTask.objects.filter(related_mot=mot).values_list('name', flat=True)),
+            {'new task'})
+        self.assertFalse(DatedTask.objects.filter(related_mot=mot, date__week_day=4).exists())
+
     def test_mot_modifications_modifies_related_tasks_every_month(self):
         """
         Make sure that modifying a mot modifies related tasks.
@@ -0,0 +1,183 @@
+from datetime import date
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from task.deletion import delete_tasks
+from task.models import MultiOccurencesTask, DatedTask, WeekTask, Label
+from task.occurrences import (
+    available_backends, dated_occurrences, occurrence_cache, OccurrenceCache)
+
+def remove_tasks(model, **filters):
+    # Removed without Django, so that they are missing instead of deleted.
+    delete_tasks(model, list(model.objects.filter(**filters).values_list('id', flat=True)))
+
+
+RECURRENCES = [
+    {'every_week': [1, 3, 7]},
+    {'every_month': [1, 15, 28]},
+    {'every_last_day_of_month': True},
+    {'every_year': [{'day': 4, 'month': 5}, {'day': 11, 'month': 10}]},
+    {'number_a_day': 3},
+    {'number_a_week': 2},
+]
+
+
+class OccurrencesBackendTestCase(TestCase):
+
+    def related_rows(self, mot):
+        dated = sorted(
+            (task.name, task.date, task.occurrence, task.done,
+             tuple(sorted(l.id for l in task.label.all())))
+            for task in DatedTask.objects.filter(related_mot=mot).prefetch_related('label'))
+        week = sorted(
+            (task.name, task.year, task.week_number, task.occurrence, task.done,
+             tuple(sorted(l.id for l in task.label.all())))
+            for task in WeekTask.objects.filter(related_mot=mot).prefetch_related('label'))
+        return dated, week
+
+    def regenerate(self, mot, backend, **kwargs):
+        remove_tasks(DatedTask, related_mot=mot)
+        remove_tasks(WeekTask, related_mot=mot)
+        mot.create_related_tasks(backend=backend, **kwargs)
+        return self.related_rows(mot)
+
+    @skipUnless(connection.vendor == 'postgresql', 'The postgresql backend needs PostgreSQL.')
+    def test_backends_create_same_rows(self):
+        """
+        Make sure that python and postgresql backends create the same rows for every recurrence,
+        including labels of the mot.
+        """
+        labels = [Label.objects.create(name='lab'), Label.objects.create(name='lab2')]
+        for recurrence in RECURRENCES:
+            mot = MultiOccurencesTask.objects.create(
+                name='mot',
+                task_name='task',
+                # Starts in the middle of a week and spans a leap day and a new year.
+                start_date=date(2023, 12, 27),
+                end_date=date(2025, 3, 1),
+                **recurrence
+            )
+            mot.label.set(labels)
+            with self.subTest(recurrence=recurrence):
+                python_rows = self.regenerate(mot, 'python')
+                self.assertTrue(python_rows[0] or python_rows[1])
+                self.assertEqual(self.regenerate(mot, 'postgresql'), python_rows)
+                window = {'start_date': date(2024, 2, 10), 'end_date': date(2024, 11, 3)}
+                self.assertEqual(
+                    self.regenerate(mot, 'postgresql', **window),
+                    self.regenerate(mot, 'python', **window))
+
+    def test_backends_number_a_week_existing_tasks(self):
+        """
+        Make sure that both backends complete weeks that already have some tasks.
+        """
+        mot = MultiOccurencesTask.objects.create(
+            name='mot',
+            task_name='task',
+            start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 31),
+            number_a_week=3
+        )
+        for backend in available_backends():
+            with self.subTest(backend=backend):
+                remove_tasks(WeekTask, related_mot=mot)
+                WeekTask.objects.create(
+                    name='task', year=2025, week_number=2, related_mot=mot, occurrence=2)
+                mot.create_related_tasks(backend=backend)
+                self.assertEqual(
+                    WeekTask.objects.filter(related_mot=mot, week_number=2).count(), 3)
+                self.assertEqual(WeekTask.objects.filter(related_mot=mot).count(), 15)
+
+    def test_backends_are_idempotent(self):
+        """
+        Make sure that generating tasks again only creates missing occurrences, with the labels
+        of the mot, whatever the backend.
+        """
+        label = Label.objects.create(name='lab')
+        for recurrence in [{'number_a_day': 2}, {'number_a_week': 2}]:
+            mot = MultiOccurencesTask.objects.create(
+                name='mot', task_name='task', start_date=date(2025, 1, 1),
+                end_date=date(2025, 1, 31), **recurrence)
+            mot.label.set([label])
+            for backend in available_backends():
+                with self.subTest(recurrence=recurrence, backend=backend):
+                    rows = self.regenerate(mot, backend)
+                    remove_tasks(DatedTask, related_mot=mot, date=date(2025, 1, 6))
+                    remove_tasks(WeekTask, related_mot=mot, week_number=2)
+                    mot.create_related_tasks(backend=backend)
+                    mot.create_related_tasks(
+                        backend=backend, start_date=date(2025, 1, 6), end_date=date(2025, 1, 12))
+                    self.assertEqual(self.related_rows(mot), rows)
+
+    def test_backends_skip_retired_occurrences(self):
+        """
+        Make sure that deleted tasks of a mot are not generated again, whatever the backend.
+        """
+        for recurrence in [{'every_week': [1, 3]}, {'number_a_day': 2}, {'number_a_week': 2}]:
+            mot = MultiOccurencesTask.objects.create(
+                name='mot', task_name='task', start_date=date(2025, 1, 1),
+                end_date=date(2025, 1, 31), **recurrence)
+            for task in DatedTask.objects.filter(related_mot=mot, date=date(2025, 1, 6)):
+                task.delete()
+                break
+            WeekTask.objects.filter(related_mot=mot, week_number=2, occurrence=2).delete()
+            rows = self.related_rows(mot)
+            for backend in available_backends():
+                with self.subTest(recurrence=recurrence, backend=backend):
+                    mot.create_related_tasks(backend=backend)
+                    self.assertEqual(self.related_rows(mot), rows)
+
+
+class OccurrenceCacheTestCase(TestCase):
+
+    def setUp(self):
+        occurrence_cache.clear()
+
+    def test_lru_cache(self):
+        """
+        Make sure that the least recently used entries are evicted first and that hits and
+        misses are counted.
+        """
+        cache = OccurrenceCache(2)
+        self.assertEqual(cache.get('a', lambda: 1), 1)
+        self.assertEqual(cache.get('b', lambda: 2), 2)
+        self.assertEqual(cache.get('a', lambda: 3), 1)
+        cache.get('c', lambda: 4)
+        self.assertEqual(cache.get('b', lambda: 5), 5)
+        self.assertEqual(list(cache.entries), ['c', 'b'])
+        self.assertEqual(cache.metrics(), {'hits': 1, 'misses': 4, 'size': 2, 'maxsize': 2})
+
+    def test_shared_occurrences(self):
+        """
+        Make sure that mots with the same recurrence share cached occurrences, whatever the
+        order of their lists, and that the API exposes previews from the cache.
+        """
+        mot = MultiOccurencesTask.objects.create(
+            name='mot', task_name='task', start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 31), every_week=[1, 3])
+        other_mot = MultiOccurencesTask(
+            name='other', task_name='other', start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 31), every_week=[3, 1])
+        self.assertEqual(mot.recurrence_signature, other_mot.recurrence_signature)
+        other_mot.end_date = date(2025, 2, 1)
+        self.assertNotEqual(mot.recurrence_signature, other_mot.recurrence_signature)
+        window = (date(2025, 1, 6), date(2025, 1, 12))
+        occurrence_cache.clear()
+        occurrences = dated_occurrences(mot, *window)
+        self.assertEqual(occurrences, ((date(2025, 1, 6), 1), (date(2025, 1, 8), 1)))
+        other_mot.end_date = date(2025, 1, 31)
+        self.assertIs(dated_occurrences(other_mot, *window), occurrences)
+        response = self.client.get(
+            f'/multi_occurences_task/{mot.id}/preview/',
+            {'start_date': '2025-01-06', 'end_date': '2025-01-12'})
+        self.assertEqual(response.json(), {
+            'dated_task': [
+                {'date': '2025-01-06', 'occurrence': 1}, {'date': '2025-01-08', 'occurrence': 1}],
+            'week_task': []})
+        self.assertEqual(
+            occurrence_cache.metrics(), {'hits': 2, 'misses': 1, 'size': 1, 'maxsize': 256})
+        response = self.client.get(
+            f'/multi_occurences_task/{mot.id}/preview/', {'start_date': 'monday'})
+        self.assertEqual(response.status_code, 400)
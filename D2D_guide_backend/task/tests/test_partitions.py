@@ -0,0 +1,104 @@
+from datetime import date
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection, transaction, IntegrityError
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+
+from task.models import DatedTask, Label
+from task.partitions import (
+    partition_name, default_partition_name, partition_years, create_partition)
+from task.views import DatedTaskViewSet
+
+THIS_YEAR = date.today().year
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Dated tasks are only partitioned on PostgreSQL.')
+class DatedTaskPartitionTestCase(TestCase):
+
+    def setUp(self):
+        # Partitions of next years are not created by migrations.
+        call_command('manage_partitions', stdout=StringIO())
+
+    def partition_of(self, task):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT tableoid::regclass::text FROM task_datedtask WHERE id = %s', [task.id])
+            return cursor.fetchone()[0]
+
+    def scanned_partitions(self, queryset):
+        plan = queryset.explain()
+        return {
+            name for name in [default_partition_name()] + [
+                partition_name(year) for year in partition_years()]
+            if name in plan}
+
+    def test_tasks_are_written_in_their_year_partition(self):
+        """
+        Make sure that tasks go to the partition of their year, or to the default partition.
+        """
+        task = DatedTask.objects.create(name='task', date=date(THIS_YEAR, 6, 1))
+        far_task = DatedTask.objects.create(name='far task', date=date(THIS_YEAR + 10, 6, 1))
+        self.assertEqual(self.partition_of(task), partition_name(THIS_YEAR))
+        self.assertEqual(self.partition_of(far_task), default_partition_name())
+
+    def test_viewset_filters_prune_partitions(self):
+        """
+        Make sure that year and week filters of the dated task viewset only scan one partition.
+        """
+        for query in [{'year': THIS_YEAR}, {'year': THIS_YEAR, 'week': 10}]:
+            with self.subTest(query=query):
+                view = DatedTaskViewSet(
+                    request=APIRequestFactory().get('/datedtask/', query), format_kwarg=None)
+                view.request.query_params = view.request.GET
+                queryset = view.filter_queryset(view.get_queryset())
+                self.assertEqual(self.scanned_partitions(queryset), {partition_name(THIS_YEAR)})
+
+    def test_late_tasks_prune_future_partitions(self):
+        """
+        Make sure that late tasks query doesn't scan partitions of next years.
+        """
+        queryset = DatedTask.objects.filter(date__lt=date.today(), done=False)
+        scanned = self.scanned_partitions(queryset)
+        self.assertIn(partition_name(THIS_YEAR), scanned)
+        self.assertNotIn(partition_name(THIS_YEAR + 1), scanned)
+
+    def test_manage_partitions_moves_default_rows(self):
+        """
+        Make sure that creating a partition moves its rows out of the default partition,
+        and that detaching a partition removes its tasks and their labels.
+        """
+        label = Label.objects.create(name='lab')
+        far_task = DatedTask.objects.create(name='far task', date=date(THIS_YEAR + 4, 6, 1))
+        far_task.label.add(label)
+        create_partition(THIS_YEAR - 1)
+        old_task = DatedTask.objects.create(name='old task', date=date(THIS_YEAR - 1, 6, 1))
+        old_task.label.add(label)
+        call_command('manage_partitions', years_ahead=4, stdout=StringIO())
+        self.assertIn(THIS_YEAR + 4, partition_years())
+        self.assertEqual(self.partition_of(far_task), partition_name(THIS_YEAR + 4))
+        self.assertEqual(list(far_task.label.all()), [label])
+        call_command('manage_partitions', detach_before=THIS_YEAR, stdout=StringIO())
+        self.assertNotIn(THIS_YEAR - 1, partition_years())
+        self.assertFalse(DatedTask.objects.filter(id=old_task.id).exists())
+        self.assertFalse(DatedTask.label.through.objects.filter(datedtask=old_task.id).exists())
+
+    def test_labels_reference_tasks(self):
+        """
+        Make sure that labels of a dated task follow it to another partition, are deleted
+        with it and can't reference a missing task.
+        """
+        label = Label.objects.create(name='lab')
+        task = DatedTask.objects.create(name='task', date=date(THIS_YEAR, 6, 1))
+        task.label.add(label)
+        task.date = date(THIS_YEAR + 1, 6, 1)
+        task.save()
+        self.assertEqual(self.partition_of(task), partition_name(THIS_YEAR + 1))
+        self.assertEqual(list(task.label.all()), [label])
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM task_datedtask WHERE id = %s', [task.id])
+        self.assertFalse(DatedTask.label.through.objects.filter(datedtask=task.id).exists())
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DatedTask.label.through.objects.create(datedtask_id=task.id, label=label)
@@ -0,0 +1,71 @@
+import time
+
+from django.db import router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TransactionTestCase, override_settings
+
+from D2D_guide_backend.middleware import PrimaryPinningMiddleware, PIN_HEADER
+from D2D_guide_backend.routers import read_from_replicas
+from task.models import DatedTask
+
+
+@override_settings(REPLICA_DATABASES=['replica_1'], REPLICA_PIN_SECONDS=10)
+class ReplicaRouterTestCase(TransactionTestCase):
+
+    def read_database(self, request):
+        """
+        Return the database of reads of a request and its response.
+        """
+        databases = []
+
+        def get_response(request):
+            databases.extend(router.db_for_read(DatedTask) for _ in range(10))
+            return HttpResponse()
+
+        response = PrimaryPinningMiddleware(get_response)(request)
+        # Reads of a request go to a single database.
+        self.assertEqual(len(set(databases)), 1)
+        return databases[0], response
+
+    def test_router(self):
+        """
+        Make sure that reads go to replicas only where allowed and outside transactions, and
+        that writes always go to the default database.
+        """
+        self.assertEqual(router.db_for_read(DatedTask), 'default')
+        with read_from_replicas():
+            self.assertEqual(router.db_for_read(DatedTask), 'replica_1')
+            self.assertEqual(router.db_for_write(DatedTask), 'default')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(DatedTask), 'default')
+            with override_settings(REPLICA_DATABASES=[]):
+                self.assertEqual(router.db_for_read(DatedTask), 'default')
+        self.assertEqual(router.db_for_read(DatedTask), 'default')
+
+    def test_primary_pinning(self):
+        """
+        Make sure that safe requests read from a replica, unless the client sends the pin of
+        a recent write.
+        """
+        factory = RequestFactory()
+        database, response = self.read_database(factory.get('/dated_task/'))
+        self.assertEqual(database, 'replica_1')
+        self.assertFalse(response.has_header(PIN_HEADER))
+        database, response = self.read_database(factory.post('/dated_task/'))
+        self.assertEqual(database, 'default')
+        pin = response[PIN_HEADER]
+        self.assertAlmostEqual(int(pin), time.time() + 10, delta=2)
+        request = factory.get('/dated_task/', headers={PIN_HEADER: pin})
+        self.assertEqual(self.read_database(request)[0], 'default')
+        for expired in [str(int(time.time()) - 1), 'invalid']:
+            request = factory.get('/dated_task/', headers={PIN_HEADER: expired})
+            self.assertEqual(self.read_database(request)[0], 'replica_1')
+
+    def test_replica_per_request(self):
+        """
+        Make sure that a single replica is picked for the reads of a request.
+        """
+        factory = RequestFactory()
+        with override_settings(REPLICA_DATABASES=['replica_1', 'replica_2']):
+            databases = {self.read_database(factory.get('/dated_task/'))[0] for _ in range(30)}
+        self.assertEqual(databases, {'replica_1', 'replica_2'})
@@ -4,6 +4,8 @@ from django.test import TestCase
 from django.core.exceptions import ValidationError
 
 from task.models import WeekTask, MultiOccurencesTask, DatedTask, Label
+from task.occurrences import available_backends
+from task.tests.test_occurrences import remove_tasks
 
 class WeekTaskTestCase(TestCase):
 
@@ -457,3 +459,43 @@ class MultiOccurencesTaskTestCase(TestCase):
         self.assertEqual(task_1.label.count(), 0)
         task_2.refresh_from_db()
         self.assertEqual(task_2.label.count(), 0)
+
+
+class LabelIdsTestCase(TestCase):
+
+    def test_label_ids_follow_labels(self):
+        """
+        Make sure that label_ids stays in sync with labels, whichever side they are changed.
+        """
+        lab, lab2, lab3 = [Label.objects.create(name=f'lab{i}') for i in range(3)]
+        task = DatedTask.objects.create(name='task', date=date(2025, 1, 1))
+        other_task = DatedTask.objects.create(name='other', date=date(2025, 1, 2))
+        task.label.add(lab3, lab)
+        self.assertEqual(task.label_ids, [lab.id, lab3.id])
+        task.label.remove(lab3)
+        task.save()
+        self.assertEqual(DatedTask.objects.get(id=task.id).label_ids, [lab.id])
+        lab2.datedtask_set.add(task, other_task)
+        self.assertEqual(DatedTask.objects.get(id=task.id).label_ids, [lab.id, lab2.id])
+        lab2.datedtask_set.clear()
+        self.assertEqual(DatedTask.objects.get(id=other_task.id).label_ids, [])
+        lab.delete()
+        self.assertEqual(DatedTask.objects.get(id=task.id).label_ids, [])
+
+    def test_mot_tasks_label_ids(self):
+        """
+        Make sure that tasks generated by a mot get its label ids, with both backends.
+        """
+        lab, lab2 = Label.objects.create(name='lab'), Label.objects.create(name='lab2')
+        for backend in available_backends():
+            with self.subTest(backend=backend):
+                mot = MultiOccurencesTask.objects.create(
+                    name='mot', task_name='task', start_date=date(2025, 1, 1),
+                    end_date=date(2025, 1, 15), number_a_week=1)
+                mot.label.set([lab2, lab])
+                remove_tasks(WeekTask, related_mot=mot)
+                mot.create_related_tasks(backend=backend)
+                self.assertEqual(mot.label_ids, [lab.id, lab2.id])
+                self.assertEqual(
+                    {tuple(task.label_ids) for task in WeekTask.objects.filter(related_mot=mot)},
+                    {(lab.id, lab2.id)})
@@ -0,0 +1,93 @@
+import io
+from datetime import date
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from task.importer import TaskImporter
+from task.models import MultiOccurencesTask, DatedTask, WeekTask, Label, TaskStat
+from task.stats import rebuild_stats
+
+
+def stat_rows():
+    return sorted(TaskStat.objects.filter(total__gt=0).values_list(
+        'iso_year', 'iso_week', 'label_id', 'mot_id', 'total', 'done'))
+
+
+class TaskStatTestCase(TestCase):
+
+    def assertStatsRebuilt(self):
+        incremental = stat_rows()
+        rebuild_stats()
+        self.assertEqual(incremental, stat_rows())
+
+    def test_incremental_stats_match_rebuild(self):
+        """
+        Make sure that statistics updated by signals and bulk writes are the same as
+        statistics rebuilt from scratch.
+        """
+        labels = [Label.objects.create(name='lab'), Label.objects.create(name='lab2')]
+        task = DatedTask.objects.create(name='task', date=date(2025, 1, 6))
+        task.label.set(labels)
+        week_task = WeekTask.objects.create(name='week', year=2025, week_number=3)
+        week_task.label.add(labels[0])
+        self.assertStatsRebuilt()
+        task = DatedTask.objects.get(id=task.id)
+        task.done = True
+        task.date = date(2025, 2, 3)
+        task.save()
+        task.label.remove(labels[0], labels[0].id + 100)
+        week_task.done = True
+        week_task.save()
+        labels[1].datedtask_set.add(DatedTask.objects.create(name='other', date=date(2025, 1, 1)))
+        self.assertStatsRebuilt()
+        mot = MultiOccurencesTask.objects.create(
+            name='mot', task_name='mot task', start_date=date(2025, 1, 1),
+            end_date=date(2025, 2, 28), every_week=[1, 4])
+        mot.label.set(labels)
+        week_mot = MultiOccurencesTask.objects.create(
+            name='week mot', task_name='week mot task', start_date=date(2025, 1, 1),
+            end_date=date(2025, 2, 28), number_a_week=2)
+        DatedTask.objects.filter(related_mot=mot).first().label.clear()
+        self.assertStatsRebuilt()
+        mot.end_date = date(2025, 3, 31)
+        mot.start_date = date(2025, 1, 15)
+        mot.save()
+        week_mot.delete()
+        TaskImporter().load(io.StringIO(
+            '{"name": "imported", "date": "2025-01-02", "done": true, "label": ["lab", "new"]}\n'
+            '{"name": "imported week", "year": 2025, "week_number": 2, "label": ["lab2"]}\n'
+        ), 'ndjson')
+        self.assertStatsRebuilt()
+        labels[0].delete()
+        task.delete()
+        self.assertStatsRebuilt()
+
+    def test_stats_endpoint(self):
+        """
+        Make sure that stats endpoint returns completion per label, mot and week.
+        """
+        label = Label.objects.create(name='lab')
+        mot = MultiOccurencesTask.objects.create(
+            name='mot', task_name='mot task', start_date=date(2025, 1, 6),
+            end_date=date(2025, 1, 19), every_week=[1])
+        for task in DatedTask.objects.filter(related_mot=mot, date=date(2025, 1, 6)):
+            task.done = True
+            task.save()
+        task = DatedTask.objects.create(name='task', date=date(2025, 1, 7), done=True)
+        task.label.add(label)
+        client = APIClient()
+        with self.assertNumQueries(3):
+            response = client.get('/stats')
+        self.assertEqual(response.data['labels'], [
+            {'label_id': label.id, 'total': 1, 'done': 1, 'completion_rate': 1.0}])
+        self.assertEqual(response.data['mots'], [
+            {'mot_id': mot.id, 'total': 2, 'done': 1, 'completion_rate': 0.5}])
+        self.assertEqual(response.data['weeks'], [
+            {'iso_year': 2025, 'iso_week': 2, 'total': 2, 'done': 2, 'completion_rate': 1.0},
+            {'iso_year': 2025, 'iso_week': 3, 'total': 1, 'done': 0, 'completion_rate': 0.0}])
+        response = client.get('/stats', {'label': label.id, 'iso_week': 2})
+        self.assertEqual(response.data['weeks'], [
+            {'iso_year': 2025, 'iso_week': 2, 'total': 1, 'done': 1, 'completion_rate': 1.0}])
+        self.assertEqual(response.data['mots'], [])
+        self.assertEqual(client.get('/stats', {'mot': 'x'}).status_code, 400)
@@ -0,0 +1,152 @@
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from task.models import MultiOccurencesTask, DatedTask, WeekTask, Label, Tombstone
+from task.sync import (
+    get_changes, make_token, prune_tombstones, SYNC_OVERLAP, TOMBSTONE_RETENTION)
+
+
+class SyncTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.label = Label.objects.create(name='lab')
+        self.task = DatedTask.objects.create(name='task', date=date(2025, 1, 6))
+        self.week_task = WeekTask.objects.create(name='week', year=2025, week_number=2)
+
+    def sync_after(self, delay=SYNC_OVERLAP + timedelta(seconds=1)):
+        """
+        Return a token old enough for rows written before this call to be left out, as if
+        they were written before the previous sync.
+        """
+        DatedTask.objects.update(updated_at=timezone.now() - 2 * delay)
+        WeekTask.objects.update(updated_at=timezone.now() - 2 * delay)
+        MultiOccurencesTask.objects.update(updated_at=timezone.now() - 2 * delay)
+        Label.objects.update(updated_at=timezone.now() - 2 * delay)
+        Tombstone.objects.update(deleted_at=timezone.now() - 2 * delay)
+        return make_token(timezone.now() - delay + SYNC_OVERLAP)
+
+    def test_full_sync(self):
+        """
+        Make sure that every row is returned without token, with a token for the next sync.
+        """
+        response = self.client.get('/sync')
+        self.assertTrue(response.data['full'])
+        self.assertEqual([task['id'] for task in response.data['dated_task']], [self.task.id])
+        self.assertEqual(
+            [task['id'] for task in response.data['week_task']], [self.week_task.id])
+        self.assertEqual(response.data['label'], [{'name': 'lab', 'id': self.label.id}])
+        self.assertTrue(response.data['token'])
+        self.assertFalse(response.data['more'])
+
+    def test_delta_sync(self):
+        """
+        Make sure that only rows created, updated or deleted after a token are returned.
+        """
+        token = self.sync_after()
+        self.task.done = True
+        self.task.save()
+        new_label = Label.objects.create(name='new')
+        week_task_id = self.week_task.id
+        self.week_task.delete()
+        response = self.client.get('/sync', {'since': token})
+        self.assertFalse(response.data['full'])
+        self.assertEqual([task['id'] for task in response.data['dated_task']], [self.task.id])
+        self.assertEqual(response.data['week_task'], [])
+        self.assertEqual([label['id'] for label in response.data['label']], [new_label.id])
+        self.assertEqual(response.data['deleted']['week_task'], [week_task_id])
+        self.assertEqual(response.data['deleted']['dated_task'], [])
+        # Sparse fieldsets apply to synced rows.
+        response = self.client.get('/sync', {'since': token, 'fields': 'id,done'})
+        self.assertEqual(response.data['dated_task'], [{'id': self.task.id, 'done': True}])
+
+    def read_pages(self, token=None):
+        """
+        Return (changes of every page, number of pages, token of the last page).
+        """
+        rows, pages = {'dated_task': [], 'week_task': [], 'deleted': []}, 0
+        while True:
+            changes = get_changes(token, {}, page_size=2)
+            pages += 1
+            rows['dated_task'] += [task['id'] for task in changes['dated_task']]
+            rows['week_task'] += [task['id'] for task in changes['week_task']]
+            rows['deleted'] += changes['deleted']['dated_task']
+            token = changes['token']
+            if not changes['more']:
+                return rows, pages, token
+
+    def test_paged_sync(self):
+        """
+        Make sure that full and delta syncs are read by pages, each row once, the token of
+        the last page being the one of the next sync.
+        """
+        tasks = [self.task] + [
+            DatedTask.objects.create(name=f'task {day}', date=date(2025, 1, day))
+            for day in range(7, 11)]
+        rows, pages, token = self.read_pages()
+        self.assertEqual(rows['dated_task'], [task.id for task in tasks])
+        self.assertEqual(rows['week_task'], [self.week_task.id])
+        self.assertEqual(pages, 4)
+        self.assertFalse(get_changes(token, {})['full'])
+        token = self.sync_after()
+        deleted_ids = [task.id for task in tasks[3:]]
+        for task in tasks[:3]:
+            task.save()
+        for task in tasks[3:]:
+            task.delete()
+        rows, pages, token = self.read_pages(token)
+        self.assertEqual(rows['dated_task'], [task.id for task in tasks[:3]])
+        self.assertEqual(rows['deleted'], deleted_ids)
+        self.assertEqual(pages, 3)
+        self.assertNotIn('.', token)
+
+    def test_bulk_writes_are_synced(self):
+        """
+        Make sure that rows written by mot propagation and label changes are synced.
+        """
+        mot = MultiOccurencesTask.objects.create(
+            name='mot', task_name='mot task', start_date=date(2025, 1, 6),
+            end_date=date(2025, 1, 19), every_week=[1])
+        mot_tasks = set(DatedTask.objects.filter(related_mot=mot).values_list('id', flat=True))
+        token = self.sync_after()
+        mot.label.set([self.label])
+        response = self.client.get('/sync', {'since': token})
+        self.assertEqual({task['id'] for task in response.data['dated_task']}, mot_tasks)
+        self.assertEqual(
+            [mot_data['id'] for mot_data in response.data['multi_occurences_task']], [mot.id])
+        token = self.sync_after()
+        label_id = self.label.id
+        self.label.delete()
+        response = self.client.get('/sync', {'since': token})
+        self.assertEqual({task['id'] for task in response.data['dated_task']}, mot_tasks)
+        self.assertEqual(response.data['deleted']['label'], [label_id])
+
+    def test_archived_tasks_are_deleted(self):
+        """
+        Make sure that tasks deleted by archival leave tombstones.
+        """
+        self.task.done = True
+        self.task.save()
+        token = self.sync_after()
+        call_command('archive_tasks', today=date(2026, 3, 1), stdout=StringIO())
+        response = self.client.get('/sync', {'since': token})
+        self.assertEqual(response.data['deleted']['dated_task'], [self.task.id])
+
+    def test_old_or_invalid_token(self):
+        """
+        Make sure that a token older than tombstones retention triggers a full sync, and that
+        an invalid token is rejected.
+        """
+        self.week_task.delete()
+        old_token = make_token(timezone.now() - TOMBSTONE_RETENTION - timedelta(days=1))
+        response = self.client.get('/sync', {'since': old_token})
+        self.assertTrue(response.data['full'])
+        self.assertEqual(len(response.data['dated_task']), 1)
+        for token in ['yesterday', '1.2', '0']:
+            self.assertEqual(self.client.get('/sync', {'since': token}).status_code, 400)
+        self.assertEqual(prune_tombstones(timezone.now() + TOMBSTONE_RETENTION), 1)
@@ -0,0 +1,565 @@
+import csv
+import json
+from datetime import date
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.db.models.signals import post_init
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from D2D_guide_backend.renderers import ORJSONRenderer
+from task import export
+from task.models import MultiOccurencesTask, DatedTask, WeekTask, Label, TaskStat
+from task.stats import rebuild_stats
+from task.views import search_names, DatedTaskFilter
+
+
+class ExportTestCase(TestCase):
+
+    def setUp(self):
+        self.lab = Label.objects.create(name='lab')
+        self.lab2 = Label.objects.create(name='lab2')
+        for day in range(1, 6):
+            task = DatedTask.objects.create(name=f'task_{day}', date=date(2025, 1, day))
+            if day % 2:
+                task.label.add(self.lab, self.lab2)
+        WeekTask.objects.create(name='week_task', week_number=2, year=2025)
+        MultiOccurencesTask.objects.create(
+            name='mot',
+            task_name='task',
+            start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 31),
+            every_week=[1, 3]
+        )
+
+    def test_export_ndjson(self):
+        """
+        Make sure that every row is exported with its labels.
+        """
+        response = self.client.get('/export', {'model': 'dated_task', 'format': 'ndjson'})
+        rows = [
+            json.loads(line) for line in
+            b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(len(rows), DatedTask.objects.count())
+        self.assertEqual([row['id'] for row in rows], sorted(row['id'] for row in rows))
+        first = next(row for row in rows if row['name'] == 'task_1')
+        self.assertEqual(sorted(first['label']), ['lab', 'lab2'])
+        self.assertEqual(first['date'], '2025-01-01')
+        second = next(row for row in rows if row['name'] == 'task_2')
+        self.assertEqual(second['label'], [])
+
+    def test_export_chunks(self):
+        """
+        Make sure that labels are resolved whatever the chunk size.
+        """
+        model, fields = export.EXPORTS['dated_task']
+        expected = list(export.export_rows(model, fields))
+        for chunk_size in [1, 2, 100]:
+            self.assertEqual(list(export.export_rows(model, fields, chunk_size)), expected)
+
+    def test_export_csv(self):
+        """
+        Make sure that csv export writes a header and one line per row.
+        """
+        response = self.client.get('/export', {'model': 'multi_occurences_task'})
+        lines = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(lines[0][:3], ['id', 'name', 'task_name'])
+        self.assertEqual(len(lines), 2)
+        row = dict(zip(lines[0], lines[1]))
+        self.assertEqual(json.loads(row['every_week']), [1, 3])
+        response = self.client.get('/export', {'model': 'week_task'})
+        lines = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(len(lines), 2)
+
+    def test_export_bad_request(self):
+        self.assertEqual(self.client.get('/export', {'model': 'user'}).status_code, 400)
+        self.assertEqual(self.client.get('/export', {'format': 'xml'}).status_code, 400)
+
+
+class CalendarFeedTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.lab = Label.objects.create(name='lab, with comma')
+        self.mot = MultiOccurencesTask.objects.create(
+            name='mot',
+            task_name='gym',
+            start_date=date(2025, 1, 1),
+            end_date=date(2025, 3, 31),
+            every_week=[2, 5]
+        )
+        self.mot.label.add(self.lab)
+        self.yearly = MultiOccurencesTask.objects.create(
+            name='yearly',
+            task_name='birthday',
+            start_date=date(2025, 1, 1),
+            end_date=date(2027, 12, 31),
+            every_year=[{'day': 4, 'month': 5}, {'day': 11, 'month': 10}]
+        )
+        self.weekly = MultiOccurencesTask.objects.create(
+            name='weekly',
+            task_name='run',
+            start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 31),
+            number_a_week=2
+        )
+        DatedTask.objects.create(name='dentist', date=date(2025, 2, 3), done=True)
+
+    def get_feed(self, **headers):
+        return self.client.get('/calendar.ics', **headers)
+
+    def test_feed_content(self):
+        """
+        Make sure that mots are written as rules and done occurrences as overrides.
+        """
+        task = DatedTask.objects.get(related_mot=self.mot, date=date(2025, 1, 3))
+        task.done = True
+        task.save()
+        week_task = WeekTask.objects.filter(related_mot=self.weekly, week_number=2).first()
+        week_task.done = True
+        week_task.save()
+        response = self.get_feed()
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = response.content.decode()
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        # Feed size depends on the number of mots, not on the number of occurrences.
+        self.assertEqual(body.count('BEGIN:VTODO'), 7)
+        self.assertIn(
+            f'UID:mot-{self.mot.id}@d2dguide\r\n', body)
+        self.assertIn('RRULE:FREQ=WEEKLY;BYDAY=TU,FR;UNTIL=20250331\r\n', body)
+        self.assertIn('DTSTART;VALUE=DATE:20250103\r\n', body)
+        self.assertIn('CATEGORIES:lab\\, with comma\r\n', body)
+        self.assertIn('RECURRENCE-ID;VALUE=DATE:20250103\r\nSTATUS:COMPLETED', body)
+        self.assertIn('RRULE:FREQ=YEARLY;BYMONTH=5;BYMONTHDAY=4;UNTIL=20271231', body)
+        self.assertIn('RRULE:FREQ=YEARLY;BYMONTH=10;BYMONTHDAY=11;UNTIL=20271231', body)
+        # Half of the second week tasks of the weekly mot are done.
+        self.assertIn(
+            'RECURRENCE-ID;VALUE=DATE:20250108\r\nSTATUS:IN-PROCESS\r\nPERCENT-COMPLETE:50',
+            body)
+        self.assertIn('SUMMARY:dentist\r\nSTATUS:COMPLETED', body)
+
+    def test_feed_etag(self):
+        """
+        Make sure that feed is served with an etag that changes with data.
+        """
+        response = self.get_feed()
+        etag = response['ETag']
+        self.assertEqual(self.get_feed(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            DatedTask.objects.create(name='new', date=date(2025, 2, 4))
+            # The feed is invalidated once the change is committed.
+            self.assertEqual(self.get_feed(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.get_feed(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class ImportTestCase(TestCase):
+
+    def post(self, content, **params):
+        query = '&'.join(f'{key}={value}' for key, value in params.items())
+        return self.client.post(
+            f'/import?{query}', content, content_type='application/octet-stream')
+
+    def test_import_csv(self):
+        """
+        Make sure that tasks are created with their labels, missing labels being created.
+        """
+        existing = Label.objects.create(name='home')
+        content = (
+            'name,done,date,year,week_number,label\n'
+            'dentist,true,2025-02-03,,,home|health\n'
+            'groceries,false,2025-02-04,,,\n'
+            'plan holidays,,,2025,6,home\n'
+        )
+        response = self.post(content.encode(), format='csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'label': 1, 'dated_task': 2, 'week_task': 1})
+        dentist = DatedTask.objects.get(name='dentist')
+        self.assertTrue(dentist.done)
+        self.assertEqual(dentist.date, date(2025, 2, 3))
+        self.assertEqual(
+            sorted(dentist.label.values_list('name', flat=True)), ['health', 'home'])
+        self.assertFalse(DatedTask.objects.get(name='groceries').label.exists())
+        week_task = WeekTask.objects.get(name='plan holidays')
+        self.assertEqual((week_task.year, week_task.week_number), (2025, 6))
+        self.assertEqual(list(week_task.label.all()), [existing])
+        # Ids reserved by import are not reused.
+        task = DatedTask.objects.create(name='after', date=date(2025, 2, 5))
+        self.assertGreater(task.id, dentist.id)
+
+    def test_import_ndjson_errors(self):
+        """
+        Make sure that nothing is imported if a row is invalid, and that every error is reported.
+        """
+        content = '\n'.join([
+            json.dumps({'name': 'valid', 'date': '2025-02-03', 'label': ['new']}),
+            json.dumps({'name': 'bad date', 'date': '2025-02-30'}),
+            'not json',
+            json.dumps({'name': '', 'year': 2025, 'week_number': 54, 'done': 'maybe'}),
+        ])
+        response = self.post(content.encode(), format='ndjson')
+        self.assertEqual(response.status_code, 400)
+        report = response.json()
+        self.assertEqual(report['error_count'], 3)
+        self.assertEqual([error['line'] for error in report['errors']], [2, 3, 4])
+        self.assertEqual(len(report['errors'][2]['errors']), 3)
+        self.assertFalse(DatedTask.objects.exists())
+        self.assertFalse(Label.objects.exists())
+
+    def test_import_labels(self):
+        Label.objects.create(name='home')
+        response = self.post(
+            b'{"name": "home"}\n{"name": "work"}\n', format='ndjson', model='label')
+        self.assertEqual(response.json()['label'], 1)
+        self.assertEqual(sorted(Label.objects.values_list('name', flat=True)), ['home', 'work'])
+
+    def test_export_import_round_trip(self):
+        """
+        Make sure that an export can be imported back.
+        """
+        lab = Label.objects.create(name='lab')
+        task = DatedTask.objects.create(name='task', date=date(2025, 1, 1), done=True)
+        task.label.add(lab)
+        WeekTask.objects.create(name='week_task', week_number=2, year=2025)
+        for model in ['dated_task', 'week_task']:
+            exported = b''.join(self.client.get(
+                '/export', {'model': model, 'format': 'ndjson'}).streaming_content)
+            self.assertEqual(self.post(exported, format='ndjson').status_code, 201)
+        self.assertEqual(DatedTask.objects.filter(name='task', done=True, label=lab).count(), 2)
+        self.assertEqual(WeekTask.objects.filter(name='week_task').count(), 2)
+        self.assertEqual(Label.objects.count(), 1)
+
+
+class SearchTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        for name, day in [('Buy groceries', 6), ('groceries list', 13), ('Call plumber', 6)]:
+            DatedTask.objects.create(name=name, date=date(2025, 1, day))
+        WeekTask.objects.create(name='Plumbing week', year=2025, week_number=2)
+        MultiOccurencesTask.objects.create(
+            name='house', task_name='Water plants', start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 10), every_week=[1])
+
+    def names(self, url, params):
+        return sorted(task['name'] for task in self.client.get(url, params).data['results'])
+
+    def test_search(self):
+        """
+        Make sure that search matches substrings case insensitively, similar names, and
+        combines with other filters.
+        """
+        self.assertEqual(
+            self.names('/dated_task/', {'search': 'GROCER'}), ['Buy groceries', 'groceries list'])
+        self.assertEqual(
+            self.names('/dated_task/', {'search': 'grocer', 'week': 2}), ['Buy groceries'])
+        self.assertEqual(self.names('/week_task/', {'search': 'plumb'}), ['Plumbing week'])
+        self.assertEqual(self.names('/multi_occurences_task/', {'search': 'plants'}), ['house'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Trigram similarity needs PostgreSQL.')
+    def test_search_similar_names(self):
+        """
+        Make sure that search matches names with typos, by trigram similarity.
+        """
+        self.assertEqual(self.names('/dated_task/', {'search': 'plumbr'}), ['Call plumber'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Trigram indexes need PostgreSQL.')
+    def test_search_uses_trigram_index(self):
+        """
+        Make sure that search conditions can be served by the trigram indexes.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        for model, fields, index in [
+                (WeekTask, ['name'], 'weektask_name_trgm'),
+                (MultiOccurencesTask, ['name', 'task_name'], 'mot_task_name_trgm'),
+                # Indexes of partitions are named after the partition.
+                (DatedTask, ['name'], 'task_datedtask_default_upper_idx')]:
+            with self.subTest(model=model):
+                self.assertIn(index, search_names(model.objects.all(), fields, 'plumb').explain())
+
+
+class LabelFilterTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.lab, self.lab2, self.lab3 = [Label.objects.create(name=f'lab{i}') for i in range(3)]
+        for name, labels in [
+                ('none', []), ('one', [self.lab]), ('two', [self.lab2]),
+                ('one two', [self.lab, self.lab2])]:
+            DatedTask.objects.create(name=name, date=date(2025, 1, 6)).label.set(labels)
+            WeekTask.objects.create(name=name, year=2025, week_number=2).label.set(labels)
+
+    def names(self, url, params):
+        return sorted(task['name'] for task in self.client.get(url, params).data['results'])
+
+    def test_label_filters(self):
+        """
+        Make sure that label filters return each matching task once, without joining labels.
+        """
+        ids = f'{self.lab.id},{self.lab2.id}'
+        for url in ['/dated_task/', '/week_task/']:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.names(url, {'labels_any': ids}), ['one', 'one two', 'two'])
+                self.assertEqual(self.names(url, {'labels_all': ids}), ['one two'])
+                self.assertEqual(self.names(url, {'label': self.lab.id}), ['one', 'one two'])
+                self.assertEqual(self.names(url, {'labels_any': self.lab3.id}), [])
+                for params in [
+                        {'label': '1.7'}, {'labels_all': f'{self.lab.id},1.7'},
+                        {'labels_any': 'lab'}]:
+                    self.assertEqual(self.client.get(url, params).status_code, 400)
+        view_filter = DatedTaskFilter({'labels_any': ids}, queryset=DatedTask.objects.all())
+        self.assertNotIn('task_datedtask_label', str(view_filter.qs.query))
+
+
+class JSONAndSparseFieldsTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.lab = Label.objects.create(name='lab')
+        for i in range(3):
+            MultiOccurencesTask.objects.create(
+                name=f'mot {i}', task_name='task', start_date=date(2025, 1, 1),
+                end_date=date(2025, 1, 31), every_week=[1])
+
+    def test_orjson_renderer_and_parser(self):
+        """
+        Make sure that json is rendered and parsed with orjson, including types orjson
+        doesn't handle natively, and that invalid json is refused.
+        """
+        self.assertEqual(
+            ORJSONRenderer().render({'date': date(2025, 1, 6), 'value': Decimal('1.5')}),
+            b'{"date":"2025-01-06","value":1.5}')
+        response = self.client.post(
+            '/dated_task/',
+            json.dumps({
+                'name': 'task', 'date': '2025-01-06',
+                'label': [{'name': 'lab', 'id': self.lab.id}]}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            json.loads(response.content)['label'], [{'name': 'lab', 'id': self.lab.id}])
+        response = self.client.post(
+            '/dated_task/', '{"name": "task",', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_sparse_fieldsets(self):
+        """
+        Make sure that only requested fields are rendered and that others are not computed.
+        """
+        # Count and list queries only, mot counters are not computed.
+        with self.assertNumQueries(2):
+            response = self.client.get('/multi_occurences_task/', {'fields': 'id,name'})
+        self.assertEqual(
+            [set(mot) for mot in response.data['results']], [{'id', 'name'}] * 3)
+        response = self.client.get(
+            '/dated_task/', {'fields': 'id,date,done', 'include_archived': 'true'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'date', 'done'})
+        self.assertIn('related_tasks_count', self.client.get('/multi_occurences_task/').data[
+            'results'][0])
+
+
+class NormalizedLabelsTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.labels = [Label.objects.create(name='lab'), Label.objects.create(name='lab2')]
+        for i in range(3):
+            mot = MultiOccurencesTask.objects.create(
+                name=f'mot {i}', task_name='task', start_date=date(2025, 1, 1),
+                end_date=date(2025, 1, 31), every_week=[1])
+            mot.label.set(self.labels[:i + 1] if i < 2 else [self.labels[0]])
+
+    def test_normalized_labels(self):
+        """
+        Make sure that normalized rows hold label ids and the response a single labels
+        dictionary, read with one query whatever the number of rows.
+        """
+        labels = {
+            str(label.id): {'name': label.name, 'id': label.id} for label in self.labels}
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                '/dated_task/', {'normalize': 'true', 'fields': 'id,label'})
+        self.assertEqual(response.data['labels'], labels)
+        self.assertEqual(len(response.data['results']), 12)
+        self.assertTrue(all(
+            isinstance(label_id, int)
+            for row in response.data['results'] for label_id in row['label']))
+        response = self.client.get('/multi_occurences_task/', {'normalize': '1'})
+        self.assertEqual(
+            [mot['label'] for mot in response.data['results']],
+            [[self.labels[0].id], [label.id for label in self.labels], [self.labels[0].id]])
+        self.assertEqual(response.data['labels'], labels)
+        response = self.client.get(
+            '/dated_task/', {'normalize': 'true', 'include_archived': 'true'})
+        self.assertEqual(response.data['labels'], labels)
+        self.assertEqual(response.data['results'][0]['label'], [self.labels[0].id])
+        self.assertNotIn('labels', self.client.get('/dated_task/').data)
+        task = DatedTask.objects.filter(label=self.labels[0]).first()
+        response = self.client.get(f'/dated_task/{task.id}/', {'normalize': 'true'})
+        self.assertEqual(response.data['label'], [{'name': 'lab', 'id': self.labels[0].id}])
+        response = self.client.get('/sync', {'normalize': 'true'})
+        self.assertIn(
+            {'name': 'lab', 'id': self.labels[0].id}, response.data['dated_task'][0]['label'])
+
+
+class LabelWriteTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.labels = [Label.objects.create(name=f'lab{i}') for i in range(3)]
+        self.task = DatedTask.objects.create(name='task', date=date(2025, 1, 6))
+        self.task.label.set(self.labels[:2])
+
+    def put(self, label_ids):
+        return self.client.put(f'/dated_task/{self.task.id}/', {
+            'name': 'task', 'date': '2025-01-06',
+            'label': [{'name': 'lab', 'id': label_id} for label_id in label_ids]},
+            format='json')
+
+    def through_writes(self, queries):
+        table = DatedTask.label.through._meta.db_table
+        return [
+            query['sql'] for query in queries
+            if table in query['sql'] and query['sql'].startswith(('INSERT', 'DELETE'))]
+
+    def test_label_diff(self):
+        """
+        Make sure that only label changes are written, as one insert and one delete.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.put([label.id for label in self.labels[:2]]).status_code, 200)
+        self.assertEqual(self.through_writes(queries), [])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.put([self.labels[1].id, self.labels[2].id]).status_code, 200)
+        self.assertEqual(len(self.through_writes(queries)), 2)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.label_ids, [self.labels[1].id, self.labels[2].id])
+
+    def test_unknown_labels(self):
+        """
+        Make sure that unknown label ids are refused and nothing is written.
+        """
+        response = self.put([self.labels[0].id, 0, -1])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['label'], ['Unknown label ids: -1, 0'])
+        self.assertEqual(
+            set(self.task.label.values_list('id', flat=True)),
+            {label.id for label in self.labels[:2]})
+
+    def test_mot_update_without_labels(self):
+        """
+        Make sure that mot labels are kept by updates without label.
+        """
+        mot = MultiOccurencesTask.objects.create(
+            name='mot', task_name='task', start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 31), every_week=[1])
+        mot.label.set([self.labels[0]])
+        response = self.client.patch(
+            f'/multi_occurences_task/{mot.id}/', {'name': 'new'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(mot.label.values_list('id', flat=True)), [self.labels[0].id])
+
+    def test_mot_labels_reach_tasks(self):
+        """
+        Make sure that the labels of a mot created through the api are given to its dated
+        and week tasks, with their label ids and stats.
+        """
+        label_ids = [label.id for label in self.labels[:2]]
+        for recurrence in [{'every_week': [1]}, {'number_a_week': 1}]:
+            response = self.client.post('/multi_occurences_task/', {
+                'name': 'mot', 'task_name': 'task', 'start_date': '2025-01-01',
+                'end_date': '2025-01-31', **recurrence,
+                'label': [{'name': 'lab', 'id': label_id} for label_id in label_ids]},
+                format='json')
+            self.assertEqual(response.status_code, 201)
+            tasks = [
+                *DatedTask.objects.filter(related_mot=response.data['id']),
+                *WeekTask.objects.filter(related_mot=response.data['id'])]
+            self.assertTrue(tasks)
+            for task in tasks:
+                self.assertEqual(task.label_ids, label_ids)
+                self.assertEqual(sorted(task.label.values_list('id', flat=True)), label_ids)
+        stats = sorted(TaskStat.objects.filter(total__gt=0).values_list(
+            'iso_year', 'iso_week', 'label_id', 'mot_id', 'total', 'done'))
+        rebuild_stats()
+        self.assertEqual(stats, sorted(TaskStat.objects.filter(total__gt=0).values_list(
+            'iso_year', 'iso_week', 'label_id', 'mot_id', 'total', 'done')))
+
+
+class OptimisticConcurrencyTestCase(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.mot = MultiOccurencesTask.objects.create(
+            name='mot', task_name='task', start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 31), every_week=[1])
+        self.url = f'/multi_occurences_task/{self.mot.id}/'
+
+    def concurrent_update(self, count):
+        """
+        Update the mot behind the back of the next count instances read.
+        Updates are rolled back with the failed attempt, as they run in its transaction.
+        """
+        updates = []
+
+        def update(sender, instance, **kwargs):
+            if len(updates) < count:
+                updates.append(instance)
+                MultiOccurencesTask.objects.filter(id=instance.id).update(version=F('version') + 1)
+
+        post_init.connect(update, sender=MultiOccurencesTask, weak=False)
+        self.addCleanup(post_init.disconnect, update, sender=MultiOccurencesTask)
+
+    def test_if_match(self):
+        """
+        Make sure that versions are given as etags and that writes with an outdated If-Match
+        header are refused.
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response['ETag'], '"1"')
+        self.assertEqual(response.data['version'], 1)
+        response = self.client.patch(
+            self.url, {'task_name': 'new', 'version': 5}, format='json',
+            HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"2"')
+        response = self.client.patch(
+            self.url, {'task_name': 'stale'}, format='json', HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(self.client.delete(self.url, HTTP_IF_MATCH='"1"').status_code, 412)
+        self.mot.refresh_from_db()
+        self.assertEqual((self.mot.task_name, self.mot.version), ('new', 2))
+        self.assertEqual(self.client.delete(self.url, HTTP_IF_MATCH='"2"').status_code, 204)
+
+    def test_concurrent_updates(self):
+        """
+        Make sure that updates racing with another one are applied again on the latest
+        version without If-Match header, and refused with one.
+        """
+        self.concurrent_update(1)
+        response = self.client.patch(self.url, {'task_name': 'new'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], '"2"')
+        self.assertEqual(
+            set(DatedTask.objects.filter(related_mot=self.mot).values_list('name', flat=True)),
+            {'new'})
+        self.concurrent_update(1)
+        response = self.client.patch(
+            self.url, {'task_name': 'other'}, format='json', HTTP_IF_MATCH='"2"')
+        self.assertEqual(response.status_code, 412)
+        self.concurrent_update(10)
+        response = self.client.patch(
+            self.url, {'task_name': 'other'}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.mot.refresh_from_db()
+        self.assertEqual(self.mot.task_name, 'new')
@@ -1,16 +1,40 @@
+import io
 from datetime import date
 
+from django import forms
 from django.shortcuts import render
+from django.db import connection, transaction
 from django.db.models import Q
+from django.db.models.functions import Upper
+from django.http import (
+    HttpResponse, StreamingHttpResponse, HttpResponseBadRequest, JsonResponse)
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST, condition
 from rest_framework import viewsets
-from rest_framework.decorators import api_view
+from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
 from django_filters import rest_framework as filters
 
-from task.models import DatedTask, WeekTask, MultiOccurencesTask, Label
+from task.models import (
+    DatedTask, WeekTask, MultiOccurencesTask, Label, ArchivedDatedTask, ArchivedWeekTask)
+from task.archive import include_archived, with_archived, archived_rows
+from task.deletion import delete_mot_tasks
+from task.density import GROUP_BY, get_density
+from task.events import events_enabled, event_filters, server_sent_events
+from task.export import EXPORTS, stream_csv, stream_ndjson
+from task.ical import get_feed
+from task.occurrences import dated_occurrences, week_occurrences
+from task.stats import get_stats
+from task.sync import get_changes, InvalidTokenError
+from task.importer import TaskImporter, InvalidImportError, IMPORT_FORMATS, IMPORT_MODELS
 from task.serializers import (
     DatedTaskSerializer, WeekTaskSerializer, MultiOccurencesTaskSerializer, LabelSerializer)
+from D2D_guide_backend.mixins.normalized_labels_mixin import (
+    NormalizedLabelsMixin, normalized_labels)
+from D2D_guide_backend.mixins.optimistic_concurrency_mixin import (
+    OptimisticConcurrencyMixin, PreconditionFailed)
 from D2D_guide_backend.mixins.partial_update_mixin import PartialUpdateMixin
+from D2D_guide_backend.mixins.sparse_fieldset_mixin import requested_fields
 
 
 class LabelViewSet(viewsets.ModelViewSet):
@@ -21,7 +45,59 @@ class LabelViewSet(viewsets.ModelViewSet):
     serializer_class = LabelSerializer
 
 
-class DatedTaskFilter(filters.FilterSet):
+def search_names(queryset, fields, value):
+    """
+    Filter names containing value (case insensitive) or similar to it (trigram similarity).
+    Both conditions compare UPPER(field), which is indexed with gin_trgm_ops.
+    """
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__icontains': value})
+        if connection.vendor == 'postgresql':
+            queryset = queryset.alias(**{f'upper_{field}': Upper(field)})
+            condition |= Q(**{f'upper_{field}__trigram_similar': value})
+    return queryset.filter(condition)
+
+
+class NameSearchFilterSet(filters.FilterSet):
+    """
+    Add a search filter on search_fields, see search_names.
+    """
+    search = filters.CharFilter(method='filter_search')
+    search_fields = ['name']
+
+    def filter_search(self, queryset, name, value):
+        return search_names(queryset, self.search_fields, value)
+
+
+class IntegerFilter(filters.NumberFilter):
+    # NumberFilter accepts decimals, ids that are not integers are refused with 400.
+    field_class = forms.IntegerField
+
+
+class IntegerInFilter(filters.BaseInFilter, IntegerFilter):
+    pass
+
+
+class LabelFilterSet(filters.FilterSet):
+    """
+    Label filters served by the GIN index of label_ids, without joining labels.
+    label and labels_all return tasks having every given label, labels_any tasks having at
+    least one of them. Lists are comma separated label ids.
+    """
+    label = IntegerFilter(method='filter_labels_all')
+    labels_all = IntegerInFilter(method='filter_labels_all')
+    labels_any = IntegerInFilter(method='filter_labels_any')
+
+    def filter_labels_all(self, queryset, name, value):
+        label_ids = value if isinstance(value, list) else [value]
+        return queryset.filter(label_ids__contains=label_ids)
+
+    def filter_labels_any(self, queryset, name, value):
+        return queryset.filter(label_ids__overlap=value)
+
+
+class DatedTaskFilter(NameSearchFilterSet, LabelFilterSet):
     week = filters.NumberFilter(field_name="date__week")
     year = filters.NumberFilter(field_name="date__year")
 
@@ -30,7 +106,73 @@ class DatedTaskFilter(filters.FilterSet):
         fields = ['name', 'date', 'done', 'week', 'year', 'label']
 
 
-class DatedTaskViewSet(viewsets.ModelViewSet):
+class WeekTaskFilter(NameSearchFilterSet, LabelFilterSet):
+
+    class Meta:
+        model = WeekTask
+        fields = ['week_number', 'year', 'label']
+
+
+class MultiOccurencesTaskFilter(NameSearchFilterSet, LabelFilterSet):
+    search_fields = ['name', 'task_name']
+
+    class Meta:
+        model = MultiOccurencesTask
+        fields = ['name', 'task_name', 'done', 'label']
+
+
+class ArchivedTaskFilter(NameSearchFilterSet, LabelFilterSet):
+    """
+    Filters of archived tasks matching the filters of the live tasks.
+    """
+    done = filters.BooleanFilter(method='filter_done')
+
+    def filter_done(self, queryset, name, value):
+        # Only done tasks are archived.
+        return queryset if value else queryset.none()
+
+
+class ArchivedDatedTaskFilter(ArchivedTaskFilter):
+    week = filters.NumberFilter(field_name="date__week")
+    year = filters.NumberFilter(field_name="date__year")
+
+    class Meta:
+        model = ArchivedDatedTask
+        fields = ['name', 'date', 'done', 'week', 'year', 'label']
+
+
+class ArchivedWeekTaskFilter(ArchivedTaskFilter):
+
+    class Meta:
+        model = ArchivedWeekTask
+        fields = ['week_number', 'year', 'label']
+
+
+class ArchivedListMixin:
+    """
+    List archived tasks along with live ones when include_archived query param is true.
+    """
+    def list(self, request, *args, **kwargs):
+        if not include_archived(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        archived_queryset = self.archive_filterset_class(
+            request.query_params, queryset=self.archive_filterset_class._meta.model.objects.all(),
+            request=request).qs
+        tasks = with_archived(queryset, archived_queryset, self.archive_fields).order_by(
+            *self.queryset.query.order_by)
+        page = self.paginate_queryset(tasks)
+        rows = archived_rows(
+            tasks if page is None else page, label_objects=not normalized_labels(request))
+        fields = requested_fields(request)
+        if fields is not None:
+            rows = [{key: value for key, value in row.items() if key in fields} for row in rows]
+        if page is None:
+            return Response(rows)
+        return self.get_paginated_response(rows)
+
+
+class DatedTaskViewSet(NormalizedLabelsMixin, ArchivedListMixin, viewsets.ModelViewSet):
     """
     View that returns dated task data.
     """
@@ -38,24 +180,84 @@ class DatedTaskViewSet(viewsets.ModelViewSet):
     serializer_class = DatedTaskSerializer
     filter_backends = (filters.DjangoFilterBackend,)
     filterset_class = DatedTaskFilter
+    archive_filterset_class = ArchivedDatedTaskFilter
+    archive_fields = ['name', 'date']
 
 
-class WeekTaskViewSet(viewsets.ModelViewSet):
+class WeekTaskViewSet(NormalizedLabelsMixin, ArchivedListMixin, viewsets.ModelViewSet):
     """
     View that returns week task data.
     """
     queryset = WeekTask.objects.all().order_by('week_number', 'name')
     serializer_class = WeekTaskSerializer
     filter_backends = (filters.DjangoFilterBackend,)
-    filterset_fields = ('week_number', 'year', 'label')
+    filterset_class = WeekTaskFilter
+    archive_filterset_class = ArchivedWeekTaskFilter
+    archive_fields = ['name', 'year', 'week_number']
 
 
-class MultiOccurencesTaskViewSet(PartialUpdateMixin, viewsets.ModelViewSet):
+class MultiOccurencesTaskViewSet(
+        NormalizedLabelsMixin, PartialUpdateMixin, OptimisticConcurrencyMixin,
+        viewsets.ModelViewSet):
     """
     View that returns multi occurences task data.
     """
     queryset = MultiOccurencesTask.objects.all()
     serializer_class = MultiOccurencesTaskSerializer
+    filter_backends = (filters.DjangoFilterBackend,)
+    filterset_class = MultiOccurencesTaskFilter
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'destroy':
+            # Mots being deleted are gone, deleting them again resumes their deletion.
+            queryset = queryset.filter(deleting=False)
+        return queryset
+
+    def destroy(self, request, *args, **kwargs):
+        """
+        Mark the mot as deleting first, so that it can't be saved anymore, then delete its
+        tasks by batches committed one by one so that locks are only held for a batch, then
+        the mot.
+        """
+        try:
+            with transaction.atomic():
+                mot = self.get_object()
+                MultiOccurencesTask.objects.filter(id=mot.id).update(deleting=True)
+        except PreconditionFailed:
+            return self.precondition_failed()
+        delete_mot_tasks(mot)
+        self.perform_destroy(mot)
+        return Response(status=204)
+
+    @action(detail=True)
+    def preview(self, request, pk=None):
+        """
+        Return the occurrences of the mot, between start_date and end_date query params if
+        given (within the mot dates), without reading its tasks.
+        """
+        mot = self.get_object()
+        window = {}
+        for param in ['start_date', 'end_date']:
+            try:
+                window[param] = date.fromisoformat(
+                    request.query_params.get(param, str(getattr(mot, param))))
+            except ValueError:
+                return Response({param: 'must be a date (YYYY-MM-DD)'}, status=400)
+        start_date = max(window['start_date'], mot.start_date)
+        end_date = min(window['end_date'], mot.end_date)
+        if start_date > end_date:
+            return Response({'dated_task': [], 'week_task': []})
+        weeks = week_occurrences(start_date, end_date) if mot.number_a_week else []
+        return Response({
+            'dated_task': [
+                {'date': day, 'occurrence': occurrence}
+                for day, occurrence in dated_occurrences(mot, start_date, end_date)],
+            'week_task': [
+                {'year': year, 'week_number': week_number, 'occurrence': occurrence}
+                for year, week_number in weeks
+                for occurrence in range(1, mot.number_a_week + 1)],
+        })
 
 @api_view()
 def get_late_tasks(request):
@@ -85,3 +287,145 @@ def get_late_tasks(request):
             'week': task.week_number,
             'year': task.year})
     return Response({'late_tasks': late_tasks})
+
+
+@api_view()
+def get_task_stats(request):
+    """
+    Return completion rates per label, per mot and per iso week.
+    Optional query params iso_year, iso_week, label and mot filter counted tasks.
+    """
+    stat_filters = {}
+    for param, key in [
+            ('iso_year', 'iso_year'), ('iso_week', 'iso_week'), ('label', 'label_id'),
+            ('mot', 'mot_id')]:
+        if request.query_params.get(param):
+            try:
+                stat_filters[key] = int(request.query_params[param])
+            except ValueError:
+                return Response({param: 'must be an integer'}, status=400)
+    return Response(get_stats(**stat_filters))
+
+
+@api_view()
+def get_task_density(request):
+    """
+    Return the number of tasks and done tasks per day or week between start and end query
+    params, see task.density. Optional query params are group_by (day or week), label, mot
+    and include_archived.
+    """
+    params = {}
+    for param in ['start', 'end']:
+        try:
+            params[param] = date.fromisoformat(request.query_params.get(param, ''))
+        except ValueError:
+            return Response({param: 'must be a date (YYYY-MM-DD)'}, status=400)
+    if params['start'] > params['end']:
+        return Response({'end': 'must not be before start'}, status=400)
+    group_by = request.query_params.get('group_by', 'day')
+    if group_by not in GROUP_BY:
+        return Response({'group_by': f'must be one of {", ".join(GROUP_BY)}'}, status=400)
+    for param in ['label', 'mot']:
+        if request.query_params.get(param):
+            try:
+                params[param] = int(request.query_params[param])
+            except ValueError:
+                return Response({param: 'must be an integer'}, status=400)
+    return Response(get_density(
+        params.pop('start'), params.pop('end'), group_by,
+        include_archived=include_archived(request), **params))
+
+
+@api_view()
+def sync_changes(request):
+    """
+    Return tasks, mots and labels created, updated or deleted since the since query param,
+    a token returned by a previous call. Without it, everything is returned. Changes are
+    paged, more is true until the token of the response reads the last page.
+    """
+    try:
+        changes = get_changes(request.query_params.get('since'), {'request': request})
+    except InvalidTokenError as error:
+        return Response({'since': str(error)}, status=400)
+    return Response(changes)
+
+
+@require_GET
+def export_tasks(request):
+    """
+    Stream every row of a model as csv or ndjson (one json object per line).
+    Query params are model (dated_task, week_task or multi_occurences_task) and format.
+    """
+    try:
+        model, fields = EXPORTS[request.GET.get('model', 'dated_task')]
+    except KeyError:
+        return HttpResponseBadRequest(f'model must be one of {", ".join(EXPORTS)}')
+    export_format = request.GET.get('format', 'csv')
+    if export_format == 'csv':
+        response = StreamingHttpResponse(stream_csv(model, fields), content_type='text/csv')
+    elif export_format == 'ndjson':
+        response = StreamingHttpResponse(
+            stream_ndjson(model, fields), content_type='application/x-ndjson')
+    else:
+        return HttpResponseBadRequest('format must be csv or ndjson')
+    response['Content-Disposition'] = (
+        f'attachment; filename="{model._meta.model_name}.{export_format}"')
+    return response
+
+
+@require_GET
+async def event_stream(request):
+    """
+    Stream change events as server-sent events, filtered with model and week query params
+    (comma separated). Needs an ASGI server, see task.events.
+    """
+    if not events_enabled():
+        return HttpResponseBadRequest('Events need a PostgreSQL database')
+    models, weeks = event_filters(dict(request.GET.lists()))
+    response = StreamingHttpResponse(
+        server_sent_events(models, weeks), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def calendar_feed_etag(request):
+    return get_feed()[0]
+
+
+@require_GET
+@condition(etag_func=calendar_feed_etag)
+def calendar_feed(request):
+    """
+    Return tasks as an iCalendar feed, mots being written as recurrence rules.
+    """
+    return HttpResponse(get_feed()[1], content_type='text/calendar; charset=utf-8')
+
+
+@csrf_exempt
+@require_POST
+def import_tasks(request):
+    """
+    Import tasks or labels from a csv or ndjson file, sent as the file field of a multipart
+    form or as the raw request body. Query params are model (task or label) and format.
+    Either every row is imported or none, with a report of all invalid rows.
+    """
+    model = request.GET.get('model', 'task')
+    import_format = request.GET.get('format', 'csv')
+    if model not in IMPORT_MODELS:
+        return HttpResponseBadRequest(f'model must be one of {", ".join(IMPORT_MODELS)}')
+    if import_format not in IMPORT_FORMATS:
+        return HttpResponseBadRequest(f'format must be one of {", ".join(IMPORT_FORMATS)}')
+    if 'file' in request.FILES:
+        binary_stream = request.FILES['file'].file
+    else:
+        binary_stream = io.BytesIO(request.body)
+    stream = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+    try:
+        created = TaskImporter(model).load(stream, import_format)
+    except InvalidImportError as error:
+        return JsonResponse(
+            {'error_count': error.error_count, 'errors': error.errors}, status=400)
+    except UnicodeDecodeError:
+        return HttpResponseBadRequest('file must be utf-8 encoded')
+    return JsonResponse(created, status=201)